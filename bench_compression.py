@@ -0,0 +1,125 @@
+"""
+压缩段文件（.tsegz）基准
+
+对与 data_log.csv 形状相同的数据（每台设备每秒一帧、同一秒内到达顺序随机）测量:
+  - 每条记录字节数：CSV / 原始段文件 / 压缩段文件
+  - 编码、解码速度（frames/s）
+  - 扫描耗时：读入全部记录并对一个通道求和
+    （csv 模块读 CSV vs numpy.memmap 读 .tseg vs 解码 .tsegz）
+并校验压缩段导出的 CSV 与 CsvSink 写出的内容逐字节一致。
+
+数值模型: uniform 与 generate_message 相同（data_log.csv 的分布），
+load-curve 为随负荷曲线缓慢变化的读数。--csv 额外统计一个真实的 CSV 文件。
+
+用法:
+    python bench_compression.py --devices 1000 --seconds 1000
+    python bench_compression.py --csv data_log.csv
+"""
+
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+
+from bench_storage import load_csv, load_segments, write_with
+from frame_codec import FRAME_DTYPE, np, parse_csv_row
+from log_writer import CsvSink
+from payload_engine import MODELS, PayloadEngine
+from segment_codec import decode_block, encode_block, write_compressed
+from segment_store import SegmentSink, export_csv, list_segments
+
+
+def make_frames(model: str, device_count: int, seconds: int, seed: int = 0):
+    """每秒每台设备一帧，秒内顺序打乱，模拟多个连接交错到达"""
+    engine = PayloadEngine(np.arange(device_count), model, seed=seed)
+    rng = np.random.default_rng(seed)
+    start = 1_744_000_000
+    return np.concatenate([
+        engine.batch(rng.permutation(device_count), timestamp=start + t)
+        for t in range(seconds)
+    ])
+
+
+def read_csv_frames(path: str):
+    """读取真实 CSV（跳过表头和格式错误的行）"""
+    rows = []
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for fields in reader:
+            try:
+                rows.append(parse_csv_row(fields))
+            except ValueError:
+                continue
+    return np.array([(row[0], row[1], row[2:]) for row in rows], dtype=FRAME_DTYPE)
+
+
+def best_of(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(name: str, arr, workdir: str):
+    n = len(arr)
+    buf = arr.tobytes()
+    encoded = encode_block(arr)
+    decoded, _ = decode_block(encoded)
+    assert decoded.tobytes() == buf, "解码结果与原始记录不一致"
+    encode_time = best_of(lambda: encode_block(arr))
+    decode_time = best_of(lambda: decode_block(encoded))
+
+    csv_path = os.path.join(workdir, f"{name}.csv")
+    raw_dir = os.path.join(workdir, f"{name}-raw")
+    packed_dir = os.path.join(workdir, f"{name}-packed")
+    write_with(CsvSink(csv_path), buf)
+    write_with(SegmentSink(raw_dir, max_frames=n + 1), buf)
+    os.makedirs(packed_dir)
+    write_compressed(os.path.join(packed_dir, "segment-000000.tsegz"), arr, time.time())
+
+    exported = io.StringIO()
+    export_csv(list_segments(packed_dir), exported)
+    with open(csv_path, encoding="utf-8") as f:
+        assert exported.getvalue() == f.read(), "压缩段导出的 CSV 与原始 CSV 不一致"
+
+    sizes = [
+        os.path.getsize(csv_path),
+        sum(os.path.getsize(p) for p in list_segments(raw_dir)),
+        sum(os.path.getsize(p) for p in list_segments(packed_dir)),
+    ]
+    scans = [
+        best_of(lambda: load_csv(csv_path), 1),
+        best_of(lambda: load_segments(raw_dir)),
+        best_of(lambda: load_segments(packed_dir)),  # open_segment 对 .tsegz 透明解码
+    ]
+    print(f"[{name}] 记录数: {n:,}  编码 {n / encode_time:,.0f} frames/s  解码 {n / decode_time:,.0f} frames/s")
+    print(f"{'':<10}{'字节/条':>10}{'压缩比':>10}{'扫描耗时(s)':>14}")
+    for label, size, scan in zip(("CSV", ".tseg", ".tsegz"), sizes, scans):
+        print(f"{label:<10}{size / n:>10.2f}{sizes[0] / size:>10.2f}{scan:>14.4f}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="压缩段文件基准")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=1000)
+    parser.add_argument("--model", choices=MODELS, action="append", dest="models")
+    parser.add_argument("--csv", help="额外统计一个真实的 data_log.csv")
+    args = parser.parse_args(argv)
+    if np is None:
+        parser.error("需要安装 numpy")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.csv:
+            bench(os.path.basename(args.csv), read_csv_frames(args.csv), workdir)
+        for model in args.models or MODELS:
+            bench(model, make_frames(model, args.devices, args.seconds), workdir)
+
+
+if __name__ == "__main__":
+    main()
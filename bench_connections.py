@@ -0,0 +1,160 @@
+"""
+连接数 - 内存/CPU 基准测试
+
+在临时目录中启动 client.py（async 或 thread 模式），逐级建立 N 个设备连接，
+每个连接每秒发送一条 44 字节报文，采样服务器进程的 RSS 与 CPU 占用。
+
+用法:
+    python bench_connections.py --mode async --levels 100,1000,5000,10000
+    python bench_connections.py --mode thread --levels 100,1000,2000
+
+仅支持 Linux（通过 /proc 读取进程信息）。
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from client import raise_fd_limit
+from sender import generate_message
+
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client.py")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ===============================
+# 进程资源采样（/proc）
+# ===============================
+def read_rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def read_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime、stime 分别为第 14、15 个字段（去掉 pid 与 comm 后下标 11、12）
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def read_thread_count(pid: int) -> int:
+    with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
+
+
+# ===============================
+# 模拟设备连接
+# ===============================
+async def device_loop(device_id: int, host: str, port: int, interval: float, stop):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return False
+    try:
+        while not stop.is_set():
+            writer.write(generate_message(device_id))
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+    except OSError:
+        pass
+    finally:
+        writer.close()
+    return True
+
+
+async def run_level(args, server_pid: int, count: int, next_id: int, tasks, stop):
+    """在已有连接基础上追加到 count 个连接，稳定后采样"""
+    while len(tasks) < count:
+        batch = min(500, count - len(tasks))
+        for _ in range(batch):
+            tasks.append(
+                asyncio.create_task(
+                    device_loop(next_id, args.host, args.port, args.interval, stop)
+                )
+            )
+            next_id += 1
+        await asyncio.sleep(0.05)
+
+    await asyncio.sleep(args.warmup)
+    cpu_start = read_cpu_seconds(server_pid)
+    t_start = time.monotonic()
+    await asyncio.sleep(args.sample)
+    cpu_used = read_cpu_seconds(server_pid) - cpu_start
+    elapsed = time.monotonic() - t_start
+
+    failed = sum(1 for t in tasks if t.done() and not t.result())
+    print(
+        f"{count:>8} {count - failed:>8} {read_rss_kb(server_pid) / 1024:>10.1f} "
+        f"{cpu_used / elapsed * 100:>8.1f} {read_thread_count(server_pid):>8}"
+    )
+    return next_id
+
+
+async def run_benchmark(args, server_pid: int):
+    stop = asyncio.Event()
+    tasks = []
+    next_id = 0
+    print(f"{'目标连接':>8} {'存活连接':>8} {'RSS(MB)':>10} {'CPU%':>8} {'线程数':>8}")
+    print(
+        f"{0:>8} {0:>8} {read_rss_kb(server_pid) / 1024:>10.1f} "
+        f"{'-':>8} {read_thread_count(server_pid):>8}"
+    )
+    for level in args.levels:
+        next_id = await run_level(args, server_pid, level, next_id, tasks, stop)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="接收服务器连接数-RSS/CPU 基准")
+    parser.add_argument("--mode", choices=("async", "thread"), default="async")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19527)
+    parser.add_argument(
+        "--levels",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[100, 1000, 5000, 10000],
+        help="逗号分隔的连接数档位",
+    )
+    parser.add_argument("--interval", type=float, default=1.0, help="每连接发送间隔（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="每档稳定时间（秒）")
+    parser.add_argument("--sample", type=float, default=5.0, help="每档采样时间（秒）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    raise_fd_limit()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = subprocess.Popen(
+            [sys.executable, CLIENT_SCRIPT, "--mode", args.mode,
+             "--host", args.host, "--port", str(args.port),
+             "--live-port", "0", "--metrics-port", "0"],
+            cwd=workdir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(1.0)
+            print(f"[基准] 模式={args.mode} 服务器 PID={server.pid}")
+            asyncio.run(run_benchmark(args, server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
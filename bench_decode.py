@@ -0,0 +1,96 @@
+"""
+报文解码吞吐基准（frames/sec）
+
+对比:
+  1. parse_message 逐条解析 + 拼接 CSV 行（当前 handle_parsed_data 的做法）
+  2. struct.iter_unpack 批量拆包 + 延迟格式化为 CSV 行
+  3. struct.iter_unpack 批量拆包（不格式化）
+  4. NumPy 结构化 dtype 列式解码（不格式化）
+
+用法:
+    python bench_decode.py --frames 200000
+"""
+
+import argparse
+import random
+import time
+
+from client import parse_message
+from frame_codec import (
+    FRAME_SIZE,
+    decode_frames,
+    format_csv_lines,
+    np,
+    unpack_rows,
+)
+from sender import generate_message
+
+
+def make_buffer(frame_count: int, device_count: int) -> bytes:
+    return b"".join(
+        generate_message(random.randrange(device_count)) for _ in range(frame_count)
+    )
+
+
+def bench_parse_message(buf):
+    lines = []
+    for offset in range(0, len(buf), FRAME_SIZE):
+        parsed = parse_message(buf[offset : offset + FRAME_SIZE])
+        lines.append(",".join(str(value) for value in parsed.values()) + "\n")
+    return lines
+
+
+def bench_batch_csv(buf):
+    return format_csv_lines(unpack_rows(buf))
+
+
+def bench_iter_unpack(buf):
+    return list(unpack_rows(buf))
+
+
+def bench_numpy(buf):
+    arr = decode_frames(buf)
+    # 访问各列以确保真正完成解码
+    return arr["device_id"].max(), arr["timestamp"].min(), arr["values"].sum(axis=0)
+
+
+def measure(func, buf, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(buf)
+        best = min(best, time.perf_counter() - start)
+    return len(buf) // FRAME_SIZE / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="报文解码吞吐基准")
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    buf = make_buffer(args.frames, args.devices)
+
+    # 批量路径的输出必须与逐条路径逐字节一致
+    assert bench_parse_message(buf) == bench_batch_csv(buf), "CSV 输出不一致"
+
+    cases = [
+        ("parse_message + CSV", bench_parse_message),
+        ("iter_unpack + CSV", bench_batch_csv),
+        ("iter_unpack", bench_iter_unpack),
+    ]
+    if np is not None:
+        cases.append(("numpy 列式解码", bench_numpy))
+
+    baseline = None
+    print(f"{'方法':<24}{'frames/s':>16}{'加速比':>10}")
+    for name, func in cases:
+        rate = measure(func, buf, args.repeat)
+        baseline = baseline or rate
+        print(f"{name:<24}{rate:>16,.0f}{rate / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+端到端接收基准与回归对比
+
+对每个连接数档位（默认 1/100/10000）在临时目录中启动一个全新的 client.py，
+用 load_gen 的生成器按固定总帧率发送，同时轮询服务器的输出文件:
+
+    落盘速率     预热后每秒新增到磁盘（CSV 或段文件）的报文条数
+    落盘延迟     探针报文从写入 socket 到出现在输出文件中的时间（p50/p99/max），
+                 含写线程攒批时间与轮询间隔（POLL_INTERVAL）
+    CPU / RSS    服务器进程的 CPU 占用与常驻内存（/proc）
+
+探针: 每帧的“电流A”通道携带递增序号（float32 可精确表示 2^24 以内的整数），
+每 PROBE_EVERY 帧记录一次发送时间。生成器与服务器在同一台机器上，单核环境下
+会相互争用 CPU。
+
+结果保存为 JSON，可与基线对比，任一指标变差超过 --tolerance 时以退出码 1 结束:
+
+    python bench_ingest.py --save-baseline bench_baseline.json
+    python bench_ingest.py --baseline bench_baseline.json --output result.json
+    python bench_ingest.py --micro          # parse_message / handle_parsed_data 等单项基准
+
+仅支持 Linux（通过 /proc 读取进程信息），需要 numpy。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import load_gen
+from bench_connections import read_cpu_seconds, read_rss_kb
+from client import handle_parsed_data, parse_message, raise_fd_limit
+from frame_codec import FRAME_SIZE, decode_frames, format_csv_lines, np, unpack_rows
+from load_gen import LoadGenerator, percentiles
+from log_writer import CsvSink
+from payload_engine import PayloadEngine
+from segment_store import HEADER_SIZE, SegmentSink, list_segments
+
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "client.py")
+PROBE_EVERY = 16
+SEQ_MODULO = 1 << 24
+SEQ_STRUCT = struct.Struct("<f")
+SEQ_OFFSET = 8  # 第一个测量值通道（电流A）在报文中的偏移
+POLL_INTERVAL = 0.005
+
+# 对比基线时各指标的方向：1 表示越大越好，-1 表示越小越好
+LEVEL_METRICS = (
+    ("disk_rate", 1),
+    ("latency_p50_ms", -1),
+    ("latency_p99_ms", -1),
+    ("cpu_percent", -1),
+    ("rss_mb", -1),
+)
+
+
+# ===============================
+# 带探针的生成器
+# ===============================
+class ProbeGenerator(LoadGenerator):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seq = 0
+        self.probes = {}
+
+    def write(self, index: int, data, frames: int):
+        conn = self.conns[index]
+        if conn is not None and not conn.churned and not conn.paused:
+            now = time.perf_counter()
+            for offset in range(0, len(data), FRAME_SIZE):
+                seq = self.seq % SEQ_MODULO
+                SEQ_STRUCT.pack_into(data, offset + SEQ_OFFSET, seq)
+                if seq % PROBE_EVERY == 0:
+                    self.probes[seq] = now
+                self.seq += 1
+        super().write(index, data, frames)
+
+
+# ===============================
+# 轮询输出文件
+# ===============================
+class DiskTailer:
+    """统计新落盘的报文条数，并把探针序号与发送时间匹配得到落盘延迟"""
+
+    def __init__(self, workdir: str, storage: str, probes: dict):
+        self.workdir = workdir
+        self.storage = storage
+        self.probes = probes
+        self.rows = 0
+        self.latencies = []
+        self.since = 0.0  # 只统计该时刻之后发送的探针
+        self._offsets = {}
+        self._pending = b""
+
+    def poll(self):
+        if self.storage == "segment":
+            self._poll_segments()
+        else:
+            self._poll_csv()
+
+    def _match(self, seqs):
+        now = time.perf_counter()
+        for seq in seqs:
+            sent = self.probes.pop(seq, None)
+            if sent is not None and sent >= self.since:
+                self.latencies.append(now - sent)
+
+    def _poll_segments(self):
+        directory = os.path.join(self.workdir, "segments")
+        if not os.path.isdir(directory):
+            return
+        for path in list_segments(directory):
+            offset = self._offsets.get(path, HEADER_SIZE)
+            frames = (os.path.getsize(path) - offset) // FRAME_SIZE
+            if frames <= 0:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                buf = f.read(frames * FRAME_SIZE)
+            self._offsets[path] = offset + len(buf)
+            arr = decode_frames(buf[: len(buf) - len(buf) % FRAME_SIZE])
+            self.rows += len(arr)
+            seqs = arr["values"][:, 0].astype(np.int64)
+            self._match(seqs[seqs % PROBE_EVERY == 0].tolist())
+
+    def _poll_csv(self):
+        path = os.path.join(self.workdir, "data_log.csv")
+        if not os.path.exists(path):
+            return
+        offset = self._offsets.get(path, 0)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+        self._offsets[path] = offset + len(chunk)
+        chunk = self._pending + chunk
+        cut = chunk.rfind(b"\n") + 1
+        self._pending = chunk[cut:]
+        seqs = []
+        for line in chunk[:cut].splitlines():
+            fields = line.split(b",", 3)
+            if len(fields) < 4 or not fields[0].isdigit():
+                continue  # 表头
+            self.rows += 1
+            seq = int(float(fields[2]))
+            if seq % PROBE_EVERY == 0:
+                seqs.append(seq)
+        self._match(seqs)
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            self.poll()
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+# ===============================
+# 端到端档位
+# ===============================
+def start_server(args, workdir: str):
+    command = [
+        sys.executable, CLIENT_SCRIPT,
+        "--host", args.host, "--port", str(args.port),
+        "--storage", args.storage,
+        "--flush-interval", str(args.flush_interval),
+        "--live-port", "0", "--metrics-port", "0",
+    ]
+    server = subprocess.Popen(
+        command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((args.host, args.port), timeout=0.2).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("服务器启动超时")
+
+
+async def run_level(args, connections: int, workdir: str) -> dict:
+    server = start_server(args, workdir)
+    try:
+        gen_args = load_gen.parse_args([
+            "--host", args.host, "--port", str(args.port),
+            "--devices", str(connections),
+            "--rate", str(args.rate / connections),
+            "--duration", str(args.duration),
+            "--report-interval", str(args.duration + 1),
+            "--seed", "0",
+        ])
+        generator = ProbeGenerator(gen_args, 0, connections)
+        await generator.ramp_up()
+        tailer = DiskTailer(workdir, args.storage, generator.probes)
+        stop_tail = asyncio.Event()
+        tail_task = asyncio.create_task(tailer.run(stop_tail))
+
+        window = {}
+
+        async def mark_warmup():
+            await asyncio.sleep(args.warmup)
+            tailer.since = time.perf_counter()
+            window.update(
+                rows=tailer.rows, time=tailer.since, cpu=read_cpu_seconds(server.pid)
+            )
+
+        warmup_task = asyncio.create_task(mark_warmup())
+        await generator.send_loop(asyncio.Event())
+        await warmup_task
+        elapsed = time.perf_counter() - window["time"]
+        disk_rows = tailer.rows - window["rows"]
+        cpu = read_cpu_seconds(server.pid) - window["cpu"]
+        rss_mb = read_rss_kb(server.pid) / 1024
+
+        # 收尾：等待剩余报文落盘，便于核对总数
+        await generator.close()
+        deadline = time.monotonic() + max(5.0, 4 * args.flush_interval)
+        while tailer.rows < generator.sent_frames and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+        stop_tail.set()
+        await tail_task
+    finally:
+        server.terminate()
+        server.wait()
+
+    latency = percentiles(tailer.latencies, (50, 99))
+    return {
+        "connections": connections,
+        "connected": generator.connects,
+        "target_rate": args.rate,
+        "sent_frames": generator.sent_frames,
+        "skipped_frames": generator.skipped_frames,
+        "disk_frames": tailer.rows,
+        "disk_rate": round(disk_rows / elapsed, 1),
+        "latency_samples": len(tailer.latencies),
+        "latency_p50_ms": round(latency.get("p50", 0.0) * 1000, 3),
+        "latency_p99_ms": round(latency.get("p99", 0.0) * 1000, 3),
+        "latency_max_ms": round(latency.get("max", 0.0) * 1000, 3),
+        "cpu_percent": round(cpu / elapsed * 100, 1),
+        "rss_mb": round(rss_mb, 1),
+    }
+
+
+def run_end_to_end(args) -> list:
+    raise_fd_limit()
+    print(f"{'连接数':>8} {'落盘帧/s':>12} {'p50(ms)':>9} {'p99(ms)':>9} {'CPU%':>7} {'RSS(MB)':>9} {'发送/落盘':>17}")
+    levels = []
+    for connections in args.levels:
+        with tempfile.TemporaryDirectory() as workdir:
+            level = asyncio.run(run_level(args, connections, workdir))
+        levels.append(level)
+        print(
+            f"{level['connections']:>8} {level['disk_rate']:>12,.0f} "
+            f"{level['latency_p50_ms']:>9.1f} {level['latency_p99_ms']:>9.1f} "
+            f"{level['cpu_percent']:>7.1f} {level['rss_mb']:>9.1f} "
+            f"{level['sent_frames']:>8}/{level['disk_frames']:<8}"
+        )
+    return levels
+
+
+# ===============================
+# 单项基准
+# ===============================
+def run_micro(args) -> dict:
+    engine = PayloadEngine(np.arange(1000), seed=0)
+    batch = engine.batch(timestamp=int(time.time()), frames_per_device=max(1, args.micro_frames // 1000))
+    buf = batch.tobytes()
+    frames = [buf[i : i + FRAME_SIZE] for i in range(0, len(buf), FRAME_SIZE)]
+    parsed = [parse_message(frame) for frame in frames]
+
+    results = {}
+
+    def measure(name, func, quiet=False):
+        # handle_parsed_data 每条都会 print，测量时把输出丢进内存
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            start = time.perf_counter()
+            func()
+        rate = len(frames) / (time.perf_counter() - start)
+        results[name] = round(rate, 1)
+        print(f"{name:<32}{rate:>16,.0f}")
+
+    print(f"{'单项':<32}{'frames/s':>16}")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # handle_parsed_data 写当前目录下的 data_log.csv
+        try:
+            measure("parse_message", lambda: [parse_message(frame) for frame in frames])
+            measure("handle_parsed_data", lambda: [handle_parsed_data(p) for p in parsed], quiet=True)
+            measure("unpack_rows + format_csv_lines", lambda: format_csv_lines(unpack_rows(buf)))
+            sink = CsvSink(os.path.join(workdir, "batch.csv"))
+            measure("CsvSink.write_frames", lambda: (sink.write_frames(buf), sink.flush()))
+            sink.close()
+            segments = SegmentSink(os.path.join(workdir, "segments"))
+            measure("SegmentSink.write_frames", lambda: (segments.write_frames(buf), segments.flush()))
+            segments.close()
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+# ===============================
+# 结果与基线对比
+# ===============================
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(CLIENT_SCRIPT),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """打印与基线的对比，返回变差超过 tolerance 的指标"""
+    regressions = []
+    rows = []
+    for key in ("storage", "rate", "cpus"):
+        if key in results and key in baseline and results[key] != baseline[key]:
+            print(f"[警告] 与基线的 {key} 不同（{baseline[key]} -> {results[key]}），对比仅供参考")
+    base_levels = {level["connections"]: level for level in baseline.get("levels", [])}
+    for level in results.get("levels", []):
+        base = base_levels.get(level["connections"])
+        if base is None:
+            continue
+        for key, direction in LEVEL_METRICS:
+            rows.append((f"{level['connections']} 连接 {key}", base[key], level[key], direction))
+    base_micro = baseline.get("micro", {})
+    for name, value in results.get("micro", {}).items():
+        if name in base_micro:
+            rows.append((name, base_micro[name], value, 1))
+
+    print(f"\n{'指标':<36}{'基线':>14}{'本次':>14}{'变化':>10}")
+    for name, old, new, direction in rows:
+        change = (new - old) / old if old else 0.0
+        worse = -change * direction > tolerance
+        flag = "  ← 变差" if worse else ""
+        print(f"{name:<36}{old:>14,.1f}{new:>14,.1f}{change * 100:>+9.1f}%{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="端到端接收基准与回归对比")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19527)
+    parser.add_argument(
+        "--levels",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[1, 100, 10000],
+        help="逗号分隔的连接数档位",
+    )
+    parser.add_argument("--rate", type=float, default=20000.0, help="每档的总发送帧率")
+    parser.add_argument("--duration", type=float, default=10.0, help="每档发送时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="开始统计前的预热时间（秒）")
+    parser.add_argument("--storage", choices=("csv", "segment"), default="segment")
+    parser.add_argument("--flush-interval", type=float, default=0.05, help="服务器最长攒批时间（秒）")
+    parser.add_argument("--micro", action="store_true", help="只运行单项基准")
+    parser.add_argument("--micro-frames", type=int, default=50000)
+    parser.add_argument("--output", help="结果 JSON 文件")
+    parser.add_argument("--baseline", help="对比的基线 JSON 文件")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="判定变差的相对阈值")
+    args = parser.parse_args(argv)
+    if args.warmup >= args.duration:
+        parser.error("--warmup 必须小于 --duration")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if np is None:
+        raise SystemExit("bench_ingest 需要安装 numpy")
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+    if args.micro:
+        results["micro"] = run_micro(args)
+    else:
+        results.update(
+            storage=args.storage,
+            rate=args.rate,
+            duration=args.duration,
+            flush_interval=args.flush_interval,
+            levels=run_end_to_end(args),
+        )
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"[保存] {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"[回归] {len(regressions)} 项指标变差超过 {args.tolerance:.0%}")
+            sys.exit(1)
+        print("[通过] 未发现超过阈值的回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+运行指标开销基准
+
+分别测量接收路径上新增的每次读取检查、计数器与直方图的单次耗时、编码线程上
+每设备帧数统计（DeviceFrameCounter）的每帧耗时，再测量
+TelemetryProtocol.buffer_updated 的实际单次耗时（默认配置不带最新值缓存；
+另测 --live-port 开启缓存时），按给定帧率估算指标带来的额外 CPU 占比。
+最坏情况按每次读取只收到一帧、且每次都是不完整读取计算。
+
+用法:
+    python bench_metrics.py --rate 50000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import timeit
+
+from client import SHORT_READS_TOTAL, DeviceFrameCounter, Ingest, TelemetryProtocol
+from frame_codec import FRAME_SIZE
+from live_cache import LatestTable
+from log_writer import BatchWriter, CsvSink
+from metrics import Counter, Histogram
+from sender import generate_message
+
+
+class NullTransport:
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 0)
+
+    def pause_reading(self):
+        pass
+
+    def is_closing(self):
+        return False
+
+
+def per_call(stmt, setup_globals, number: int) -> float:
+    """单次耗时，扣除 timeit 自身的循环开销"""
+    elapsed = min(timeit.repeat(stmt, globals=setup_globals, number=number, repeat=5))
+    baseline = min(timeit.repeat("pass", number=number, repeat=5))
+    return max(0.0, elapsed - baseline) / number
+
+
+def measure_buffer_updated(frames: int, cache: LatestTable = None) -> float:
+    """一次读取一帧时 buffer_updated 的单次耗时（含入队，给出 cache 时含缓存更新）"""
+    with tempfile.TemporaryDirectory() as workdir:
+        writer = BatchWriter(
+            CsvSink(os.path.join(workdir, "bench.csv")), input_frames=frames + 1
+        ).start()
+        protocol = TelemetryProtocol(Ingest(writer, cache))
+        protocol.connection_made(NullTransport())
+        frame = generate_message(1)
+        start = time.perf_counter()
+        for _ in range(frames):
+            buf = protocol.get_buffer(-1)
+            buf[:FRAME_SIZE] = frame
+            protocol.buffer_updated(FRAME_SIZE)
+        elapsed = time.perf_counter() - start
+        writer.stop()
+    return elapsed / frames
+
+
+def measure_device_counter(batch_frames: int, devices: int = 1000) -> float:
+    """编码线程上每批统计一次设备帧数，折算到每帧的耗时"""
+    buf = b"".join(generate_message(i % devices) for i in range(batch_frames))
+    counter = DeviceFrameCounter()
+    return per_call("counter.consume(buf)", {"counter": counter, "buf": buf}, 200) / batch_frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行指标开销基准")
+    parser.add_argument("--rate", type=int, default=50000, help="目标帧率（frames/s）")
+    parser.add_argument("--batch-size", type=int, default=4096, help="写线程每批报文条数")
+    parser.add_argument("--frames", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    counter = Counter("bench_total", "")
+    histogram = Histogram("bench_seconds", "")
+
+    protocol = TelemetryProtocol(None)
+    protocol.device_id = 1
+    env = {"counter": counter, "histogram": histogram, "protocol": protocol}
+    check = per_call("protocol.frames.pending\nprotocol.device_id is None", env, 1_000_000)
+    inc = per_call("counter.inc()", env, 1_000_000)
+    observe = per_call("histogram.observe(0.0012)", env, 1_000_000)
+    count = measure_device_counter(args.batch_size)
+    recv = measure_buffer_updated(args.frames)
+    recv_cached = measure_buffer_updated(args.frames, LatestTable())
+
+    # 每次读取: 两次属性检查（最坏情况再加一次短读计数）；
+    # 每批: 3 次直方图记录 + 一次设备帧数统计（编码线程）
+    batches = args.rate / args.batch_size
+    typical = args.rate * check + batches * 3 * observe + args.rate * count
+    worst = typical + args.rate * inc
+    ingest = args.rate * recv
+    print(f"{'项目':<28}{'单次耗时':>12}")
+    print(f"{'每次读取检查':<28}{check * 1e9:>10.0f}ns")
+    print(f"{'计数器 inc':<28}{inc * 1e9:>10.0f}ns")
+    print(f"{'直方图 observe':<28}{observe * 1e9:>10.0f}ns")
+    print(f"{'设备帧数统计（每帧）':<28}{count * 1e9:>10.0f}ns")
+    print(f"{'buffer_updated（一帧）':<28}{recv * 1e9:>10.0f}ns")
+    print(f"{'  开启最新值缓存时':<28}{recv_cached * 1e9:>10.0f}ns")
+    print()
+    print(
+        f"{args.rate:,} frames/s 时接收路径 {ingest * 100:.1f}% CPU"
+        f"（--live-port 开启缓存时 {args.rate * recv_cached * 100:.1f}%）"
+    )
+    for name, extra in (("无短读", typical), ("每次短读（最坏）", worst)):
+        print(f"  指标开销[{name}] {extra * 100:.3f}% CPU，占接收路径 {extra / ingest * 100:.2f}%")
+    print(f"（短读计数器本次累计 {SHORT_READS_TOTAL.value}，应为 0）")
+
+
+if __name__ == "__main__":
+    main()
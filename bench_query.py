@@ -0,0 +1,115 @@
+"""
+查询引擎基准：在多 GB 合成段文件上对比全量扫描与索引查询
+
+合成数据: --devices 台设备每秒各上报一条，按时间顺序写入段文件。
+查询: 单台设备在中间某一小时内的全部记录。
+
+用法:
+    python bench_query.py --gb 2                # 生成到临时目录，结束后删除
+    python bench_query.py --gb 4 --dir /data/synthetic --keep
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from frame_codec import FRAME_DTYPE, FRAME_SIZE, np
+from segment_store import SegmentSink, list_segments, open_segment
+from telemetry_query import TelemetryStore, index_path_for
+
+CHUNK_FRAMES = 1_000_000
+BASE_TIMESTAMP = 1744808988  # 2025-04-16 13:09:48 UTC，与 data_log.csv 同一天
+
+
+def generate(directory: str, total_frames: int, devices: int, segment_frames: int):
+    rng = np.random.default_rng(0)
+    sink = SegmentSink(directory, max_frames=segment_frames, max_age=float("inf"))
+    for lo in range(0, total_frames, CHUNK_FRAMES):
+        n = min(CHUNK_FRAMES, total_frames - lo)
+        seq = np.arange(lo, lo + n, dtype=np.int64)
+        chunk = np.empty(n, dtype=FRAME_DTYPE)
+        chunk["device_id"] = seq % devices
+        chunk["timestamp"] = BASE_TIMESTAMP + seq // devices
+        chunk["values"] = rng.random((n, 9), dtype=np.float32) * 100
+        sink.write_frames(chunk.tobytes())
+    sink.close()
+
+
+def full_scan(directory: str, start: int, end: int, device: int) -> int:
+    matched = 0
+    for path in list_segments(directory):
+        arr = open_segment(path)
+        ts = arr["timestamp"]
+        mask = (ts >= start) & (ts < end) & (arr["device_id"] == device)
+        matched += int(mask.sum())
+    return matched
+
+
+def build_indexes(directory: str):
+    store = TelemetryStore(directory)
+    for path in list_segments(directory):
+        store.index_for(path, open_segment(path))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="段文件查询基准")
+    parser.add_argument("--gb", type=float, default=2.0, help="合成数据大小（GB）")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--segment-frames", type=int, default=5_000_000)
+    parser.add_argument("--dir", help="数据目录（已存在段文件时直接复用）")
+    parser.add_argument("--keep", action="store_true", help="保留生成的数据")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_query_")
+    total_frames = int(args.gb * (1 << 30) / FRAME_SIZE)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if not list_segments(directory):
+            print(f"[生成] {total_frames:,} 条记录（约 {args.gb} GB）-> {directory}")
+            _, elapsed = timed(generate, directory, total_frames, args.devices, args.segment_frames)
+            print(f"[生成] 耗时 {elapsed:.1f}s")
+        for path in list_segments(directory):
+            if os.path.exists(index_path_for(path)):
+                os.remove(index_path_for(path))
+
+        span = total_frames // args.devices
+        start = BASE_TIMESTAMP + span // 2
+        end = start + 3600
+        device = 7
+
+        scanned, scan_time = timed(full_scan, directory, start, end, device)
+        _, build_time = timed(build_indexes, directory)
+        store = TelemetryStore(directory)  # 重新从旁路文件加载索引
+        result, query_time = timed(store.query, start, end, [device])
+        stats = store.last_stats
+        _, warm_time = timed(store.query, start, end, [device])
+        _, range_time = timed(store.query, start, start + 60, None)
+        range_stats = store.last_stats
+        assert len(result) == scanned, "索引查询与全量扫描结果不一致"
+
+        total_bytes = sum(os.path.getsize(p) for p in list_segments(directory))
+        print(f"数据量: {total_bytes / (1 << 30):.2f} GB，{stats['segments']} 个段")
+        print(f"查询: 设备 {device}，[{start}, {end})，命中 {len(result)} 条")
+        print(f"全量扫描 (memmap):     {scan_time:8.3f}s")
+        print(f"建立索引（一次性）:    {build_time:8.3f}s")
+        print(f"一分钟全部设备:        {range_time:8.3f}s  （读取块 {range_stats['blocks_read']}/{range_stats['blocks']}）")
+        print(
+            f"索引查询（含加载索引）:{query_time:8.3f}s  "
+            f"（读取记录 {stats['rows_read']:,}/{total_frames:,}，加速 {scan_time / query_time:.0f}x）"
+        )
+        print(f"索引查询（索引已缓存）:{warm_time:8.3f}s  （加速 {scan_time / warm_time:.0f}x）")
+    finally:
+        if not args.keep and not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+CSV 与二进制段文件的写入/加载基准
+
+对同一批随机报文分别测量:
+  - 写入耗时（CsvSink vs SegmentSink，按 4096 条一批）
+  - 文件大小（每条记录字节数）
+  - 分析加载耗时（pandas.read_csv 或 csv 模块 vs numpy.memmap）
+并校验段文件导出的 CSV 与 CsvSink 写出的内容逐字节一致。
+
+用法:
+    python bench_storage.py --frames 1000000
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+from frame_codec import FRAME_SIZE
+from log_writer import CsvSink
+from segment_store import SegmentSink, export_csv, list_segments, open_segment
+from sender import generate_message
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+BATCH_FRAMES = 4096
+
+
+def make_buffer(frame_count: int, device_count: int) -> bytes:
+    # 生成一小段随机报文后重复使用，避免生成数据本身耗时过长
+    unique = b"".join(
+        generate_message(random.randrange(device_count))
+        for _ in range(min(frame_count, 100_000))
+    )
+    repeat = -(-frame_count // (len(unique) // FRAME_SIZE))
+    return (unique * repeat)[: frame_count * FRAME_SIZE]
+
+
+def write_with(sink, buf: bytes) -> float:
+    step = BATCH_FRAMES * FRAME_SIZE
+    start = time.perf_counter()
+    for offset in range(0, len(buf), step):
+        sink.write_frames(buf[offset : offset + step])
+        sink.flush()
+    sink.close()
+    return time.perf_counter() - start
+
+
+def load_csv(path: str) -> float:
+    start = time.perf_counter()
+    if pd is not None:
+        df = pd.read_csv(path)
+        df["电流A"].sum()
+    else:
+        with open(path, encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader)
+            sum(float(row[2]) for row in reader)
+    return time.perf_counter() - start
+
+
+def load_segments(directory: str) -> float:
+    start = time.perf_counter()
+    for path in list_segments(directory):
+        arr = open_segment(path)
+        arr["values"][:, 0].sum()
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CSV 与段文件存储基准")
+    parser.add_argument("--frames", type=int, default=1_000_000)
+    parser.add_argument("--devices", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    random.seed(0)
+    buf = make_buffer(args.frames, args.devices)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "data_log.csv")
+        seg_dir = os.path.join(workdir, "segments")
+
+        csv_write = write_with(CsvSink(csv_path), buf)
+        seg_write = write_with(SegmentSink(seg_dir, max_frames=args.frames // 4 + 1), buf)
+        csv_size = os.path.getsize(csv_path)
+        seg_size = sum(os.path.getsize(p) for p in list_segments(seg_dir))
+
+        csv_load = load_csv(csv_path)
+        seg_load = load_segments(seg_dir)
+
+        exported = io.StringIO()
+        export_csv(list_segments(seg_dir), exported)
+        with open(csv_path, encoding="utf-8") as f:
+            assert exported.getvalue() == f.read(), "段文件导出的 CSV 与原始 CSV 不一致"
+
+    n = args.frames
+    loader = "pandas.read_csv" if pd is not None else "csv 模块"
+    print(f"记录数: {n:,}")
+    print(f"{'':<12}{'写入 frames/s':>16}{'字节/条':>10}{'加载耗时(s)':>14}")
+    print(f"{'CSV':<12}{n / csv_write:>16,.0f}{csv_size / n:>10.1f}{csv_load:>14.3f}  ({loader})")
+    print(f"{'段文件':<12}{n / seg_write:>16,.0f}{seg_size / n:>10.1f}{seg_load:>14.3f}  (numpy.memmap)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,39 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
 import socket
+import sys
 import threading
 import struct
 import time
+from array import array
+from collections import Counter
+
+from frame_codec import FRAME_DTYPE, np
+from framing import FrameBuffer
+from live_cache import LIVE_HOST, LIVE_PORT, LatestTable, start_live_server
+from log_writer import DURABILITY_CHOICES, BatchWriter, CsvSink
+from metrics import METRICS_HOST, METRICS_PORT, REGISTRY, start_metrics_server
+from pipeline import OVERFLOW_POLICIES
+from rollup import RollupAggregator
+from segment_store import SegmentSink
 
 HOST = "0.0.0.0"
 PORT = 9527
 MSG_LENGTH = 44
 OUTPUT_FILE = "data_log.csv"
+SEGMENT_DIR = "segments"
+SPILL_DIR = "spill"
+RECV_BUFFER_FRAMES = 64  # 每连接接收缓冲区可容纳的报文数
+DEVICE_ID = struct.Struct("<I")
+
+ACTIVE_CONNECTIONS = REGISTRY.gauge("telemetry_active_connections", "当前设备连接数")
+CONNECTIONS_TOTAL = REGISTRY.counter("telemetry_connections_total", "累计建立的设备连接数")
+RECONNECTS_TOTAL = REGISTRY.counter("telemetry_reconnects_total", "已上报过的设备重新建立连接的次数")
+SHORT_READS_TOTAL = REGISTRY.counter("telemetry_short_reads_total", "以不完整报文结尾的读取次数")
+TRUNCATED_TOTAL = REGISTRY.counter("telemetry_truncated_disconnects_total", "断开时残留不完整报文的连接数")
 
 
 def parse_message(data: bytes):
@@ -51,52 +78,465 @@ def handle_parsed_data(parsed_data: dict):
     print(f"[保存成功] {line.strip()}")
 
 
+# ===============================
+# 接收路径入口
+# ===============================
+class Ingest:
+    """
+    每段完整报文先更新实时缓存（过载时缓存仍保持最新），再投递到写线程
+    """
+
+    def __init__(self, writer: BatchWriter, cache: LatestTable = None):
+        self.writer = writer
+        self.cache = cache
+        self._paused = set()
+        self._seen = set()
+
+    def identify(self, block) -> int:
+        """连接上第一段完整报文确定设备ID；该设备此前连接过则计为一次重连"""
+        device_id = DEVICE_ID.unpack_from(block)[0]
+        if device_id in self._seen:
+            RECONNECTS_TOTAL.inc()
+        else:
+            self._seen.add(device_id)
+        return device_id
+
+    def submit(self, block, wait: bool = True) -> bool:
+        """返回 False 表示写线程输入队列已满，调用方应暂停读取"""
+        if not block:
+            return True
+        if self.cache is not None:
+            self.cache.update(block)
+        return self.writer.submit(block, wait)
+
+    def pause(self, transport):
+        transport.pause_reading()
+        self._paused.add(transport)
+
+    def forget(self, transport):
+        self._paused.discard(transport)
+
+    def resume_if_ready(self):
+        """队列回落到低水位后恢复被暂停的连接"""
+        if self._paused and self.writer.input.has_room():
+            for transport in self._paused:
+                if not transport.is_closing():
+                    transport.resume_reading()
+            self._paused.clear()
+
+
 # ===============================
 # 客户端连接处理线程
 # ===============================
-def handle_client(conn: socket.socket, addr):
+def handle_client(conn: socket.socket, addr, ingest: Ingest):
     print(f"[连接] 客户端地址: {addr}")
+    ACTIVE_CONNECTIONS.inc()
+    CONNECTIONS_TOTAL.inc()
+    frames = FrameBuffer(MSG_LENGTH, RECV_BUFFER_FRAMES)
+    device_id = None
     try:
-        while True:
-            data = conn.recv(MSG_LENGTH)
-            if not data:
-                break
-            if len(data) < MSG_LENGTH:
-                print(f"[警告] 收到不完整数据（{len(data)} 字节）")
-                continue
-            try:
-                parsed = parse_message(data)
-                handle_parsed_data(parsed)
-            except Exception as e:
-                print(f"[错误] 报文解析失败: {e}")
+        while frames.recv_from(conn):
+            block = frames.pop_frames()
+            if frames.pending:
+                SHORT_READS_TOTAL.inc()
+            if device_id is None and block:
+                device_id = ingest.identify(block)
+            ingest.submit(block)
+    except ConnectionError:
+        pass
     finally:
+        ACTIVE_CONNECTIONS.dec()
+        if frames.pending:
+            TRUNCATED_TOTAL.inc()
+            print(f"[警告] 连接断开时残留不完整数据（{frames.pending} 字节）")
         conn.close()
         print(f"[断开] 客户端地址: {addr}")
 
 
+# ===============================
+# 异步客户端连接处理（asyncio）
+# ===============================
+class TelemetryProtocol(asyncio.BufferedProtocol):
+    """
+    事件循环直接 recv_into 到连接自己的 FrameBuffer，无逐帧内存分配
+    """
+
+    def __init__(self, ingest: Ingest):
+        self.ingest = ingest
+        self.frames = FrameBuffer(MSG_LENGTH, RECV_BUFFER_FRAMES)
+        self.addr = None
+        self.device_id = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.addr = transport.get_extra_info("peername")
+        ACTIVE_CONNECTIONS.inc()
+        CONNECTIONS_TOTAL.inc()
+        print(f"[连接] 客户端地址: {self.addr}")
+
+    def get_buffer(self, sizehint):
+        return self.frames.writable()
+
+    def buffer_updated(self, nbytes):
+        self.frames.commit(nbytes)
+        block = self.frames.pop_frames()
+        if self.frames.pending:
+            SHORT_READS_TOTAL.inc()
+        if self.device_id is None and block:
+            self.device_id = self.ingest.identify(block)
+        if not self.ingest.submit(block, wait=False):
+            # 不能阻塞事件循环：暂停读取，由内核 TCP 窗口把压力传回设备端
+            self.ingest.pause(self.transport)
+
+    def connection_lost(self, exc):
+        self.ingest.forget(self.transport)
+        ACTIVE_CONNECTIONS.dec()
+        if self.frames.pending:
+            TRUNCATED_TOTAL.inc()
+            print(f"[警告] 连接断开时残留不完整数据（{self.frames.pending} 字节）")
+        print(f"[断开] 客户端地址: {self.addr}")
+
+
 # ===============================
 # TCP服务器主函数
 # ===============================
-def start_server():
-    print(f"[启动] TCP服务器监听端口 {PORT}...")
+def raise_fd_limit():
+    """
+    将进程可打开文件数提升到硬上限，单进程承载上万连接时需要
+    """
+    try:
+        import resource
+    except ImportError:  # Windows 无 resource 模块
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        target = hard if hard != resource.RLIM_INFINITY else 1 << 20
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+
+
+async def resume_paused(ingest, interval=0.02):
+    while True:
+        await asyncio.sleep(interval)
+        ingest.resume_if_ready()
+
+
+async def serve_async(ingest, host=HOST, port=PORT, backlog=4096, reuse_port=False):
+    loop = asyncio.get_running_loop()
+    resumer = asyncio.create_task(resume_paused(ingest))
+    server = await loop.create_server(
+        lambda: TelemetryProtocol(ingest),
+        host,
+        port,
+        backlog=backlog,
+        reuse_address=True,
+        reuse_port=reuse_port or None,
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        resumer.cancel()
+
+
+def start_async_server(ingest, host=HOST, port=PORT, reuse_port=False):
+    """
+    单事件循环（selector/epoll）承载全部设备连接
+    """
+    print(f"[启动] TCP服务器（asyncio）监听端口 {port}...")
+    raise_fd_limit()
+    asyncio.run(serve_async(ingest, host, port, reuse_port=reuse_port))
+
+
+def start_server(ingest, host=HOST, port=PORT, reuse_port=False):
+    """
+    每连接一个线程的传统模式，作为 asyncio 模式的后备方案
+    """
+    print(f"[启动] TCP服务器（线程模式）监听端口 {port}...")
+    raise_fd_limit()
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-        server.bind((HOST, PORT))
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.bind((host, port))
         server.listen()
         while True:
             conn, addr = server.accept()
             thread = threading.Thread(
-                target=handle_client, args=(conn, addr), daemon=True
+                target=handle_client, args=(conn, addr, ingest), daemon=True
             )
             thread.start()
 
 
-if __name__ == "__main__":
-    # 写入文件头（如果文件不存在）
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="电力报文 TCP 接收服务器")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--mode",
+        choices=("async", "thread"),
+        default="async",
+        help="async: 单事件循环（默认）；thread: 每连接一个线程（后备）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="工作进程数；大于 1 时各进程以 SO_REUSEPORT 共同监听端口（需 --storage segment）",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=("csv", "segment"),
+        default="csv",
+        help="csv: 追加到 CSV 文件（默认）；segment: 二进制段文件",
+    )
+    parser.add_argument("--output", default=OUTPUT_FILE, help="CSV 输出文件")
+    parser.add_argument("--segment-dir", default=SEGMENT_DIR, help="段文件目录")
+    parser.add_argument(
+        "--segment-frames", type=int, default=1_000_000, help="单个段文件最多记录数"
+    )
+    parser.add_argument(
+        "--segment-seconds", type=float, default=3600.0, help="段文件滚动周期（秒）"
+    )
+    parser.add_argument(
+        "--segment-compress",
+        action="store_true",
+        help="段文件滚动时压缩为 .tsegz（按设备 delta-of-delta/XOR 编码，需要 numpy）",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=4096, help="每批最多写入的报文条数"
+    )
+    parser.add_argument(
+        "--flush-interval", type=float, default=0.5, help="最长攒批时间（秒）"
+    )
+    parser.add_argument(
+        "--durability",
+        choices=DURABILITY_CHOICES,
+        default="flush",
+        help="none: 仅进程内缓冲；flush: 每批刷到内核（默认）；fsync: 每批 fsync",
+    )
+    parser.add_argument(
+        "--queue-frames",
+        type=int,
+        default=262144,
+        help="写线程输入队列容量（报文条数）",
+    )
+    parser.add_argument(
+        "--persist-batches", type=int, default=16, help="等待落盘的批次数上限"
+    )
+    parser.add_argument(
+        "--overflow",
+        choices=OVERFLOW_POLICIES,
+        default="block",
+        help="队列满时: block 反压（默认）；drop-oldest 丢弃最旧；spill 溢出到磁盘",
+    )
+    parser.add_argument("--spill-dir", default=SPILL_DIR, help="spill 策略的溢出文件目录")
+    parser.add_argument(
+        "--rollup-dir",
+        help="启用按设备 1m/15m/1h 汇总并写入该目录（需要 numpy）",
+    )
+    parser.add_argument("--live-host", default=LIVE_HOST, help="实时查询接口地址")
+    parser.add_argument(
+        "--live-port",
+        type=int,
+        nargs="?",
+        const=LIVE_PORT,
+        default=0,
+        help=f"启用实时查询接口（最新值缓存）及其端口，省略端口时为 {LIVE_PORT}；"
+        "默认关闭，多进程时第 i 个进程使用 端口+i",
+    )
+    parser.add_argument(
+        "--live-history", type=int, default=0, help="每台设备保留的最近报文条数"
+    )
+    parser.add_argument("--metrics-host", default=METRICS_HOST, help="指标接口地址")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Prometheus 指标与采样剖析接口端口，0 表示关闭；多进程时第 i 个进程使用 端口+i",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="逐条打印保存的报文（高负载下很慢）"
+    )
+    args = parser.parse_args(argv)
+    if args.segment_compress and args.storage != "segment":
+        parser.error("--segment-compress 需要 --storage segment")
+    if args.segment_compress and np is None:
+        parser.error("--segment-compress 需要安装 numpy")
+    if args.workers > 1:
+        if args.storage != "segment":
+            parser.error("--workers 大于 1 时需要 --storage segment")
+        if not hasattr(socket, "SO_REUSEPORT"):
+            parser.error("当前平台不支持 SO_REUSEPORT，无法使用 --workers")
+    return args
+
+
+def create_sink(args, worker_id=None):
+    """多进程时每个进程写自己的段文件（前缀 segment-wNN）"""
+    if args.storage == "segment":
+        prefix = "segment" if worker_id is None else f"segment-w{worker_id:02d}"
+        return SegmentSink(
+            args.segment_dir,
+            max_frames=args.segment_frames,
+            max_age=args.segment_seconds,
+            prefix=prefix,
+            compress=args.segment_compress,
+        )
+    return CsvSink(args.output)
+
+
+def create_consumers(args, worker_id=None):
+    consumers = []
+    if args.rollup_dir:
+        suffix = "" if worker_id is None else f".w{worker_id:02d}"
+        consumers.append(RollupAggregator(args.rollup_dir, suffix=suffix))
+    return consumers
+
+
+class DeviceFrameCounter:
+    """
+    BatchWriter 的消费者：在编码线程上按批统计每台设备的累计帧数，
+    接收线程上没有逐帧的额外工作。
+
+    安装了 numpy 时累计值保存在按设备ID排序的数组中，每批一次 unique 加一次
+    searchsorted 定位，没有逐设备的 Python 循环；否则退回 Counter。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        if np is not None:
+            self._ids = np.empty(0, dtype=np.uint32)
+            self._totals = np.empty(0, dtype=np.uint64)
+        else:
+            self._counter = Counter()
+
+    def consume(self, buf: bytes):
+        if np is None:
+            words = array("I", buf)
+            if sys.byteorder == "big":
+                words.byteswap()
+            with self._lock:
+                self._counter.update(words[0 :: MSG_LENGTH // 4])
+            return
+        device_ids, per_device = np.unique(
+            np.frombuffer(buf, dtype=FRAME_DTYPE)["device_id"], return_counts=True
+        )
+        with self._lock:
+            positions = np.searchsorted(self._ids, device_ids)
+            if len(device_ids) and (
+                positions[-1] >= len(self._ids)
+                or not np.array_equal(self._ids[positions], device_ids)
+            ):
+                # 出现新设备（少见）：合并ID表后重新定位
+                ids = np.union1d(self._ids, device_ids)
+                totals = np.zeros(len(ids), dtype=np.uint64)
+                totals[np.searchsorted(ids, self._ids)] = self._totals
+                self._ids, self._totals = ids, totals
+                positions = np.searchsorted(ids, device_ids)
+            self._totals[positions] += per_device.astype(np.uint64)
+
+    def counts(self):
+        """返回 [(设备ID, 累计条数), ...]，供指标接口抓取"""
+        with self._lock:
+            if np is None:
+                return list(self._counter.items())
+            return list(zip(self._ids.tolist(), self._totals.tolist()))
+
+    def close(self):
+        pass
+
+
+def register_metrics(writer: BatchWriter, device_counter: DeviceFrameCounter):
+    """抓取时读取的指标：队列状态与每设备累计帧数（帧率由 rate() 计算）"""
+    writer.register_metrics(REGISTRY)
+    REGISTRY.collector(
+        "telemetry_device_frames_total",
+        "每台设备累计进入写入级的报文条数（过载丢弃的不计）",
+        "counter",
+        lambda: [({"device": device_id}, count) for device_id, count in device_counter.counts()],
+    )
+
+
+# ===============================
+# 单进程运行 / 多进程（SO_REUSEPORT）
+# ===============================
+def run_server(args, worker_id=None):
+    # SIGTERM 与 Ctrl+C 一样走正常退出流程，保证队列中的数据落盘
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    tag = "" if worker_id is None else f"[进程 {worker_id}] "
+
+    consumers = create_consumers(args, worker_id)
+    device_counter = None
+    if args.metrics_port:
+        device_counter = DeviceFrameCounter()
+        consumers.append(device_counter)
+    writer = BatchWriter(
+        create_sink(args, worker_id),
+        batch_frames=args.batch_size,
+        flush_interval=args.flush_interval,
+        durability=args.durability,
+        verbose=args.verbose,
+        consumers=consumers,
+        input_frames=args.queue_frames,
+        overflow=args.overflow,
+        spill_path=os.path.join(args.spill_dir, f"spill-{worker_id or 0:02d}.bin"),
+        persist_batches=args.persist_batches,
+    ).start()
+    cache = None
+    if args.live_port:
+        cache = LatestTable(history=args.live_history)
+        start_live_server(cache, args.live_host, args.live_port + (worker_id or 0))
+    if args.metrics_port:
+        register_metrics(writer, device_counter)
+        start_metrics_server(args.metrics_host, args.metrics_port + (worker_id or 0))
+    ingest = Ingest(writer, cache)
+    reuse_port = worker_id is not None
     try:
-        with open(OUTPUT_FILE, "x", encoding="utf-8") as f:
-            header = "设备ID,上报时间,电流A,电流B,电流C,电压A,电压B,电压C,正向有功功率A,正向有功功率B,正向有功功率C\n"
-            f.write(header)
-    except FileExistsError:
+        if args.mode == "thread":
+            start_server(ingest, args.host, args.port, reuse_port)
+        else:
+            start_async_server(ingest, args.host, args.port, reuse_port)
+    except KeyboardInterrupt:
         pass
+    finally:
+        writer.stop()
+        stats = writer.input.stats()
+        print(
+            f"{tag}[退出] 共写入 {writer.frames_written} 条报文，"
+            f"丢弃 {stats['dropped']}，延迟 {stats['delayed']}，溢出 {stats['spilled']}"
+        )
 
-    start_server()
+
+def run_workers(args):
+    """
+    启动 N 个独立进程，各自绑定同一端口（SO_REUSEPORT），由内核分配新连接
+    """
+    print(f"[启动] {args.workers} 个工作进程，PID {os.getpid()}")
+    workers = [
+        multiprocessing.Process(target=run_server, args=(args, i), name=f"worker-{i}")
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for worker in workers:
+            worker.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.workers > 1:
+        run_workers(args)
+    else:
+        run_server(args)
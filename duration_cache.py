@@ -0,0 +1,149 @@
+"""
+视频时长的持久化缓存（SQLite）
+
+以 (路径, 大小, mtime_ns, inode) 为键缓存时长：文件未变化时直接返回缓存值，
+完全不读取文件内容；任何一项不一致即视为文件已变化，删除旧记录后重新测量。
+按最近使用时间淘汰，记录数超过上限时删除最久未用的部分。
+
+测量失败（get_video_length 返回 0）的文件不缓存，下次扫描会重试。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from video_probe import get_video_length
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".video_duration_cache.sqlite3")
+MAX_ENTRIES = 200_000
+COMMIT_EVERY = 500  # 累积多少条写入后提交一次
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode    INTEGER NOT NULL,
+    duration REAL    NOT NULL,
+    used     REAL    NOT NULL
+)
+"""
+
+
+class DurationCache:
+    """
+    线程安全；写入在内存中攒批，flush() 或 close() 时提交并按上限淘汰
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_puts = []
+        self._pending_used = []
+        self._pending_deletes = []
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+
+    # ---------- 查询 / 写入 ----------
+    def get(self, file_path: str, stat: os.stat_result = None):
+        """命中返回时长，未命中或文件已变化返回 None"""
+        stat = stat or os.stat(file_path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, inode, duration FROM durations WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[:3] != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+                self._pending_deletes.append((file_path,))
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_used.append((time.time(), file_path))
+            self._maybe_commit()
+            return row[3]
+
+    def put(self, file_path: str, stat: os.stat_result, duration: float):
+        with self._lock:
+            self._pending_puts.append(
+                (file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino, duration, time.time())
+            )
+            self._maybe_commit()
+
+    def video_length(self, file_path: str, stat: os.stat_result = None) -> float:
+        """带缓存的 get_video_length"""
+        stat = stat or os.stat(file_path)
+        duration = self.get(file_path, stat)
+        if duration is None:
+            duration = get_video_length(file_path)
+            if duration:
+                self.put(file_path, stat, duration)
+        return duration
+
+    # ---------- 提交 / 淘汰 ----------
+    def _maybe_commit(self):
+        pending = len(self._pending_puts) + len(self._pending_used) + len(self._pending_deletes)
+        if pending >= COMMIT_EVERY:
+            self._commit()
+
+    def _commit(self):
+        with self._db:
+            if self._pending_deletes:
+                self._db.executemany("DELETE FROM durations WHERE path = ?", self._pending_deletes)
+            if self._pending_puts:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?, ?, ?)",
+                    self._pending_puts,
+                )
+            if self._pending_used:
+                self._db.executemany(
+                    "UPDATE durations SET used = ? WHERE path = ?", self._pending_used
+                )
+        self._pending_puts.clear()
+        self._pending_used.clear()
+        self._pending_deletes.clear()
+
+    def evict(self) -> int:
+        """删除最久未用的记录直到不超过上限，返回删除条数"""
+        with self._lock:
+            self._commit()
+            count = self._db.execute("SELECT COUNT(*) FROM durations").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM durations WHERE path IN "
+                    "(SELECT path FROM durations ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            return excess
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+        self.evict()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
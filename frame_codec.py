@@ -0,0 +1,138 @@
+"""
+44 字节电力报文的批量编解码
+
+报文格式（小端序）: 2 个 uint32（设备ID、UTC 时间戳）+ 9 个 float32
+（电流A/B/C、电压A/B/C、正向有功功率A/B/C）。
+
+批量解码只做二进制拆包，得到列式数据；时间格式化与四舍五入
+推迟到真正输出（写 CSV、展示）时再做。
+"""
+
+import calendar
+import struct
+import time
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # 服务器热路径只依赖 struct，numpy 为可选
+    np = None
+
+FRAME_FORMAT = "<2I9f"
+FRAME_STRUCT = struct.Struct(FRAME_FORMAT)
+FRAME_SIZE = FRAME_STRUCT.size  # 44
+HEADER_STRUCT = struct.Struct("<2I")  # 设备ID + 时间戳，发送端改写报文头用
+
+FIELD_NAMES = (
+    "设备ID",
+    "上报时间",
+    "电流A",
+    "电流B",
+    "电流C",
+    "电压A",
+    "电压B",
+    "电压C",
+    "正向有功功率A",
+    "正向有功功率B",
+    "正向有功功率C",
+)
+CSV_HEADER = ",".join(FIELD_NAMES) + "\n"
+VALUE_DIGITS = (2, 2, 2, 1, 1, 1, 2, 2, 2)  # 9 个浮点通道的保留小数位
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+if np is not None:
+    FRAME_DTYPE = np.dtype(
+        [("device_id", "<u4"), ("timestamp", "<u4"), ("values", "<f4", (9,))]
+    )
+else:
+    FRAME_DTYPE = None
+
+
+# ===============================
+# 编码（模拟器 / 负载生成器）
+# ===============================
+def encode_frame(device_id: int, timestamp: int, values) -> bytes:
+    """values 为 9 个通道值，顺序同 FIELD_NAMES[2:]"""
+    return FRAME_STRUCT.pack(device_id, timestamp, *values)
+
+
+# ===============================
+# 批量解码
+# ===============================
+def unpack_rows(buf):
+    """
+    逐条拆包为 11 元组（不做舍入与时间格式化），buf 长度须为 44 的整数倍
+    """
+    return FRAME_STRUCT.iter_unpack(buf)
+
+
+def decode_frames(buf):
+    """
+    将 N 条报文解码为 NumPy 结构化数组（零拷贝视图）
+
+    列访问: arr["device_id"]、arr["timestamp"]、arr["values"][:, k]
+    """
+    if np is None:
+        raise RuntimeError("decode_frames 需要安装 numpy")
+    if len(buf) % FRAME_SIZE:
+        raise ValueError(
+            f"数据长度错误，应为 {FRAME_SIZE} 字节的整数倍，实际为 {len(buf)} 字节"
+        )
+    return np.frombuffer(buf, dtype=FRAME_DTYPE)
+
+
+def iter_array_rows(arr):
+    """把结构化数组还原为与 unpack_rows 相同的 11 元组"""
+    for device_id, timestamp, values in zip(
+        arr["device_id"].tolist(), arr["timestamp"].tolist(), arr["values"].tolist()
+    ):
+        yield (device_id, timestamp, *values)
+
+
+# ===============================
+# 延迟格式化（输出时）
+# ===============================
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp: int) -> str:
+    """同一秒内的大量报文共享一次 strftime"""
+    return time.strftime(TIME_FORMAT, time.gmtime(timestamp))
+
+
+def format_values(row):
+    """11 元组 -> 与 parse_message 完全一致的字段值列表"""
+    return [row[0], format_timestamp(row[1])] + [
+        round(value, digits) for value, digits in zip(row[2:], VALUE_DIGITS)
+    ]
+
+
+def format_record(row) -> dict:
+    """11 元组 -> parse_message 风格的字典"""
+    return dict(zip(FIELD_NAMES, format_values(row)))
+
+
+def format_csv_line(row) -> str:
+    return ",".join(str(value) for value in format_values(row)) + "\n"
+
+
+def format_csv_lines(rows):
+    """批量生成 CSV 行，输出与 handle_parsed_data 写入的内容逐字节一致"""
+    return [format_csv_line(row) for row in rows]
+
+
+# ===============================
+# CSV 解析（回放 / 基准）
+# ===============================
+@lru_cache(maxsize=4096)
+def parse_timestamp(text: str) -> int:
+    """format_timestamp 的逆运算（按 UTC 解释）"""
+    return calendar.timegm(time.strptime(text, TIME_FORMAT))
+
+
+def parse_csv_row(fields):
+    """
+    data_log.csv 中已按逗号拆分的一行 -> 11 元组；
+    字段数不对或无法解析时抛出 ValueError
+    """
+    if len(fields) != len(FIELD_NAMES):
+        raise ValueError(f"字段数应为 {len(FIELD_NAMES)}，实际为 {len(fields)}")
+    return (int(fields[0]), parse_timestamp(fields[1]), *map(float, fields[2:]))
@@ -0,0 +1,87 @@
+"""
+TCP 流定长报文分帧
+
+TCP 是字节流，多条报文可能被合并到一次 recv，也可能被拆到多次 recv。
+FrameBuffer 使用预分配的 bytearray 接收大块数据，以 memoryview 零拷贝地
+切出每一条完整报文，不完整的尾部留到下一次读取时拼接。
+"""
+
+import socket
+
+FRAME_SIZE = 44
+DEFAULT_CAPACITY_FRAMES = 64
+
+
+class FrameBuffer:
+    """
+    可复用的定长报文接收缓冲区
+
+    用法（阻塞 socket）:
+        frames = FrameBuffer()
+        while frames.recv_from(conn):
+            for frame in frames.iter_frames():
+                ...
+
+    用法（asyncio.BufferedProtocol）:
+        get_buffer()     -> frames.writable()
+        buffer_updated() -> frames.commit(n)，再调用 iter_frames()/pop_frames()
+
+    pop_frames()/iter_frames() 返回的视图指向内部缓冲区，
+    只在下一次 writable()/recv_from() 之前有效。
+    """
+
+    def __init__(self, frame_size=FRAME_SIZE, capacity_frames=DEFAULT_CAPACITY_FRAMES):
+        if capacity_frames < 2:
+            raise ValueError("缓冲区至少需要容纳 2 条报文")
+        self.frame_size = frame_size
+        self._buf = bytearray(frame_size * capacity_frames)
+        self._view = memoryview(self._buf)
+        self._start = 0  # 未消费数据起点
+        self._end = 0  # 有效数据终点
+        # 尚未凑成完整报文的字节数（= _end - _start）；普通属性而非 property，
+        # 接收路径每次读取都要检查，property 调用比读取属性慢数倍
+        self.pending = 0
+
+    def writable(self) -> memoryview:
+        """
+        返回可写入的空闲区域，必要时先把残余的半帧搬到缓冲区开头
+        """
+        if self._start:
+            remain = self.pending
+            if remain:
+                self._buf[:remain] = self._buf[self._start : self._end]
+            self._start = 0
+            self._end = remain
+        return self._view[self._end :]
+
+    def commit(self, nbytes: int):
+        """登记新写入 writable() 区域的字节数"""
+        self._end += nbytes
+        self.pending += nbytes
+
+    def recv_from(self, conn: socket.socket) -> int:
+        """
+        从阻塞 socket 读取一块数据到缓冲区，返回读取字节数（0 表示对端关闭）
+        """
+        nbytes = conn.recv_into(self.writable())
+        self._end += nbytes
+        self.pending += nbytes
+        return nbytes
+
+    def pop_frames(self) -> memoryview:
+        """
+        取出当前全部完整报文，返回连续的只读视图（长度为 frame_size 的整数倍）
+        """
+        remain = self.pending
+        complete = remain // self.frame_size * self.frame_size
+        start = self._start
+        self._start += complete
+        self.pending = remain - complete
+        return self._view[start : start + complete].toreadonly()
+
+    def iter_frames(self):
+        """逐条产出完整报文的零拷贝视图"""
+        block = self.pop_frames()
+        size = self.frame_size
+        for offset in range(0, len(block), size):
+            yield block[offset : offset + size]
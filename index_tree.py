@@ -0,0 +1,248 @@
+"""
+ScanIndex 与 Treeview 的绑定
+
+树节点ID与索引编号分开：dir_items / file_items 记录 节点ID -> 编号。
+增量更新得到新索引后只需改写这两个映射、修改变化的值、插入新增和删除消失的
+节点，已展开的目录、选中状态和滚动位置都保持不变。
+
+目录首次展开时才插入其子节点（先放一个占位子节点显示展开标记）；
+实时扫描（TreeFeed）插入的树是完整的，用 attach_scan 建立映射。
+
+选中统计（update_selection）直接取索引中的时长与子树总时长，不解析显示文字；
+目录与其下的文件/子目录同时选中时只计最上层的那个。选中变化只涉及文件时
+按增减量更新，涉及目录时才对整个选中集合重算。时长以整数纳秒累加，增减不产生误差。
+只在 Tk 主线程中使用。
+"""
+
+import itertools
+from collections import deque
+
+
+class IndexTree:
+    def __init__(self, tree, format_time):
+        self.tree = tree
+        self.format_time = format_time
+        self.index = None
+        self.dir_items = {}  # 节点ID -> 目录编号
+        self.file_items = {}  # 节点ID -> 文件编号
+        self._expanded = set()  # 子节点已插入的目录节点
+        self._ids = itertools.count()
+        self._reset_selection()
+
+    def _new_id(self) -> str:
+        return f"i{next(self._ids)}"
+
+    def clear(self):
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        self.index = None
+        self.dir_items.clear()
+        self.file_items.clear()
+        self._expanded.clear()
+        self._reset_selection()
+
+    # ---------- 构建 ----------
+    def show(self, index):
+        """显示加载的结果：只插入根目录并展开一层"""
+        self.clear()
+        self.index = index
+        if not index.dir_names:
+            return None
+        root_id = self._insert_dir("", 0)
+        self.expand(root_id)
+        self.tree.item(root_id, open=True)
+        return root_id
+
+    def attach_scan(self, root_node, index):
+        """实时扫描插入的树（节点ID在 node.tag 中）与其 ScanIndex 建立映射"""
+        self.index = index
+        self.dir_items.clear()
+        self.file_items.clear()
+        self._expanded.clear()
+        self._reset_selection()
+        dir_id = file_id = 0
+        queue = deque([root_node])
+        while queue:  # 与 ScanIndex.from_node 相同的广度优先顺序
+            node = queue.popleft()
+            current_id, file_ids = node.tag
+            self.dir_items[current_id] = dir_id
+            self._expanded.add(current_id)
+            dir_id += 1
+            for item_id in file_ids:
+                self.file_items[item_id] = file_id
+                file_id += 1
+            queue.extend(node.subdirs)
+
+    def _insert_dir(self, parent: str, dir_id: int, position="end") -> str:
+        index = self.index
+        item_id = self.tree.insert(
+            parent, position, iid=self._new_id(),
+            text=index.dir_names[dir_id],
+            values=[self.format_time(index.dir_totals[dir_id])]
+        )
+        self.dir_items[item_id] = dir_id
+        if index.has_children(dir_id):
+            self.tree.insert(item_id, "end", iid=item_id + "~", text="...")
+        return item_id
+
+    def _insert_file(self, parent: str, file_id: int, position="end") -> str:
+        index = self.index
+        item_id = self.tree.insert(
+            parent, position, iid=self._new_id(),
+            text=index.file_names[file_id],
+            values=[self.format_time(index.file_lengths[file_id])]
+        )
+        self.file_items[item_id] = file_id
+        return item_id
+
+    def expand(self, item_id: str):
+        """首次展开目录时插入其文件和子目录（顺序与原来一致：先文件后子目录）"""
+        dir_id = self.dir_items.get(item_id)
+        if dir_id is None or item_id in self._expanded:
+            return
+        self._expanded.add(item_id)
+        if self.tree.exists(item_id + "~"):
+            self.tree.delete(item_id + "~")
+        for file_id in self.index.files(dir_id):
+            self._insert_file(item_id, file_id)
+        for subdir_id in self.index.subdirs(dir_id):
+            self._insert_dir(item_id, subdir_id)
+
+    # ---------- 增量更新 ----------
+    def patch(self, index):
+        """
+        换成新索引，原地修改树：按名称对应新旧节点，只改动变化的部分。
+        仍然选中的节点按新索引重新统计，返回值同 update_selection
+        """
+        old = self.index
+        roots = self.tree.get_children()
+        if old is None or not roots or not index.dir_names:
+            self.show(index)
+        else:
+            self.index = index
+            self._reset_selection()  # 编号已变化，按新索引重算
+            self._patch_dir(roots[0], 0, old)
+        return self.update_selection(self.tree.selection())
+
+    def _patch_dir(self, item_id: str, dir_id: int, old):
+        tree, new = self.tree, self.index
+        old_dir_id = self.dir_items[item_id]
+        self.dir_items[item_id] = dir_id
+        if new.dir_totals[dir_id] != old.dir_totals[old_dir_id]:
+            tree.item(item_id, values=[self.format_time(new.dir_totals[dir_id])])
+
+        if item_id not in self._expanded:
+            # 未展开的目录只需保证展开标记正确
+            stub = item_id + "~"
+            if new.has_children(dir_id) and not tree.exists(stub):
+                tree.insert(item_id, "end", iid=stub, text="...")
+            elif not new.has_children(dir_id) and tree.exists(stub):
+                tree.delete(stub)
+            return
+
+        new_files = {new.file_names[j]: j for j in new.files(dir_id)}
+        new_dirs = {new.dir_names[i]: i for i in new.subdirs(dir_id)}
+        file_count = 0
+        for child in tree.get_children(item_id):
+            old_file_id = self.file_items.get(child)
+            if old_file_id is not None:
+                file_id = new_files.pop(old.file_names[old_file_id], None)
+                if file_id is None:
+                    del self.file_items[child]
+                    tree.delete(child)
+                    continue
+                self.file_items[child] = file_id
+                if new.file_lengths[file_id] != old.file_lengths[old_file_id]:
+                    tree.item(child, values=[self.format_time(new.file_lengths[file_id])])
+                file_count += 1
+            else:
+                subdir_id = new_dirs.pop(old.dir_names[self.dir_items[child]], None)
+                if subdir_id is None:
+                    self._forget(child)
+                    tree.delete(child)
+                else:
+                    self._patch_dir(child, subdir_id, old)
+
+        # 新增的文件排在已有文件之后、子目录之前
+        for file_id in new_files.values():
+            self._insert_file(item_id, file_id, file_count)
+            file_count += 1
+        for subdir_id in new_dirs.values():
+            self._insert_dir(item_id, subdir_id)
+
+    def _forget(self, item_id: str):
+        for child in self.tree.get_children(item_id):
+            self._forget(child)
+        self.dir_items.pop(item_id, None)
+        self.file_items.pop(item_id, None)
+        self._expanded.discard(item_id)
+
+    # ---------- 选中统计 ----------
+    def _reset_selection(self):
+        self._selected = set()  # 当前选中且有对应编号的节点
+        self._selected_dirs = set()  # 选中的目录编号
+        self._counted = {}  # 实际计入的节点 -> (纳秒, 视频数)，祖先目录也被选中的不在其中
+        self._total_ns = 0
+        self._videos = 0
+        self._file_count = 0
+
+    def _covered(self, dir_id: int) -> bool:
+        """dir_id 或其祖先目录是否被选中"""
+        parent, selected_dirs = self.index.dir_parent, self._selected_dirs
+        while dir_id >= 0:
+            if dir_id in selected_dirs:
+                return True
+            dir_id = parent[dir_id]
+        return False
+
+    def _count(self, item_id: str):
+        index = self.index
+        file_id = self.file_items.get(item_id)
+        if file_id is not None:
+            if self._covered(index.file_dir[file_id]):
+                return
+            value = (round(index.file_lengths[file_id] * 1e9), 1)
+        else:
+            dir_id = self.dir_items[item_id]
+            if self._covered(index.dir_parent[dir_id]):
+                return
+            value = (round(index.dir_totals[dir_id] * 1e9), index.dir_videos[dir_id])
+        self._counted[item_id] = value
+        self._total_ns += value[0]
+        self._videos += value[1]
+
+    def _uncount(self, item_id: str):
+        value = self._counted.pop(item_id, None)
+        if value is not None:
+            self._total_ns -= value[0]
+            self._videos -= value[1]
+
+    def update_selection(self, selection):
+        """
+        按新的选中集合（tree.selection()）更新统计，
+        返回 (选中文件数, 选中目录数, 包含的视频数, 总时长秒数)
+        """
+        if self.index is None:
+            return 0, 0, 0, 0.0
+        items = {item for item in selection if item in self.file_items or item in self.dir_items}
+        added = items - self._selected
+        removed = self._selected - items
+
+        if any(item in self.dir_items for item in added) or any(item in self.dir_items for item in removed):
+            # 目录的选中状态变化会影响其下所有节点是否计入，重算
+            self._reset_selection()
+            self._selected = items
+            self._selected_dirs = {self.dir_items[item] for item in items if item in self.dir_items}
+            self._file_count = len(items) - len(self._selected_dirs)
+            for item in items:
+                self._count(item)
+        else:
+            for item in removed:
+                self._uncount(item)
+            for item in added:
+                self._count(item)
+            self._selected = items
+            self._file_count += len(added) - len(removed)
+
+        dir_count = len(self._selected) - self._file_count
+        return self._file_count, dir_count, self._videos, self._total_ns / 1e9
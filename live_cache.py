@@ -0,0 +1,257 @@
+"""
+设备最新值缓存与本地实时查询接口
+
+LatestTable 在接收路径上维护每台设备的最新一条原始报文（bytearray 按槽位
+紧凑存放，设备ID -> 槽位为 O(1) 字典查找），可选为每台设备保留最近
+history 条报文的环形缓冲区。查询只读内存，不读磁盘。
+
+安装了 numpy 时，多帧的报文块整块更新：一次解出设备ID，每台设备只取块内
+最后一帧，按槽位一次写入；逐帧的 Python 循环只用于很短的块。
+
+HTTP 接口（client.py --live-port 启用，默认 127.0.0.1:9528）:
+    GET /devices                 已上报设备ID列表
+    GET /latest/<设备ID>          该设备最新一条报文
+    GET /latest?ids=1,2,3        多台设备最新报文（省略 ids 返回全部）
+    GET /recent/<设备ID>?n=10     该设备最近 n 条报文（需开启 history）
+"""
+
+import json
+import struct
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from frame_codec import FRAME_DTYPE, FRAME_SIZE, FRAME_STRUCT, format_record, np
+
+LIVE_HOST = "127.0.0.1"
+LIVE_PORT = 9528
+DEVICE_ID = struct.Struct("<I")
+VECTOR_MIN_FRAMES = 32  # 不少于此帧数的块走 numpy 整块更新，更短的块逐帧更新开销更小
+
+
+# ===============================
+# 最新值表 + 环形缓冲区
+# ===============================
+class LatestTable:
+    """
+    设备ID -> 槽位；槽位 i 的最新报文位于 frames[i*44:(i+1)*44]
+    """
+
+    def __init__(self, capacity: int = 1024, history: int = 0):
+        self.history = history
+        self._slots = {}
+        self._frames = bytearray(capacity * FRAME_SIZE)
+        self._received = array("d", bytes(8 * capacity))
+        self._counts = array("Q", bytes(8 * capacity))
+        self._rings = []  # 每槽一个 bytearray(history * 44)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _new_slot(self, device_id: int) -> int:
+        slot = len(self._slots)
+        if (slot + 1) * FRAME_SIZE > len(self._frames):
+            self._frames.extend(bytes(len(self._frames)))
+            self._received.extend(array("d", bytes(8 * len(self._received))))
+            self._counts.extend(array("Q", bytes(8 * len(self._counts))))
+        if self.history:
+            self._rings.append(bytearray(self.history * FRAME_SIZE))
+        self._slots[device_id] = slot
+        return slot
+
+    def update(self, block):
+        """写入一段完整报文（长度为 44 的整数倍），同一设备后到的覆盖先到的"""
+        count = len(block) // FRAME_SIZE
+        if np is not None and count >= VECTOR_MIN_FRAMES:
+            self._update_block(block, count)
+        else:
+            self._update_frames(block)
+
+    def _update_frames(self, block):
+        now = time.time()
+        view = memoryview(block)
+        slots = self._slots
+        frames = self._frames
+        with self._lock:
+            for offset in range(0, len(view), FRAME_SIZE):
+                device_id = DEVICE_ID.unpack_from(view, offset)[0]
+                slot = slots.get(device_id)
+                if slot is None:
+                    slot = self._new_slot(device_id)
+                    frames = self._frames
+                frame = view[offset : offset + FRAME_SIZE]
+                start = slot * FRAME_SIZE
+                frames[start : start + FRAME_SIZE] = frame
+                self._received[slot] = now
+                if self.history:
+                    pos = self._counts[slot] % self.history * FRAME_SIZE
+                    self._rings[slot][pos : pos + FRAME_SIZE] = frame
+                self._counts[slot] += 1
+
+    def _update_block(self, block, count: int):
+        now = time.time()
+        arr = np.frombuffer(block, dtype=FRAME_DTYPE, count=count)
+        device_ids = arr["device_id"]
+        # 倒序后的首次出现即原顺序中的最后一帧
+        unique_ids, reversed_first, per_device = np.unique(
+            device_ids[::-1], return_index=True, return_counts=True
+        )
+        last = count - 1 - reversed_first
+        with self._lock:
+            slots = self._slots
+            slot_list = [slots.get(device_id) for device_id in unique_ids.tolist()]
+            for i, slot in enumerate(slot_list):
+                if slot is None:
+                    slot_list[i] = self._new_slot(int(unique_ids[i]))
+            # 缓冲区的 numpy 视图在本函数返回时释放，之后 _new_slot 才能扩容
+            index = np.array(slot_list, dtype=np.intp)
+            np.frombuffer(self._frames, dtype=FRAME_DTYPE)[index] = arr[last]
+            np.frombuffer(self._received, dtype=np.float64)[index] = now
+            counts = np.frombuffer(self._counts, dtype=np.uint64)
+            if self.history:
+                self._fill_rings(arr, device_ids, slot_list, per_device, counts)
+            counts[index] += per_device.astype(np.uint64)
+
+    def _fill_rings(self, arr, device_ids, slot_list, per_device, counts):
+        """每台设备最多写入块内最后 history 帧（按设备分组，组内保持到达顺序）"""
+        order = np.argsort(device_ids, kind="stable")
+        ends = np.cumsum(per_device)
+        for slot, start, end in zip(slot_list, (ends - per_device).tolist(), ends.tolist()):
+            rows = order[max(start, end - self.history) : end]
+            first = int(counts[slot]) + (end - start) - len(rows)
+            positions = (first + np.arange(len(rows))) % self.history
+            np.frombuffer(self._rings[slot], dtype=FRAME_DTYPE)[positions] = arr[rows]
+
+    def devices(self):
+        with self._lock:
+            return sorted(self._slots)
+
+    def counts(self):
+        """返回 [(设备ID, 累计条数), ...]，供指标接口抓取"""
+        with self._lock:
+            return [(device_id, self._counts[slot]) for device_id, slot in self._slots.items()]
+
+    def latest(self, device_id: int):
+        """返回 (报文 bytes, 接收时间, 累计条数)，设备未上报时返回 None"""
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is None:
+                return None
+            start = slot * FRAME_SIZE
+            return (
+                bytes(self._frames[start : start + FRAME_SIZE]),
+                self._received[slot],
+                self._counts[slot],
+            )
+
+    def recent(self, device_id: int, n: int = None):
+        """返回该设备最近 n 条报文（从旧到新），未开启 history 时只有最新一条"""
+        if not self.history:
+            latest = self.latest(device_id)
+            return [] if latest is None else [latest[0]]
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is None:
+                return []
+            count = self._counts[slot]
+            n = min(count, self.history, n or self.history)
+            ring = self._rings[slot]
+            frames = []
+            for seq in range(count - n, count):
+                pos = seq % self.history * FRAME_SIZE
+                frames.append(bytes(ring[pos : pos + FRAME_SIZE]))
+            return frames
+
+
+# ===============================
+# HTTP 查询接口
+# ===============================
+def frame_to_dict(frame: bytes) -> dict:
+    return format_record(FRAME_STRUCT.unpack(frame))
+
+
+class LiveQueryHandler(BaseHTTPRequestHandler):
+    table: LatestTable = None
+    routes = {}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+        route = self.routes.get(parts[0] if parts else "")
+        if route is None:
+            self.send_json(404, {"error": "未知路径"})
+            return
+        try:
+            route(self, parts[1:], query)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_body(status, body, "application/json; charset=utf-8")
+
+    def log_message(self, format, *args):
+        pass  # 查询接口不刷屏
+
+    def handle_devices(self, args, query):
+        devices = self.table.devices()
+        self.send_json(200, {"count": len(devices), "devices": devices})
+
+    def handle_latest(self, args, query):
+        if args:
+            ids = [int(args[0])]
+        elif "ids" in query:
+            ids = [int(x) for x in query["ids"][0].split(",") if x]
+        else:
+            ids = self.table.devices()
+        result = []
+        for device_id in ids:
+            latest = self.table.latest(device_id)
+            if latest is None:
+                continue
+            frame, received, count = latest
+            record = frame_to_dict(frame)
+            record["接收时间"] = received
+            record["累计条数"] = count
+            result.append(record)
+        if args and not result:
+            self.send_json(404, {"error": f"设备 {args[0]} 尚未上报"})
+        elif args:
+            self.send_json(200, result[0])
+        else:
+            self.send_json(200, result)
+
+    def handle_recent(self, args, query):
+        if not args:
+            raise ValueError("缺少设备ID")
+        n = int(query.get("n", ["0"])[0]) or None
+        frames = self.table.recent(int(args[0]), n)
+        self.send_json(200, [frame_to_dict(frame) for frame in frames])
+
+
+LiveQueryHandler.routes = {
+    "devices": LiveQueryHandler.handle_devices,
+    "latest": LiveQueryHandler.handle_latest,
+    "recent": LiveQueryHandler.handle_recent,
+}
+
+
+def start_live_server(table: LatestTable, host: str = LIVE_HOST, port: int = LIVE_PORT):
+    """在后台线程中启动查询接口，返回 HTTP 服务器对象"""
+    handler = type("BoundLiveQueryHandler", (LiveQueryHandler,), {"table": table})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="live-query", daemon=True).start()
+    print(f"[启动] 实时查询接口 http://{host}:{port}/latest/<设备ID>")
+    return server
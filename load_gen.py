@@ -0,0 +1,491 @@
+"""
+高并发 asyncio 负载生成器
+
+单个事件循环承载大量设备连接（每连接只有一个带 __slots__ 的 Protocol 对象，
+没有线程或协程），由一个固定节拍的调度循环统一发送:
+
+    稳态速率   每台设备 --rate 帧/秒，发送时刻在设备间均匀错开
+    突发       --burst 帧数:间隔秒，每隔若干秒每台设备一次性连发若干帧
+    连接抖动   --churn 比例，每秒随机断开该比例的连接并立即重连
+
+报文格式与 sender.py / client.py 相同（frame_codec）。安装了 numpy 时报文由
+payload_engine 整轮预生成（--model / --seed），发送时只改写时间戳，按设备切片
+交给 transport.write；否则退回逐帧改写报文头的方式。结束时报告实际发送速率、
+建连延迟，以及发送调度延迟（计划发送时刻到实际写入 socket 的时间）分位数。
+服务器反压（写缓冲区超过高水位）时该连接本轮不发送，计入“跳过”。
+
+单进程受限于一个 CPU 核与本地端口数（每个源地址约 2.8 万个），十万级连接请用
+--processes 多进程，并用 --source-ips 指定多个本地源地址。
+
+用法:
+    python load_gen.py --devices 10000 --rate 1 --duration 60
+    python load_gen.py --devices 1000 --rate 50 --burst 20:5
+    python load_gen.py --devices 10000 --churn 0.01
+    python load_gen.py --devices 100000 --processes 4 \\
+        --source-ips 127.0.0.2,127.0.0.3,127.0.0.4,127.0.0.5
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import signal
+import time
+
+from client import raise_fd_limit
+from frame_codec import FRAME_SIZE, HEADER_STRUCT, np
+from payload_engine import MODELS, PayloadEngine, as_buffer, device_slices, stamp
+from sender import generate_message
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 9527
+TICK = 0.01  # 调度节拍（秒）
+PAYLOAD_POOL = 1024  # 无 numpy 时预生成的测量值组数，发送时只改写报文头
+LATENCY_SAMPLES = 100_000  # 每进程最多保留的延迟样本数
+
+
+# ===============================
+# 延迟统计
+# ===============================
+class Reservoir:
+    """定长蓄水池抽样，用有限内存估计分位数"""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.size = size
+        self.samples = []
+        self.count = 0
+        self._random = random.Random(0)
+
+    def add(self, value: float):
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            j = self._random.randrange(self.count)
+            if j < self.size:
+                self.samples[j] = value
+
+
+def percentiles(samples, points=(50, 90, 99, 99.9)) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {
+        f"p{p:g}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+        for p in points
+    }
+    result["max"] = ordered[-1]
+    return result
+
+
+def format_percentiles(samples) -> str:
+    values = percentiles(samples)
+    if not values:
+        return "无样本"
+    return " ".join(f"{key}={value * 1000:.2f}ms" for key, value in values.items())
+
+
+# ===============================
+# 设备连接
+# ===============================
+class DeviceProtocol(asyncio.Protocol):
+    __slots__ = ("generator", "index", "transport", "paused", "churned")
+
+    def __init__(self, generator, index: int):
+        self.generator = generator
+        self.index = index
+        self.transport = None
+        self.paused = False
+        self.churned = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.generator.on_connected(self)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+
+    def data_received(self, data):
+        pass
+
+    def connection_lost(self, exc):
+        self.generator.on_lost(self)
+
+
+# ===============================
+# 负载生成器
+# ===============================
+class LoadGenerator:
+    def __init__(self, args, first_id: int, count: int, tag: str = ""):
+        self.args = args
+        self.first_id = first_id
+        self.tag = tag
+        self.conns = [None] * count
+        self.connected = 0
+        self.stopping = False
+        self._tasks = set()
+        self._cursor = 0
+        self._credit = 0.0
+        self._churn_credit = 0.0
+        self._random = random.Random(first_id)
+        self.engine = None
+        if np is not None:
+            self.engine = PayloadEngine(
+                np.arange(first_id, first_id + count),
+                model=args.model,
+                seed=None if args.seed is None else (args.seed, first_id),
+            )
+            self._round = None
+        else:
+            self._payloads = [bytearray(generate_message(0)) for _ in range(PAYLOAD_POOL)]
+            self._payload_index = 0
+
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.skipped_frames = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.churned = 0
+        self.connect_latency = Reservoir()
+        self.send_lag = Reservoir()
+
+    # ---------- 连接管理 ----------
+    def on_connected(self, protocol):
+        self.conns[protocol.index] = protocol
+        self.connected += 1
+        self.connects += 1
+
+    def on_lost(self, protocol):
+        if self.conns[protocol.index] is not protocol:
+            return
+        self.conns[protocol.index] = None
+        self.connected -= 1
+        if self.stopping:
+            return
+        if protocol.churned:
+            self.spawn(self.connect(protocol.index))
+        else:
+            self.disconnects += 1
+            self.spawn(self.connect(protocol.index, self.args.reconnect_delay))
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def connect(self, index: int, delay: float = 0.0):
+        if delay:
+            await asyncio.sleep(delay)
+        if self.stopping:
+            return
+        loop = asyncio.get_running_loop()
+        local_addr = None
+        if self.args.source_ips:
+            local_addr = (self.args.source_ips[index % len(self.args.source_ips)], 0)
+        async with self._connect_slots:
+            start = time.perf_counter()
+            try:
+                await loop.create_connection(
+                    lambda: DeviceProtocol(self, index),
+                    self.args.host,
+                    self.args.port,
+                    local_addr=local_addr,
+                )
+            except OSError:
+                self.connect_failures += 1
+                self.spawn(self.connect(index, self.args.reconnect_delay))
+                return
+            self.connect_latency.add(time.perf_counter() - start)
+
+    async def ramp_up(self):
+        """按 --connect-rate 逐步建立全部连接，等待所有建连尝试完成"""
+        self._connect_slots = asyncio.Semaphore(self.args.connect_concurrency)
+        per_tick = max(1, int(self.args.connect_rate * TICK))
+        for start in range(0, len(self.conns), per_tick):
+            for index in range(start, min(start + per_tick, len(self.conns))):
+                self.spawn(self.connect(index))
+            await asyncio.sleep(TICK)
+        while self.connected + self.connect_failures < len(self.conns) and self._tasks:
+            await asyncio.sleep(TICK)
+
+    # ---------- 发送 ----------
+    def write(self, index: int, data, frames: int):
+        conn = self.conns[index]
+        if conn is None or conn.churned:
+            return
+        if conn.paused:
+            self.skipped_frames += frames
+            return
+        conn.transport.write(data)
+        self.sent_frames += frames
+        self.sent_bytes += len(data)
+
+    def frame(self, index: int, timestamp: int) -> bytes:
+        """无 numpy 时的后备路径：轮流取预生成的测量值，改写报文头"""
+        payload = self._payloads[self._payload_index]
+        self._payload_index = (self._payload_index + 1) % PAYLOAD_POOL
+        HEADER_STRUCT.pack_into(payload, 0, self.first_id + index, timestamp)
+        return bytes(payload)
+
+    def send_frames(self, rows, frames: int, timestamp: int):
+        """rows 中每台设备各连发 frames 帧"""
+        if self.engine is None:
+            for index in rows:
+                data = b"".join(self.frame(index, timestamp) for _ in range(frames))
+                self.write(index, data, frames)
+            return
+        batch = as_buffer(self.engine.batch(rows, timestamp, frames))
+        for index, (start, end) in zip(rows, device_slices(len(rows), frames)):
+            self.write(index, batch[start:end], frames)
+
+    def send_range(self, start: int, stop: int, timestamp: int):
+        """[start, stop) 的设备各发一帧；numpy 路径取自本轮预生成的报文"""
+        if self.engine is None:
+            for index in range(start, stop):
+                self.write(index, self.frame(index, timestamp), 1)
+            return
+        if self._round is None:
+            self._round = self.engine.batch(timestamp=timestamp)
+            self._round_buffer = as_buffer(self._round)
+        stamp(self._round[start:stop], timestamp)
+        buffer = self._round_buffer
+        for index in range(start, stop):
+            self.write(index, buffer[index * FRAME_SIZE : (index + 1) * FRAME_SIZE], 1)
+        if stop == len(self.conns):
+            # 一轮用完后换新数组，已交给 transport 的切片不会再被改写
+            self._round = None
+
+    def send_round(self, frames: int, timestamp: int):
+        """本节拍共发送 frames 帧，按设备轮转均匀分摊"""
+        count = len(self.conns)
+        full, rest = divmod(frames, count)
+        if full:
+            self.send_frames(range(count), full, timestamp)
+        cursor = self._cursor
+        while rest:
+            stop = min(count, cursor + rest)
+            self.send_range(cursor, stop, timestamp)
+            rest -= stop - cursor
+            cursor = 0 if stop == count else stop
+        self._cursor = cursor
+
+    def churn(self, connections: int):
+        for _ in range(connections):
+            conn = self.conns[self._random.randrange(len(self.conns))]
+            if conn is not None and not conn.churned:
+                conn.churned = True
+                self.churned += 1
+                conn.transport.close()
+
+    async def send_loop(self, stop: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        args = self.args
+        per_tick = args.rate * len(self.conns) * TICK
+        burst_frames, burst_interval = args.burst or (0, 0.0)
+        start = loop.time()
+        deadline = start + args.duration if args.duration else None
+        next_tick = start
+        next_burst = start + burst_interval
+        next_report = start + args.report_interval
+        last_sent = 0
+        while not stop.is_set() and (deadline is None or next_tick < deadline):
+            next_tick += TICK
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = loop.time()
+            timestamp = int(time.time())
+
+            self._credit += per_tick
+            frames = int(self._credit)
+            self._credit -= frames
+            if frames:
+                self.send_lag.add(max(0.0, now - next_tick))
+                self.send_round(frames, timestamp)
+            if burst_frames and now >= next_burst:
+                next_burst += burst_interval
+                self.send_frames(range(len(self.conns)), burst_frames, timestamp)
+            if args.churn:
+                self._churn_credit += args.churn * self.connected * TICK
+                connections = int(self._churn_credit)
+                self._churn_credit -= connections
+                self.churn(connections)
+
+            if now >= next_report:
+                rate = (self.sent_frames - last_sent) / args.report_interval
+                last_sent = self.sent_frames
+                next_report += args.report_interval
+                print(
+                    f"{self.tag}[负载] {now - start:6.1f}s 连接 {self.connected:,}/{len(self.conns):,} "
+                    f"发送 {rate:,.0f} 帧/s 跳过 {self.skipped_frames:,} "
+                    f"断线 {self.disconnects:,} 抖动 {self.churned:,}"
+                )
+        return loop.time() - start
+
+    # ---------- 运行 ----------
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+
+        ramp_start = time.perf_counter()
+        await self.ramp_up()
+        print(
+            f"{self.tag}[负载] 已建立 {self.connected:,}/{len(self.conns):,} 个连接，"
+            f"耗时 {time.perf_counter() - ramp_start:.1f}s，失败 {self.connect_failures:,}"
+        )
+        elapsed = await self.send_loop(stop)
+        await self.close()
+        return self.summary(elapsed)
+
+    async def close(self):
+        """停止重连并关闭全部连接（已写入的数据会先发完）"""
+        self.stopping = True
+        for task in list(self._tasks):
+            task.cancel()
+        for conn in self.conns:
+            if conn is not None:
+                conn.transport.close()
+        await asyncio.sleep(0.1)
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "devices": len(self.conns),
+            "elapsed": elapsed,
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "skipped_frames": self.skipped_frames,
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "churned": self.churned,
+            "connect_latency": self.connect_latency.samples,
+            "send_lag": self.send_lag.samples,
+        }
+
+
+# ===============================
+# 单进程 / 多进程
+# ===============================
+def run_generator(args, first_id: int, count: int, tag: str = "", results=None) -> dict:
+    raise_fd_limit()
+    summary = asyncio.run(LoadGenerator(args, first_id, count, tag).run())
+    if results is not None:
+        results.put(summary)
+    return summary
+
+
+def run_processes(args) -> list:
+    results = multiprocessing.Queue()
+    share, extra = divmod(args.devices, args.processes)
+    workers = []
+    first_id = args.first_id
+    for i in range(args.processes):
+        count = share + (1 if i < extra else 0)
+        workers.append(
+            multiprocessing.Process(
+                target=run_generator,
+                args=(args, first_id, count, f"[进程 {i}] ", results),
+                name=f"load-{i}",
+            )
+        )
+        first_id += count
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # 由各子进程自行处理 Ctrl+C
+    summaries = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return summaries
+
+
+def print_summary(summaries):
+    elapsed = max(s["elapsed"] for s in summaries) or 1e-9
+    total = {
+        key: sum(s[key] for s in summaries)
+        for key in (
+            "devices",
+            "sent_frames",
+            "sent_bytes",
+            "skipped_frames",
+            "connects",
+            "connect_failures",
+            "disconnects",
+            "churned",
+        )
+    }
+    connect_latency = [v for s in summaries for v in s["connect_latency"]]
+    send_lag = [v for s in summaries for v in s["send_lag"]]
+    print(f"[结果] 设备 {total['devices']:,}，持续 {elapsed:.1f}s")
+    print(
+        f"[结果] 发送 {total['sent_frames']:,} 帧，"
+        f"{total['sent_frames'] / elapsed:,.0f} 帧/s，"
+        f"{total['sent_bytes'] / elapsed / 1e6:.2f} MB/s，反压跳过 {total['skipped_frames']:,} 帧"
+    )
+    print(
+        f"[结果] 建连 {total['connects']:,} 次，失败 {total['connect_failures']:,}，"
+        f"异常断线 {total['disconnects']:,}，主动抖动 {total['churned']:,}"
+    )
+    print(f"[结果] 建连延迟 {format_percentiles(connect_latency)}")
+    print(f"[结果] 调度延迟 {format_percentiles(send_lag)}")
+
+
+def parse_burst(text: str):
+    frames, interval = text.split(":")
+    return int(frames), float(interval)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="电力报文高并发负载生成器")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--devices", type=int, default=1000, help="模拟设备（连接）数")
+    parser.add_argument("--first-id", type=int, default=0, help="起始设备ID")
+    parser.add_argument("--rate", type=float, default=1.0, help="每台设备每秒发送帧数")
+    parser.add_argument(
+        "--burst", type=parse_burst, help="突发模式 帧数:间隔秒，如 20:5"
+    )
+    parser.add_argument(
+        "--model", choices=MODELS, default="uniform", help="测量值模型（需要 numpy）"
+    )
+    parser.add_argument("--seed", type=int, help="随机种子，指定后各次运行的报文数值相同")
+    parser.add_argument(
+        "--churn", type=float, default=0.0, help="每秒断开并重连的连接比例，如 0.01"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="发送时长（秒），0 表示直到 Ctrl+C")
+    parser.add_argument("--processes", type=int, default=1, help="进程数，设备平均分配")
+    parser.add_argument(
+        "--source-ips",
+        type=lambda s: [ip for ip in s.split(",") if ip],
+        help="逗号分隔的本地源地址，突破单个源地址的端口数限制",
+    )
+    parser.add_argument("--connect-rate", type=float, default=5000.0, help="每秒发起的建连数")
+    parser.add_argument("--connect-concurrency", type=int, default=1000, help="同时进行的建连数上限")
+    parser.add_argument("--reconnect-delay", type=float, default=1.0, help="异常断线后重连等待（秒）")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="进度输出间隔（秒）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(
+        f"[启动] {args.devices:,} 台设备 -> {args.host}:{args.port}，"
+        f"目标 {args.devices * args.rate:,.0f} 帧/s（{FRAME_SIZE} 字节/帧）"
+    )
+    if args.processes > 1:
+        summaries = run_processes(args)
+    else:
+        summaries = [run_generator(args, args.first_id, args.devices)]
+    print_summary(summaries)
+
+
+if __name__ == "__main__":
+    main()
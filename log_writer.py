@@ -0,0 +1,261 @@
+"""
+批量落盘写入级
+
+    接收 --(有界输入队列)--> 编码线程 --(有界落盘队列)--> 落盘线程
+
+所有连接把收到的原始报文块投递到同一个有界输入队列（容量与过载策略见
+pipeline.BoundedQueue）。编码线程攒批、把报文编码为存储格式并调用
+consumers；落盘线程通过持久打开的文件句柄写入，避免逐条 open/close 与
+多线程交错写。磁盘卡顿只会阻塞落盘线程，落盘队列满后压力再传回输入队列。
+
+consumers 为附加在编码线程上的下游处理（如 rollup.RollupAggregator），
+需实现 consume(buf) 与 close()，每批以同一段原始报文调用。
+
+落盘策略（durability）:
+    none  - 只写入 Python 缓冲区，由缓冲区满或关闭时落到内核
+    flush - 每批写完后 flush 到内核页缓存（进程崩溃不丢数据，默认）
+    fsync - 每批写完后 flush + fsync（掉电不丢已确认批次，最慢）
+"""
+
+import os
+import queue
+import threading
+import time
+
+from metrics import REGISTRY, SIZE_BUCKETS
+from pipeline import BoundedQueue
+
+from frame_codec import CSV_HEADER, FRAME_SIZE, format_csv_lines, unpack_rows
+
+DURABILITY_CHOICES = ("none", "flush", "fsync")
+_STOP = object()
+
+DECODE_SECONDS = REGISTRY.histogram("telemetry_decode_seconds", "每批报文解码编码耗时（秒）")
+DECODE_ERRORS = REGISTRY.counter("telemetry_parse_errors_total", "解码编码失败的批次数")
+WRITE_SECONDS = REGISTRY.histogram("telemetry_write_seconds", "每次落盘耗时，含 flush/fsync（秒）")
+WRITE_BATCH_FRAMES = REGISTRY.histogram(
+    "telemetry_write_batch_frames", "每次落盘的报文条数", SIZE_BUCKETS
+)
+WRITE_ERRORS = REGISTRY.counter("telemetry_write_errors_total", "落盘失败次数")
+
+
+# ===============================
+# 存储后端：CSV 文件
+# ===============================
+class CsvSink:
+    """
+    持久打开的 CSV 文件，格式与 data_log.csv 完全一致
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1 << 20):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", encoding="utf-8", buffering=buffer_size)
+        if new_file:
+            self._file.write(CSV_HEADER)
+            self._file.flush()
+
+    def encode(self, buf: bytes) -> str:
+        return "".join(format_csv_lines(unpack_rows(buf)))
+
+    def write_encoded(self, payload: str):
+        self._file.write(payload)
+
+    def write_frames(self, buf: bytes):
+        self.write_encoded(self.encode(buf))
+
+    def flush(self):
+        self._file.flush()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+# ===============================
+# 编码线程 + 落盘线程
+# ===============================
+class BatchWriter:
+    """
+    按条数（batch_frames）或时间间隔（flush_interval 秒）攒批落盘
+
+    input_frames 为输入队列容量（报文条数），overflow 为队列满时的策略，
+    persist_batches 为编码后等待落盘的批次数上限。
+    """
+
+    def __init__(
+        self,
+        sink,
+        batch_frames: int = 4096,
+        flush_interval: float = 0.5,
+        durability: str = "flush",
+        verbose: bool = False,
+        consumers=(),
+        input_frames: int = 262144,
+        overflow: str = "block",
+        spill_path: str = None,
+        persist_batches: int = 16,
+    ):
+        if durability not in DURABILITY_CHOICES:
+            raise ValueError(f"未知的落盘策略: {durability}")
+        self.sink = sink
+        self.batch_frames = batch_frames
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.verbose = verbose
+        self.consumers = list(consumers)
+        self.frames_written = 0
+        self.batches_written = 0
+        self.input = BoundedQueue(input_frames, overflow, spill_path)
+        self._persist = queue.Queue(maxsize=persist_batches)
+        self._encoder = threading.Thread(target=self._encode_loop, name="batch-encoder", daemon=True)
+        self._writer = threading.Thread(target=self._persist_loop, name="batch-writer", daemon=True)
+
+    def start(self):
+        self._encoder.start()
+        self._writer.start()
+        return self
+
+    def submit(self, block, wait: bool = True) -> bool:
+        """
+        投递一段完整报文（长度为 44 的整数倍），线程安全。
+        接收缓冲区会被复用，因此这里复制为 bytes。
+        返回 False 表示输入队列已超出容量，调用方应暂停读取。
+        """
+        if not block:
+            return True
+        return self.input.put(bytes(block), wait)
+
+    def stop(self):
+        """处理完队列中剩余数据后关闭文件"""
+        self.input.put_control(_STOP)
+        self._encoder.join()
+        self._writer.join()
+        self.input.close()
+
+    def register_metrics(self, registry=REGISTRY):
+        """队列深度与过载计数在抓取时直接读取，不占用热路径"""
+        queue_ = self.input
+        registry.gauge("telemetry_input_queue_frames", "输入队列中排队的报文条数", lambda: queue_.depth)
+        registry.gauge("telemetry_input_queue_capacity_frames", "输入队列容量", lambda: queue_.max_frames)
+        registry.gauge("telemetry_persist_queue_batches", "等待落盘的批次数", self._persist.qsize)
+        registry.gauge("telemetry_spill_pending_frames", "溢出文件中待读回的报文条数", lambda: queue_.spill_pending)
+        for name, attr, help in (
+            ("telemetry_frames_received_total", "put_frames", "进入写入级的报文条数"),
+            ("telemetry_frames_dropped_total", "dropped_frames", "过载丢弃的报文条数"),
+            ("telemetry_frames_delayed_total", "delayed_frames", "因反压被延迟的报文条数"),
+            ("telemetry_frames_spilled_total", "spilled_frames", "溢出到磁盘的报文条数"),
+        ):
+            registry.gauge(name, help, lambda attr=attr: getattr(queue_, attr), kind="counter")
+        registry.gauge(
+            "telemetry_frames_written_total", "已落盘的报文条数",
+            lambda: self.frames_written, kind="counter",
+        )
+
+    def stats(self) -> dict:
+        stats = {"input_" + key: value for key, value in self.input.stats().items()}
+        stats["persist_depth"] = self._persist.qsize()
+        stats["frames_written"] = self.frames_written
+        stats["batches_written"] = self.batches_written
+        return stats
+
+    # ---------- 编码线程 ----------
+    def _encode_loop(self):
+        pending = []
+        pending_frames = 0
+        deadline = None
+        try:
+            while True:
+                timeout = None if not pending else max(0.0, deadline - time.monotonic())
+                item = self.input.get(timeout=timeout)
+
+                if item is _STOP:
+                    break
+                if item is not None:
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_interval
+                    pending.append(item)
+                    pending_frames += len(item) // FRAME_SIZE
+                    if (
+                        pending_frames < self.batch_frames
+                        and time.monotonic() < deadline
+                    ):
+                        continue
+
+                self._encode_batch(pending)
+                pending = []
+                pending_frames = 0
+        finally:
+            if pending:
+                self._encode_batch(pending)
+            for consumer in self.consumers:
+                try:
+                    consumer.close()
+                except Exception as e:
+                    print(f"[错误] {type(consumer).__name__} 关闭失败: {e}")
+            self._persist.put(_STOP)
+
+    def _encode_batch(self, blocks):
+        buf = b"".join(blocks)
+        start = time.perf_counter()
+        try:
+            payload = self.sink.encode(buf)
+        except Exception as e:
+            DECODE_ERRORS.inc()
+            print(f"[错误] 报文编码失败: {e}")
+            return
+        DECODE_SECONDS.observe(time.perf_counter() - start)
+        # 落盘队列满时在这里阻塞，输入队列随之积压并触发过载策略
+        self._persist.put((payload, len(buf) // FRAME_SIZE))
+        for consumer in self.consumers:
+            try:
+                consumer.consume(buf)
+            except Exception as e:
+                print(f"[错误] {type(consumer).__name__} 处理失败: {e}")
+        if self.verbose:
+            for line in format_csv_lines(unpack_rows(buf)):
+                print(f"[保存成功] {line.strip()}")
+
+    # ---------- 落盘线程 ----------
+    def _persist_loop(self):
+        try:
+            stop = False
+            while not stop:
+                batches = [self._persist.get()]
+                # 磁盘卡顿后积压的批次一次写完，只做一次 flush/fsync
+                while True:
+                    try:
+                        batches.append(self._persist.get_nowait())
+                    except queue.Empty:
+                        break
+                if batches[-1] is _STOP:
+                    batches.pop()
+                    stop = True
+                if batches:
+                    self._write_batches(batches)
+        finally:
+            if self.durability == "fsync":
+                self.sink.sync()
+            self.sink.close()
+
+    def _write_batches(self, batches):
+        start = time.perf_counter()
+        try:
+            for payload, _ in batches:
+                self.sink.write_encoded(payload)
+            if self.durability == "flush":
+                self.sink.flush()
+            elif self.durability == "fsync":
+                self.sink.sync()
+        except Exception as e:
+            WRITE_ERRORS.inc()
+            print(f"[错误] 批量写入失败: {e}")
+            return
+        frames = sum(frames for _, frames in batches)
+        WRITE_SECONDS.observe(time.perf_counter() - start)
+        WRITE_BATCH_FRAMES.observe(frames)
+        self.frames_written += frames
+        self.batches_written += len(batches)
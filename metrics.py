@@ -0,0 +1,255 @@
+"""
+接收服务器的运行指标与 Prometheus 文本格式输出
+
+热路径上只做按批次（而非逐帧）的计数与直方图记录；队列深度、每设备帧数
+等已有状态在抓取时通过回调读取，不增加接收开销。
+
+HTTP 接口（默认 127.0.0.1:9529）:
+    GET /metrics                   Prometheus 文本格式
+    GET /debug/profile?seconds=10  对所有线程做采样剖析，返回热点函数与折叠栈
+                                   （折叠栈可直接输入 flamegraph.pl / speedscope）
+"""
+
+import bisect
+import collections
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9529
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+# ===============================
+# 指标类型
+# ===============================
+class Counter:
+    """
+    计数不加锁：接收路径每次读取都可能调用，加锁的开销是自增本身的数倍；
+    线程模式下极少量并发自增可能丢失，对监控指标可以接受
+    """
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        yield f"{self.name} {self.value}"
+
+
+class Gauge:
+    """
+    可直接设置，或给出 func 在抓取时计算；
+    kind="counter" 用于在抓取时读取其他对象里已有的累计计数
+    """
+
+    def __init__(self, name: str, help: str, func=None, kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.kind = kind
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {self.func() if self.func else self.value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}} {cumulative}'
+        yield f"{self.name}_sum {self.sum}"
+        yield f"{self.name}_count {cumulative}"
+
+
+class LabeledCollector:
+    """
+    抓取时调用 func() 得到 [(标签字典, 数值), ...]，适合每设备一条的大量序列
+    """
+
+    def __init__(self, name: str, help: str, kind: str, func):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.func = func
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.func():
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            yield f"{self.name}{{{label_text}}} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._metrics.get(name) or self.register(Counter(name, help))
+
+    def gauge(self, name, help, func=None, kind="gauge"):
+        metric = self._metrics.get(name)
+        if metric is None:
+            return self.register(Gauge(name, help, func, kind))
+        if func is not None:
+            metric.func = func
+        return metric
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._metrics.get(name) or self.register(Histogram(name, help, buckets))
+
+    def collector(self, name, help, kind, func):
+        return self.register(LabeledCollector(name, help, kind, func))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} 采集失败: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ===============================
+# 采样剖析（覆盖所有线程）
+# ===============================
+def sample_profile(seconds: float, interval: float = 0.005, top: int = 30) -> str:
+    """
+    以固定间隔抓取所有线程的调用栈，返回热点函数表与折叠栈文本
+    """
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    self_counts = collections.Counter()
+    total_counts = collections.Counter()
+    stacks = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if not stack:
+                continue
+            samples += 1
+            self_counts[stack[0]] += 1
+            for func in set(stack):
+                total_counts[func] += 1
+            thread_name = names.get(ident, str(ident))
+            stacks[";".join([thread_name] + stack[::-1])] += 1
+        time.sleep(interval)
+
+    lines = [f"# 采样 {samples} 次，时长 {seconds}s，间隔 {interval * 1000:.1f}ms", ""]
+    lines.append(f"{'自身%':>8} {'累计%':>8}  函数")
+    for func, count in self_counts.most_common(top):
+        lines.append(
+            f"{count / samples * 100:>8.1f} {total_counts[func] / samples * 100:>8.1f}  {func}"
+        )
+    lines += ["", "# 折叠栈"]
+    lines += [f"{stack} {count}" for stack, count in stacks.most_common()]
+    return "\n".join(lines) + "\n"
+
+
+# ===============================
+# HTTP 接口
+# ===============================
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+    _profile_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            body = self.registry.render().encode("utf-8")
+            self.send_body(200, body, "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/debug/profile":
+            query = parse_qs(url.query)
+            try:
+                seconds = min(float(query.get("seconds", ["10"])[0]), 300.0)
+            except ValueError:
+                self.send_body(400, "seconds 参数无效\n".encode("utf-8"), "text/plain; charset=utf-8")
+                return
+            if not self._profile_lock.acquire(blocking=False):
+                self.send_body(409, "已有剖析在进行中\n".encode("utf-8"), "text/plain; charset=utf-8")
+                return
+            try:
+                body = sample_profile(seconds).encode("utf-8")
+            finally:
+                self._profile_lock.release()
+            self.send_body(200, body, "text/plain; charset=utf-8")
+        else:
+            self.send_body(404, b"not found\n", "text/plain")
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT, registry: Registry = REGISTRY):
+    """在后台线程中启动指标接口，返回 HTTP 服务器对象"""
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[启动] 指标接口 http://{host}:{port}/metrics")
+    return server
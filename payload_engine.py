@@ -0,0 +1,111 @@
+"""
+批量生成模拟报文（NumPy 向量化）
+
+一次为多台设备生成整批报文，结果是内存连续的 FRAME_DTYPE 结构化数组，
+同一设备的多帧相邻存放；发送时只改写时间戳列，再把整块或按设备切片的
+memoryview 交给 sendall / transport.write / writelines，不再逐帧 struct.pack。
+
+数值模型:
+    uniform     与 sender.generate_message 相同的取值范围与小数位
+    load-curve  按日负荷曲线（早、晚高峰）生成三相电流，电压随负载略降，
+                功率 = 电压 × 电流 × 功率因数；各设备容量、相位偏移、功率因数固定
+给定 seed 时两种模型都可复现。
+"""
+
+from frame_codec import FRAME_DTYPE, FRAME_SIZE, VALUE_DIGITS, np
+
+MODELS = ("uniform", "load-curve")
+UTC_OFFSET = 8 * 3600  # 负荷曲线按本地时间（UTC+8）计算
+
+if np is not None:
+    UNIFORM_LOW = np.array([0, 0, 0, 210, 210, 210, 0, 0, 0], dtype=np.float64)
+    UNIFORM_HIGH = np.array([100, 100, 100, 230, 230, 230, 10000, 10000, 10000], dtype=np.float64)
+    ROUND_SCALE = 10.0 ** np.array(VALUE_DIGITS, dtype=np.float64)
+
+
+def daily_curve(seconds):
+    """一天内的相对负荷（0.3 ~ 1.0 左右），seconds 为本地时间的秒数"""
+    hour = (seconds % 86400) / 3600.0
+    return (
+        0.3
+        + 0.45 * np.exp(-(((hour - 9.0) / 2.0) ** 2))
+        + 0.6 * np.exp(-(((hour - 19.5) / 2.5) ** 2))
+    )
+
+
+class PayloadEngine:
+    """
+    devices 为设备ID序列；接口中的 rows 是设备在该序列中的下标
+    """
+
+    def __init__(self, device_ids, model: str = "uniform", seed=None, utc_offset: int = UTC_OFFSET):
+        if np is None:
+            raise RuntimeError("PayloadEngine 需要安装 numpy")
+        if model not in MODELS:
+            raise ValueError(f"未知的数值模型: {model}")
+        self.device_ids = np.asarray(device_ids, dtype="<u4")
+        self.model = model
+        self.utc_offset = utc_offset
+        self.rng = np.random.default_rng(seed)
+        n = len(self.device_ids)
+        # load-curve 的设备固有参数（uniform 模型不使用，但保证同一 seed 下序列一致）
+        self.capacity = self.rng.uniform(20.0, 100.0, n)
+        self.phase = self.rng.uniform(-1800.0, 1800.0, n)
+        self.power_factor = self.rng.uniform(0.85, 0.98, n)
+
+    def __len__(self):
+        return len(self.device_ids)
+
+    # ---------- 生成 ----------
+    def batch(self, rows=None, timestamp: int = 0, frames_per_device=1):
+        """
+        为 rows 中的每台设备生成 frames_per_device 帧（标量或与 rows 等长的数组），
+        返回结构化数组，同一设备的帧相邻
+        """
+        if rows is None:
+            rows = np.arange(len(self.device_ids))
+        rows = np.asarray(rows, dtype=np.intp)
+        if np.ndim(frames_per_device) or frames_per_device != 1:
+            rows = np.repeat(rows, frames_per_device)
+        out = np.empty(len(rows), dtype=FRAME_DTYPE)
+        out["device_id"] = self.device_ids[rows]
+        out["timestamp"] = timestamp
+        out["values"] = self._values(rows, timestamp)
+        return out
+
+    def _values(self, rows, timestamp: int):
+        n = len(rows)
+        if self.model == "uniform":
+            values = self.rng.uniform(UNIFORM_LOW, UNIFORM_HIGH, size=(n, 9))
+        else:
+            load = daily_curve(timestamp + self.utc_offset + self.phase[rows])
+            current = (self.capacity[rows] * load)[:, None] * self.rng.normal(1.0, 0.05, (n, 3))
+            np.maximum(current, 0.0, out=current)
+            voltage = (230.0 - 12.0 * load)[:, None] + self.rng.normal(0.0, 0.8, (n, 3))
+            power = voltage * current * self.power_factor[rows][:, None]
+            values = np.concatenate([current, voltage, power], axis=1)
+        # 与 generate_message 一样先按通道小数位舍入，再转 float32
+        return np.round(values * ROUND_SCALE) / ROUND_SCALE
+
+
+# ===============================
+# 发送前处理
+# ===============================
+def stamp(batch, timestamp: int):
+    """发送时只改写时间戳列（原地）"""
+    batch["timestamp"] = timestamp
+    return batch
+
+
+def as_buffer(batch) -> memoryview:
+    """结构化数组 -> 连续字节的 memoryview（零拷贝），可直接 sendall 或切片"""
+    return memoryview(batch.view(np.uint8))
+
+
+def device_slices(count: int, frames_per_device=1):
+    """
+    batch(rows, ..., frames_per_device) 结果中 count 台设备各自的字节区间 [(start, end), ...]
+    """
+    sizes = np.broadcast_to(np.asarray(frames_per_device) * FRAME_SIZE, (count,))
+    ends = np.cumsum(sizes)
+    return zip((ends - sizes).tolist(), ends.tolist())
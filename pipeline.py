@@ -0,0 +1,168 @@
+"""
+接收路径的有界队列与过载策略
+
+容量按报文条数计（而不是按入队次数），队列满时的处理策略:
+    block       - 阻塞投递方（线程模式）或暂停读取该连接（asyncio 模式），
+                  让 TCP 窗口把压力传回设备端；计入 delayed
+    drop-oldest - 丢弃队列中最旧的数据腾出空间；计入 dropped
+    spill       - 新数据追加到磁盘溢出文件，内存队列取空后再读回（晚于其后到达的
+                  内存数据落盘，报文自带时间戳，不影响查询与汇总）；计入 spilled
+"""
+
+import collections
+import os
+import threading
+import time
+
+from frame_codec import FRAME_SIZE
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "spill")
+SPILL_READ_FRAMES = 4096
+
+
+class BoundedQueue:
+    """
+    线程安全的有界队列，元素为长度是 44 整数倍的原始报文块
+    """
+
+    def __init__(self, max_frames: int, policy: str = "block", spill_path: str = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的过载策略: {policy}")
+        if policy == "spill" and not spill_path:
+            raise ValueError("spill 策略需要指定溢出文件路径")
+        self.max_frames = max_frames
+        self.policy = policy
+        self.spill_path = spill_path
+        self._items = collections.deque()
+        self._controls = collections.deque()
+        self._frames = 0
+        self._cond = threading.Condition()
+        self._spill_file = None
+        self._spill_read = 0
+        self._spill_written = 0
+
+        self.put_frames = 0
+        self.dropped_frames = 0
+        self.delayed_frames = 0
+        self.delay_seconds = 0.0
+        self.spilled_frames = 0
+        self.max_depth = 0
+
+    # ---------- 状态 ----------
+    @property
+    def depth(self) -> int:
+        """内存中排队的报文条数"""
+        return self._frames
+
+    @property
+    def spill_pending(self) -> int:
+        """溢出文件中尚未读回的报文条数"""
+        return (self._spill_written - self._spill_read) // FRAME_SIZE
+
+    def has_room(self, low_water: float = 0.5) -> bool:
+        return self._frames <= self.max_frames * low_water
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._frames,
+            "capacity": self.max_frames,
+            "max_depth": self.max_depth,
+            "put": self.put_frames,
+            "dropped": self.dropped_frames,
+            "delayed": self.delayed_frames,
+            "delay_seconds": round(self.delay_seconds, 3),
+            "spilled": self.spilled_frames,
+            "spill_pending": self.spill_pending,
+        }
+
+    # ---------- 投递 ----------
+    def put(self, item, wait: bool = True) -> bool:
+        """
+        投递一个报文块。返回 False 表示队列已超出容量，调用方应暂停读取
+        （仅 block 策略且 wait=False 时出现）。
+        """
+        n = len(item) // FRAME_SIZE
+        with self._cond:
+            self.put_frames += n
+            if self._frames + n > self.max_frames:
+                if self.policy == "spill":
+                    self._spill(item)
+                    self.spilled_frames += n
+                    self._cond.notify()
+                    return True
+                if self.policy == "drop-oldest":
+                    while self._items and self._frames + n > self.max_frames:
+                        old = self._items.popleft()
+                        self._frames -= len(old) // FRAME_SIZE
+                        self.dropped_frames += len(old) // FRAME_SIZE
+                elif wait:
+                    start = time.monotonic()
+                    self.delayed_frames += n
+                    while self._items and self._frames + n > self.max_frames:
+                        self._cond.wait()
+                    self.delay_seconds += time.monotonic() - start
+                else:
+                    self.delayed_frames += n
+            self._items.append(item)
+            self._frames += n
+            self.max_depth = max(self.max_depth, self._frames)
+            self._cond.notify()
+            return self._frames <= self.max_frames
+
+    def put_control(self, item):
+        """投递控制消息（如停止信号），不受容量限制，在数据之后处理"""
+        with self._cond:
+            self._controls.append(item)
+            self._cond.notify()
+
+    # ---------- 取出 ----------
+    def get(self, timeout: float = None):
+        """
+        取出一个报文块；内存队列为空时读回溢出数据，全部为空时返回控制消息。
+        超时返回 None。
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items and not self.spill_pending and not self._controls:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._items:
+                item = self._items.popleft()
+                self._frames -= len(item) // FRAME_SIZE
+                self._cond.notify_all()
+                return item
+            if self.spill_pending:
+                return self._unspill()
+            return self._controls.popleft()
+
+    # ---------- 溢出文件 ----------
+    def _spill(self, item):
+        if self._spill_file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+            self._spill_file = open(self.spill_path, "w+b")
+        self._spill_file.seek(self._spill_written)
+        self._spill_file.write(item)
+        self._spill_written += len(item)
+
+    def _unspill(self) -> bytes:
+        self._spill_file.flush()
+        self._spill_file.seek(self._spill_read)
+        size = min(self._spill_written - self._spill_read, SPILL_READ_FRAMES * FRAME_SIZE)
+        item = self._spill_file.read(size)
+        self._spill_read += len(item)
+        if self._spill_read == self._spill_written:
+            # 全部读回后截断，避免溢出文件无限增长
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read = self._spill_written = 0
+        return item
+
+    def close(self):
+        with self._cond:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+                if not self.spill_pending:
+                    os.remove(self.spill_path)
@@ -0,0 +1,511 @@
+"""
+录制报文回放工具
+
+读取 data_log.csv 或二进制段文件（.tseg / .tsegz，单个文件或目录），把记录
+重新编码为 <2I9f 报文，按原始设备ID每台设备一条连接发给接收服务器（client.py），
+用于复现线上问题:
+
+    实时       --speed 1（默认），按日志中的时间间隔发送
+    N 倍速     --speed N
+    尽可能快   --fast，只受服务器反压限制
+
+日志由读取线程流式读取、按秒分组，最多预读 QUEUE_SECONDS 秒，内存占用与文件
+大小无关。时间戳只有秒精度，同一秒的报文在这一秒（除以倍速）内均匀发出：
+调度循环每次唤醒（间隔不超过 TICK）发送全部已到期的报文，同一连接的多帧合并为一次 write，
+不为每帧单独定时。日志中超过 --max-gap 秒的空档直接跳过。
+
+报文时间戳默认保持原值；--retime 时整体平移，使第一帧为当前时间。
+开始计时前先为第一秒出现的设备建立连接；之后新出现的设备在首次出现时建连，
+建连完成前的报文暂存后补发；反压时等待而不丢帧，
+落后于计划的时间计入“调度延迟”。
+
+按文件顺序回放，时间戳倒退的帧与之前最新的一秒一起发送；多进程接收（--workers）
+写出的段目录请先用 telemetry_query.merge_time_ordered 合并为时间顺序。
+
+用法:
+    python replay.py data_log.csv
+    python replay.py segments/ --speed 10
+    python replay.py segments/ --fast
+    python replay.py data_log.csv --start "2025-04-16 13:10" --retime
+"""
+
+import argparse
+import asyncio
+import csv
+import queue
+import signal
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from client import raise_fd_limit
+from frame_codec import FRAME_SIZE, FRAME_STRUCT, parse_csv_row
+from load_gen import SERVER_HOST, SERVER_PORT, TICK, Reservoir, format_percentiles
+from segment_store import iter_segment_blocks, list_segments
+from telemetry_query import parse_time
+
+WORDS = FRAME_SIZE // 4  # 每帧 11 个 32 位字：设备ID、时间戳、9 个通道
+READ_FRAMES = 65536  # 读取线程每次解码的帧数
+QUEUE_SECONDS = 8  # 最多预读的日志秒数
+FAST_BATCH = 65536  # 尽可能快模式下每批发送的帧数，批间让出事件循环
+MIN_SLEEP = 0.001  # 最短等待（秒），高速率时每次唤醒合并发送约 1ms 内到期的报文
+PENDING_LIMIT = 1 << 20  # 等待建连的暂存帧数上限，超过时暂停回放（服务器不可达时不无限堆积）
+
+
+# ===============================
+# 读取（读取线程）
+# ===============================
+def iter_csv_blocks(path: str, stats: dict, block_frames: int = READ_FRAMES):
+    """流式读取 CSV，跳过表头和格式错误的行，产出长度为 44 整数倍的 bytes"""
+    pack = FRAME_STRUCT.pack
+    frames = []
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for fields in reader:
+            try:
+                frames.append(pack(*parse_csv_row(fields)))
+            except (ValueError, struct.error):
+                stats["bad_rows"] += 1
+                continue
+            if len(frames) >= block_frames:
+                yield b"".join(frames)
+                frames = []
+    if frames:
+        yield b"".join(frames)
+
+
+def iter_log_blocks(path: str, stats: dict):
+    if path.endswith(".csv"):
+        return iter_csv_blocks(path, stats)
+    return (block for segment in list_segments(path) for block in iter_segment_blocks(segment))
+
+
+def iter_seconds(blocks, start=None, end=None, retime: bool = False):
+    """
+    把报文流按日志秒分组，产出 (秒, 报文 bytes, 设备ID array)；
+    秒取到目前为止的最大时间戳，时间戳倒退的帧归入当前这一秒
+    """
+    current = None
+    words = array("I")
+    offset = None
+    for block in blocks:
+        incoming = array("I")
+        incoming.frombytes(block)
+        if sys.byteorder == "big":
+            incoming.byteswap()
+        stamps = incoming[1::WORDS]
+        finished = end is not None and stamps and max(stamps) >= end
+        if start is not None or end is not None:
+            keep = [
+                i for i, ts in enumerate(stamps)
+                if (start is None or ts >= start) and (end is None or ts < end)
+            ]
+            if len(keep) < len(stamps):
+                incoming = array("I", (w for i in keep for w in incoming[i * WORDS : (i + 1) * WORDS]))
+                stamps = incoming[1::WORDS]
+        if retime and stamps:
+            if offset is None:
+                offset = int(time.time()) - stamps[0]
+            incoming[1::WORDS] = array("I", [(ts + offset) & 0xFFFFFFFF for ts in stamps])
+            stamps = incoming[1::WORDS]
+
+        cut = 0
+        for i, ts in enumerate(stamps):
+            if current is None:
+                current = ts
+            elif ts > current:
+                words.extend(incoming[cut * WORDS : i * WORDS])
+                cut = i
+                yield current, _to_bytes(words), words[0::WORDS]
+                words = array("I")
+                current = ts
+        words.extend(incoming[cut * WORDS :])
+        if finished:
+            break
+    if words:
+        yield current, _to_bytes(words), words[0::WORDS]
+
+
+def _to_bytes(words) -> bytes:
+    if sys.byteorder == "big":
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+class LogReader(threading.Thread):
+    """在后台线程中读取并分组，通过有界队列交给事件循环"""
+
+    def __init__(self, args, stats: dict):
+        super().__init__(name="replay-reader", daemon=True)
+        self.args = args
+        self.stats = stats
+        self.queue = queue.Queue(QUEUE_SECONDS)
+        self.stopping = threading.Event()
+
+    def run(self):
+        args = self.args
+        try:
+            blocks = iter_log_blocks(args.path, self.stats)
+            for item in iter_seconds(blocks, args.start, args.end, args.retime):
+                if not self._put(item):
+                    return
+            self._put(None)
+        except Exception as exc:  # 交给事件循环抛出
+            self._put(exc)
+
+    def _put(self, item) -> bool:
+        while not self.stopping.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        """非阻塞取下一秒；读取落后时返回 False，读完返回 None"""
+        try:
+            item = self.queue.get_nowait()
+        except queue.Empty:
+            return False
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+# ===============================
+# 设备连接
+# ===============================
+class ReplayProtocol(asyncio.Protocol):
+    __slots__ = ("replayer", "device_id", "transport", "paused")
+
+    def __init__(self, replayer, device_id: int):
+        self.replayer = replayer
+        self.device_id = device_id
+        self.transport = None
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.replayer.on_connected(self)
+
+    def pause_writing(self):
+        self.paused = True
+        self.replayer.on_pause()
+
+    def resume_writing(self):
+        self.paused = False
+        self.replayer.on_resume()
+
+    def data_received(self, data):
+        pass
+
+    def connection_lost(self, exc):
+        if self.paused:
+            self.paused = False
+            self.replayer.on_resume()
+        self.replayer.on_lost(self)
+
+
+# ===============================
+# 回放
+# ===============================
+class Replayer:
+    def __init__(self, args):
+        self.args = args
+        self.conns = {}  # 设备ID -> 已连接的 ReplayProtocol
+        self.pending = {}  # 设备ID -> 建连完成前暂存的报文
+        self.stopping = False
+        self._tasks = set()
+        self._paused = 0  # 处于反压状态的连接数
+        self.stats = {"bad_rows": 0}
+
+        self.devices = 0
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.pending_frames = 0
+        self.seconds = 0
+        self.skipped_gap = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.connect_latency = Reservoir()
+        self.send_lag = Reservoir()
+
+    # ---------- 连接管理 ----------
+    def on_connected(self, protocol):
+        self.conns[protocol.device_id] = protocol
+        self.connects += 1
+        parts = self.pending.pop(protocol.device_id, None)
+        if parts:
+            payload = b"".join(parts)
+            protocol.transport.write(payload)
+            self.pending_frames -= len(payload) // FRAME_SIZE
+            self.sent_frames += len(payload) // FRAME_SIZE
+            self.sent_bytes += len(payload)
+
+    def on_lost(self, protocol):
+        if self.conns.get(protocol.device_id) is not protocol:
+            return
+        del self.conns[protocol.device_id]
+        if self.stopping:
+            return
+        self.disconnects += 1
+        self.pending[protocol.device_id] = []
+        self.spawn(self.connect(protocol.device_id, self.args.reconnect_delay))
+
+    def on_pause(self):
+        self._paused += 1
+
+    def on_resume(self):
+        self._paused -= 1
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def connect(self, device_id: int, delay: float = 0.0):
+        if delay:
+            await asyncio.sleep(delay)
+        if self.stopping:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._connect_slots:
+            start = time.perf_counter()
+            try:
+                await loop.create_connection(
+                    lambda: ReplayProtocol(self, device_id), self.args.host, self.args.port
+                )
+            except OSError:
+                self.connect_failures += 1
+                self.spawn(self.connect(device_id, self.args.reconnect_delay))
+                return
+            self.connect_latency.add(time.perf_counter() - start)
+
+    async def ramp_up(self, device_ids, stop: asyncio.Event):
+        """先为第一秒出现的设备建立连接再开始计时，回放开头不必等待建连"""
+        ramp_start = time.perf_counter()
+        for device_id in device_ids:
+            self.devices += 1
+            self.pending[device_id] = []
+            self.spawn(self.connect(device_id))
+        while len(self.conns) + self.connect_failures < len(device_ids) and not stop.is_set():
+            await asyncio.sleep(TICK)
+        print(
+            f"[回放] 已建立 {len(self.conns):,}/{len(device_ids):,} 个连接，"
+            f"耗时 {time.perf_counter() - ramp_start:.1f}s，失败 {self.connect_failures:,}"
+        )
+
+    # ---------- 发送 ----------
+    def send(self, data: bytes, devices, lo: int, hi: int):
+        """发送一秒中的第 [lo, hi) 帧，同一设备的帧合并为一次 write"""
+        view = memoryview(data)
+        groups = {}
+        for i in range(lo, hi):
+            group = groups.get(devices[i])
+            if group is None:
+                groups[devices[i]] = [i]
+            else:
+                group.append(i)
+        for device_id, rows in groups.items():
+            if len(rows) == 1:
+                i = rows[0]
+                payload = view[i * FRAME_SIZE : (i + 1) * FRAME_SIZE]
+            else:
+                payload = b"".join(view[i * FRAME_SIZE : (i + 1) * FRAME_SIZE] for i in rows)
+            conn = self.conns.get(device_id)
+            if conn is not None:
+                conn.transport.write(payload)
+                self.sent_frames += len(rows)
+                self.sent_bytes += len(payload)
+                continue
+            if device_id not in self.pending:
+                self.devices += 1
+                self.pending[device_id] = []
+                self.spawn(self.connect(device_id))
+            self.pending[device_id].append(bytes(payload))
+            self.pending_frames += len(rows)
+
+    async def replay(self, reader, stop: asyncio.Event):
+        """
+        日志秒 T 的第 k 帧（共 c 帧）计划在 start + (T' + k / c) / speed 发出，
+        T' 为去掉空档后相对第一秒的偏移
+        """
+        loop = asyncio.get_running_loop()
+        args = self.args
+        speed = args.speed
+        start = loop.time()
+        next_report = start + args.report_interval
+        last_sent = 0
+
+        item = None
+        base = None  # 第一秒
+        position = 0  # 当前秒去掉空档后的偏移
+        previous = None
+        lo = 0
+        while not stop.is_set():
+            if item is None:
+                item = reader.get()
+                if item is None:
+                    break
+                if item is False:  # 读取线程暂未跟上
+                    item = None
+                    await asyncio.sleep(TICK)
+                    continue
+                second = item[0]
+                if base is None:
+                    base = second
+                    await self.ramp_up(set(item[2]), stop)
+                    start = loop.time()
+                    next_report = start + args.report_interval
+                elif second - previous > args.max_gap:
+                    self.skipped_gap += second - previous - 1
+                    position += 1
+                else:
+                    position += second - previous
+                previous = second
+                self.seconds += 1
+                lo = 0
+
+            _, data, devices = item
+            count = len(devices)
+            if args.fast:
+                hi = min(count, lo + FAST_BATCH)
+            else:
+                now = loop.time()
+                elapsed = (now - start) * speed - position
+                hi = max(lo, min(count, int(elapsed * count) + 1)) if elapsed >= 0 else lo
+                due = start + (position + lo / count) / speed  # 本批第一帧的计划时刻
+                if hi == lo:
+                    await asyncio.sleep(min(max(due - now, MIN_SLEEP), TICK))
+                    continue
+                self.send_lag.add(max(0.0, now - due))
+            self.send(data, devices, lo, hi)
+            lo = hi
+            if lo == count:
+                item = None
+
+            now = loop.time()
+            if now >= next_report:
+                rate = (self.sent_frames - last_sent) / (now - next_report + args.report_interval)
+                last_sent = self.sent_frames
+                next_report = now + args.report_interval
+                print(
+                    f"[回放] {now - start:6.1f}s 日志 {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(previous))} "
+                    f"发送 {rate:,.0f} 帧/s 连接 {len(self.conns):,} 待建连 {len(self.pending):,}"
+                )
+            # 反压或暂存过多时等待而不丢帧
+            while (self._paused or self.pending_frames > PENDING_LIMIT) and not stop.is_set():
+                await asyncio.sleep(TICK)
+            if args.fast:
+                await asyncio.sleep(0)
+        return loop.time() - start
+
+    # ---------- 运行 ----------
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        self._connect_slots = asyncio.Semaphore(self.args.connect_concurrency)
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+
+        reader = LogReader(self.args, self.stats)
+        reader.start()
+        try:
+            elapsed = await self.replay(reader, stop)
+        finally:
+            reader.stopping.set()
+        await self.close()
+        return self.summary(elapsed)
+
+    async def close(self, timeout: float = 5.0):
+        """等暂存的报文补发完，再关闭全部连接（已写入的数据会先发完）"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.pending and self._tasks and loop.time() < deadline:
+            await asyncio.sleep(TICK)
+        self.stopping = True
+        for task in list(self._tasks):
+            task.cancel()
+        for conn in list(self.conns.values()):
+            conn.transport.close()
+        while self.conns and loop.time() < deadline:
+            await asyncio.sleep(TICK)
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "elapsed": elapsed,
+            "seconds": self.seconds,
+            "devices": self.devices,
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "undelivered": self.pending_frames,
+            "bad_rows": self.stats["bad_rows"],
+            "skipped_gap": self.skipped_gap,
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "disconnects": self.disconnects,
+            "connect_latency": self.connect_latency.samples,
+            "send_lag": self.send_lag.samples,
+        }
+
+
+def print_summary(summary: dict, args):
+    elapsed = summary["elapsed"] or 1e-9
+    print(
+        f"[结果] 回放 {summary['seconds']:,} 秒日志，耗时 {elapsed:.1f}s，"
+        f"跳过空档 {summary['skipped_gap']:,}s，格式错误的行 {summary['bad_rows']:,}"
+    )
+    print(
+        f"[结果] 发送 {summary['sent_frames']:,} 帧，{summary['sent_frames'] / elapsed:,.0f} 帧/s，"
+        f"未送达 {summary['undelivered']:,} 帧"
+    )
+    print(
+        f"[结果] 设备 {summary['devices']:,}，建连 {summary['connects']:,} 次，失败 {summary['connect_failures']:,}，"
+        f"异常断线 {summary['disconnects']:,}"
+    )
+    print(f"[结果] 建连延迟 {format_percentiles(summary['connect_latency'])}")
+    if not args.fast:
+        print(f"[结果] 调度延迟 {format_percentiles(summary['send_lag'])}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="录制报文回放")
+    parser.add_argument("path", help="data_log.csv，或段文件 / 段文件目录")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, default=1.0, help="回放倍速，1 为实时")
+    pace.add_argument("--fast", action="store_true", help="尽可能快，只受服务器反压限制")
+    parser.add_argument("--start", type=parse_time, help="只回放此时间（含）之后的记录")
+    parser.add_argument("--end", type=parse_time, help="回放到此时间（不含）为止")
+    parser.add_argument("--max-gap", type=int, default=5, help="日志中超过此秒数的空档直接跳过")
+    parser.add_argument("--retime", action="store_true", help="时间戳整体平移，使第一帧为当前时间")
+    parser.add_argument("--connect-concurrency", type=int, default=1000, help="同时进行的建连数上限")
+    parser.add_argument("--reconnect-delay", type=float, default=1.0, help="建连失败或断线后重连等待（秒）")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="进度输出间隔（秒）")
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed 必须大于 0，尽可能快请用 --fast")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mode = "尽可能快" if args.fast else f"{args.speed:g} 倍速"
+    print(f"[启动] 回放 {args.path} -> {args.host}:{args.port}（{mode}）")
+    raise_fd_limit()
+    summary = asyncio.run(Replayer(args).run())
+    print_summary(summary, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+按设备的分钟/15 分钟/小时级流式汇总
+
+挂在接收服务器的写线程上，每批报文用 NumPy 分组归约后合并到内存中的
+窗口状态（每帧摊还 O(1)），窗口关闭后追加到汇总文件:
+
+    rollups/rollup_1m.csv、rollup_15m.csv、rollup_1h.csv
+
+每行: 设备ID、窗口起始时间、条数、电流/电压各相的最小/最大/平均值、
+正向有功功率各相累计值及三相总计。
+
+窗口关闭依据数据中的最大时间戳（水位线）减去允许迟到时间。
+迟到或服务重启前未关闭的窗口会以同一 (设备ID, 起始时间) 再输出一行部分汇总，
+各统计量均可合并，读取时用 read_rollups() 自动合并。
+
+用法:
+    python rollup.py rollups/ --resolution 1m --device 7
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+from frame_codec import FIELD_NAMES, decode_frames, format_timestamp, np
+
+RESOLUTIONS = {"1m": 60, "15m": 900, "1h": 3600}
+STAT_CHANNELS = FIELD_NAMES[2:8]  # 电流A/B/C、电压A/B/C
+POWER_CHANNELS = FIELD_NAMES[8:11]  # 正向有功功率A/B/C
+ROLLUP_HEADER = (
+    ["设备ID", "起始时间", "条数"]
+    + [f"{ch}_{stat}" for ch in STAT_CHANNELS for stat in ("最小", "最大", "平均")]
+    + [f"{ch}_累计" for ch in POWER_CHANNELS]
+    + ["正向有功功率_总计"]
+)
+
+
+# ===============================
+# 单一粒度的窗口状态
+# ===============================
+class RollupTable:
+    """
+    (设备ID, 窗口起始) -> 槽位；统计量存放在按槽位索引的 NumPy 数组中
+    """
+
+    def __init__(self, name: str, seconds: int, capacity: int = 1024):
+        self.name = name
+        self.seconds = seconds
+        self._slots = {}
+        self._free = []
+        self._next_close = None  # 最早的未关闭窗口结束时间
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mins = np.full((capacity, 6), np.inf, dtype=np.float32)
+        self.maxs = np.full((capacity, 6), -np.inf, dtype=np.float32)
+        self.sums = np.zeros((capacity, 6), dtype=np.float64)
+        self.power = np.zeros((capacity, 3), dtype=np.float64)
+        self._free.extend(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        n = len(self.count)
+        self.count = np.concatenate([self.count, np.zeros(n, dtype=np.int64)])
+        self.mins = np.concatenate([self.mins, np.full((n, 6), np.inf, dtype=np.float32)])
+        self.maxs = np.concatenate([self.maxs, np.full((n, 6), -np.inf, dtype=np.float32)])
+        self.sums = np.concatenate([self.sums, np.zeros((n, 6), dtype=np.float64)])
+        self.power = np.concatenate([self.power, np.zeros((n, 3), dtype=np.float64)])
+        self._free.extend(range(2 * n - 1, n - 1, -1))
+
+    def _slot(self, key: int) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[key] = slot
+            end = (key & 0xFFFFFFFF) + self.seconds
+            if self._next_close is None or end < self._next_close:
+                self._next_close = end
+        return slot
+
+    def _reset(self, slot: int):
+        self.count[slot] = 0
+        self.mins[slot] = np.inf
+        self.maxs[slot] = -np.inf
+        self.sums[slot] = 0
+        self.power[slot] = 0
+        self._free.append(slot)
+
+    @property
+    def open_windows(self) -> int:
+        return len(self._slots)
+
+    def update(self, device_ids, timestamps, values):
+        """合并一批记录：先按 (设备, 窗口) 分组归约，再写入对应槽位"""
+        buckets = timestamps.astype(np.uint64) // self.seconds * self.seconds
+        keys = (device_ids.astype(np.uint64) << np.uint64(32)) | buckets
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        values = values[order]
+        uniq, starts = np.unique(keys, return_index=True)
+
+        stats = values[:, :6]
+        counts = np.diff(np.append(starts, len(keys)))
+        slots = np.fromiter(
+            (self._slot(key) for key in uniq.tolist()), dtype=np.int64, count=len(uniq)
+        )
+        self.count[slots] += counts
+        self.mins[slots] = np.minimum(self.mins[slots], np.minimum.reduceat(stats, starts))
+        self.maxs[slots] = np.maximum(self.maxs[slots], np.maximum.reduceat(stats, starts))
+        self.sums[slots] += np.add.reduceat(stats.astype(np.float64), starts)
+        self.power[slots] += np.add.reduceat(values[:, 6:].astype(np.float64), starts)
+
+    def close_before(self, watermark=None):
+        """
+        取出结束时间不晚于 watermark 的窗口（None 表示全部），返回汇总行
+        """
+        if not self._slots:
+            return []
+        if watermark is not None and (
+            self._next_close is None or watermark < self._next_close
+        ):
+            return []
+        rows = []
+        next_close = None
+        for key, slot in list(self._slots.items()):
+            start = key & 0xFFFFFFFF
+            end = start + self.seconds
+            if watermark is None or end <= watermark:
+                rows.append(self._row(key >> 32, start, slot))
+                del self._slots[key]
+                self._reset(slot)
+            elif next_close is None or end < next_close:
+                next_close = end
+        self._next_close = next_close
+        rows.sort(key=lambda row: (row[1], row[0]))
+        return rows
+
+    def _row(self, device_id: int, start: int, slot: int):
+        count = int(self.count[slot])
+        means = self.sums[slot] / count
+        row = [device_id, start, count]
+        for k in range(6):
+            row += [
+                round(float(self.mins[slot, k]), 2),
+                round(float(self.maxs[slot, k]), 2),
+                round(float(means[k]), 4),
+            ]
+        power = self.power[slot]
+        row += [round(float(p), 2) for p in power] + [round(float(power.sum()), 2)]
+        return row
+
+
+# ===============================
+# 汇总级：挂在写线程上的消费者
+# ===============================
+class RollupAggregator:
+    """
+    BatchWriter 的消费者：consume(buf) 接收每批原始报文，close() 输出剩余窗口
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        resolutions=("1m", "15m", "1h"),
+        lateness: float = 60,
+        suffix: str = "",
+    ):
+        if np is None:
+            raise RuntimeError("RollupAggregator 需要安装 numpy")
+        self.directory = directory
+        self.lateness = lateness
+        self.tables = [RollupTable(name, RESOLUTIONS[name]) for name in resolutions]
+        self.watermark = 0
+        self.rows_written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._files = {}
+        for table in self.tables:
+            path = rollup_path(directory, table.name, suffix)
+            new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+            f = open(path, "a", encoding="utf-8", newline="")
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(ROLLUP_HEADER)
+            self._files[table.name] = (f, writer)
+
+    def consume(self, buf: bytes):
+        arr = decode_frames(buf)
+        if not len(arr):
+            return
+        device_ids = arr["device_id"]
+        timestamps = arr["timestamp"]
+        values = arr["values"]
+        for table in self.tables:
+            table.update(device_ids, timestamps, values)
+
+        # 时钟超前的设备不推进水位线，避免把其他设备的窗口提前关闭
+        newest = int(timestamps.max())
+        if newest > time.time() + self.lateness:
+            valid = timestamps[timestamps <= time.time() + self.lateness]
+            newest = int(valid.max()) if len(valid) else self.watermark
+        self.watermark = max(self.watermark, newest)
+        self._emit(self.watermark - self.lateness)
+
+    def _emit(self, watermark):
+        for table in self.tables:
+            rows = table.close_before(watermark)
+            if not rows:
+                continue
+            f, writer = self._files[table.name]
+            for row in rows:
+                row[1] = format_timestamp(row[1])
+            writer.writerows(rows)
+            f.flush()
+            self.rows_written += len(rows)
+
+    def close(self):
+        """输出全部未关闭窗口（部分汇总）并关闭文件"""
+        self._emit(None)
+        for f, _ in self._files.values():
+            f.close()
+
+
+# ===============================
+# 读取（合并部分汇总行）
+# ===============================
+def rollup_path(directory: str, resolution: str, suffix: str = "") -> str:
+    return os.path.join(directory, f"rollup_{resolution}{suffix}.csv")
+
+
+def rollup_files(directory: str, resolution: str):
+    """单进程的 rollup_1m.csv 以及多进程各自的 rollup_1m.wNN.csv"""
+    head = f"rollup_{resolution}"
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".csv")
+        and (name == head + ".csv" or name.startswith(head + "."))
+    ]
+
+
+def _iter_rollup_rows(directory: str, resolution: str):
+    for path in rollup_files(directory, resolution):
+        with open(path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            yield from reader
+
+
+def read_rollups(directory: str, resolution: str, devices=None):
+    """
+    读取汇总文件（含各工作进程的文件），合并同一 (设备ID, 起始时间) 的
+    部分汇总行，返回按 (起始时间, 设备ID) 排序的字典列表
+    """
+    merged = {}
+    wanted = None if devices is None else set(devices)
+    for row in _iter_rollup_rows(directory, resolution):
+        device_id = int(row[0])
+        if wanted is not None and device_id not in wanted:
+            continue
+        key = (row[1], device_id)
+        count = int(row[2])
+        stats = [float(x) for x in row[3:]]
+        prev = merged.get(key)
+        if prev is None:
+            merged[key] = [count, stats]
+            continue
+        prev_count, prev_stats = prev
+        total = prev_count + count
+        for k in range(6):
+            i = k * 3
+            prev_stats[i] = min(prev_stats[i], stats[i])
+            prev_stats[i + 1] = max(prev_stats[i + 1], stats[i + 1])
+            prev_stats[i + 2] = (
+                prev_stats[i + 2] * prev_count + stats[i + 2] * count
+            ) / total
+        for i in range(18, 22):
+            prev_stats[i] += stats[i]
+        prev[0] = total
+
+    result = []
+    for (start, device_id), (count, stats) in sorted(merged.items()):
+        result.append(dict(zip(ROLLUP_HEADER, [device_id, start, count] + stats)))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="查看按设备汇总数据")
+    parser.add_argument("directory", help="汇总文件目录")
+    parser.add_argument("--resolution", choices=tuple(RESOLUTIONS), default="1m")
+    parser.add_argument("--device", type=int, action="append", dest="devices")
+    args = parser.parse_args(argv)
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(ROLLUP_HEADER)
+    for row in read_rollups(args.directory, args.resolution, args.devices):
+        writer.writerow(row.values())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+扫描结果的紧凑索引
+
+保存的 JSON 是逐层嵌套的 dict，每个文件/目录都是一个 dict，十万级条目时
+占用大量内存，且一次性插入树视图会卡住窗口。这里把它压平成几组平行数组：
+
+    目录按广度优先编号，目录 i 的子目录是连续区间 [child_start[i], child_end[i])
+    目录 i 的文件是 file_* 数组中的连续区间 [file_start[i], file_end[i])
+
+dir_totals 即子树总时长；另有 file_dir（文件所在目录）与 dir_videos（子树视频数），
+供选中统计 O(1) 查询。
+
+另外记录目录的 mtime_ns 与文件的 (大小, mtime_ns)，供增量更新判断是否变化
+（旧格式的结果中没有这些字段，记为 0，增量更新时会全部重新测量）。
+"""
+
+from array import array
+from collections import deque
+
+
+class ScanIndex:
+    def __init__(self):
+        self.dir_names = []
+        self.dir_paths = []
+        self.dir_totals = array("d")
+        self.dir_mtimes = array("q")
+        self.dir_parent = array("i")
+        self.child_start = array("i")
+        self.child_end = array("i")
+        self.file_start = array("i")
+        self.file_end = array("i")
+        self.file_names = []
+        self.file_lengths = array("d")
+        self.file_sizes = array("q")
+        self.file_mtimes = array("q")
+        self.file_dir = array("i")
+        self.dir_videos = array("i")
+
+    def __len__(self):
+        return len(self.dir_names) + len(self.file_names)
+
+    @property
+    def total_length(self) -> float:
+        return self.dir_totals[0] if self.dir_totals else 0.0
+
+    # ---------- 构建 ----------
+    @classmethod
+    def from_data(cls, data: dict) -> "ScanIndex":
+        """由 save_results 保存的嵌套结构（"data" 字段）构建"""
+        index = cls()
+        if not data:
+            return index
+        queue = deque([(data, -1)])
+        while queue:
+            current, parent = queue.popleft()
+            index._add_dir(
+                current.get("name", "未知目录"),
+                current.get("path", ""),
+                current.get("total_length", 0),
+                current.get("mtime_ns", 0),
+                parent,
+            )
+            for file_info in current.get("files", []):
+                index._add_file(
+                    file_info.get("name", "未知文件"),
+                    file_info.get("length", 0),
+                    file_info.get("size", 0),
+                    file_info.get("mtime_ns", 0),
+                )
+            index.file_end.append(len(index.file_names))
+            dir_id = len(index.dir_names) - 1
+            for subdir in current.get("subdirs", []):
+                queue.append((subdir.get("data", {}), dir_id))
+        index._link_children()
+        return index
+
+    @classmethod
+    def from_node(cls, node) -> "ScanIndex":
+        """由 video_scan 的扫描结果（根 DirNode）构建"""
+        index = cls()
+        queue = deque([(node, -1)])
+        while queue:
+            current, parent = queue.popleft()
+            index._add_dir(current.name, current.path, current.total, current.mtime_ns, parent)
+            for name, length, stat in zip(current.files, current.lengths, current.stats):
+                index._add_file(name, length, *(stat or (0, 0)))
+            index.file_end.append(len(index.file_names))
+            dir_id = len(index.dir_names) - 1
+            queue.extend((subdir, dir_id) for subdir in current.subdirs)
+        index._link_children()
+        return index
+
+    @classmethod
+    def from_entries(cls, entries: dict, root_key) -> "ScanIndex":
+        """
+        由压平的目录记录构建（scan_report 读取流式报告时使用）
+        entries: 目录键 -> (父目录键, 序号, 名称, 路径, 总时长, mtime_ns,
+                            [(文件名, 时长, 大小, mtime_ns), ...])
+        同一目录的子目录按序号排列
+        """
+        index = cls()
+        if root_key not in entries:
+            return index
+        children = {}
+        for key, entry in entries.items():
+            if key != root_key:
+                children.setdefault(entry[0], []).append(key)
+        queue = deque([(root_key, -1)])
+        while queue:
+            key, parent = queue.popleft()
+            _, _, name, path, total, mtime_ns, files = entries[key]
+            index._add_dir(name, path, total, mtime_ns, parent)
+            for file_info in files:
+                index._add_file(*file_info)
+            index.file_end.append(len(index.file_names))
+            dir_id = len(index.dir_names) - 1
+            subdirs = children.get(key, [])
+            subdirs.sort(key=lambda child: entries[child][1])
+            queue.extend((child, dir_id) for child in subdirs)
+        index._link_children()
+        return index
+
+    def _add_dir(self, name: str, path: str, total: float, mtime_ns: int, parent: int):
+        self.dir_names.append(name)
+        self.dir_paths.append(path)
+        self.dir_totals.append(total)
+        self.dir_mtimes.append(mtime_ns)
+        self.dir_parent.append(parent)
+        self.file_start.append(len(self.file_names))
+
+    def _add_file(self, name: str, length: float, size: int, mtime_ns: int):
+        self.file_names.append(name)
+        self.file_lengths.append(length)
+        self.file_sizes.append(size)
+        self.file_mtimes.append(mtime_ns)
+
+    def _link_children(self):
+        """广度优先编号下，同一父目录的子目录编号连续；子目录编号大于父目录，倒序累加子树视频数"""
+        count = len(self.dir_names)
+        self.child_start = array("i", bytes(4 * count))
+        self.child_end = array("i", bytes(4 * count))
+        for dir_id in range(1, count):
+            parent = self.dir_parent[dir_id]
+            if not self.child_end[parent]:
+                self.child_start[parent] = dir_id
+            self.child_end[parent] = dir_id + 1
+
+        self.file_dir = array("i", bytes(4 * len(self.file_names)))
+        self.dir_videos = array("i", bytes(4 * count))
+        for dir_id in range(count):
+            start, end = self.file_start[dir_id], self.file_end[dir_id]
+            self.file_dir[start:end] = array("i", [dir_id]) * (end - start)
+            self.dir_videos[dir_id] = end - start
+        for dir_id in range(count - 1, 0, -1):
+            self.dir_videos[self.dir_parent[dir_id]] += self.dir_videos[dir_id]
+
+    # ---------- 查询 ----------
+    def subdirs(self, dir_id: int) -> range:
+        return range(self.child_start[dir_id], self.child_end[dir_id])
+
+    def files(self, dir_id: int) -> range:
+        return range(self.file_start[dir_id], self.file_end[dir_id])
+
+    def has_children(self, dir_id: int) -> bool:
+        return (
+            self.child_end[dir_id] > self.child_start[dir_id]
+            or self.file_end[dir_id] > self.file_start[dir_id]
+        )
+
+    def dir_lookup(self) -> dict:
+        """目录路径 -> 目录编号"""
+        return {path: dir_id for dir_id, path in enumerate(self.dir_paths)}
+
+    def to_data(self, dir_id: int = 0) -> dict:
+        """还原为 save_results 保存的嵌套结构（不含树节点ID）"""
+        if not self.dir_names:
+            return {}
+        return {
+            "path": self.dir_paths[dir_id],
+            "name": self.dir_names[dir_id],
+            "total_length": self.dir_totals[dir_id],
+            "mtime_ns": self.dir_mtimes[dir_id],
+            "files": [
+                {
+                    "name": self.file_names[j],
+                    "length": self.file_lengths[j],
+                    "size": self.file_sizes[j],
+                    "mtime_ns": self.file_mtimes[j],
+                }
+                for j in self.files(dir_id)
+            ],
+            "subdirs": [
+                {"name": self.dir_names[i], "data": self.to_data(i), "length": self.dir_totals[i]}
+                for i in self.subdirs(dir_id)
+            ],
+        }
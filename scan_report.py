@@ -0,0 +1,168 @@
+"""
+流式扫描报告（JSON Lines）
+
+原来的保存方式先构建完整的嵌套 dict，再复制一遍去掉树节点ID，最后 indent=2
+写出，大目录时内存占用约为数据本身的三倍，文件也很大。这里每行一条压平的记录:
+
+    {"format": "video-scan-report", "version": 2, "root_directory": ..., "timestamp": ...}
+    {"path": "课程/第1章/01.mp4", "duration": 1234.5, "size": 123456789, "mtime_ns": ...}
+    {"dir": "课程/第1章", "total_length": 5678.9, "order": 3, "mtime_ns": ...}
+    ...
+
+    path / dir 为相对根目录、以 "/" 分隔的路径，根目录自身为 ""
+    一个目录的全部文件记录紧接在它的目录记录之前，子目录的记录先于父目录
+    order 为扫描时列出目录的先后序号，读取时用来还原子目录的原始顺序
+    size / mtime_ns 供增量更新判断文件是否变化（版本 1 的报告没有，读作 0）
+
+扫描过程中每完成一个目录就写出它的记录（ReportWriter），不需要保留整棵结果树；
+读取时逐行解析，直接构建 ScanIndex。
+"""
+
+import json
+import os
+
+from scan_index import ScanIndex
+
+REPORT_FORMAT = "video-scan-report"
+REPORT_VERSION = 2
+REPORT_SUFFIX = ".jsonl"
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def is_report(file_path: str) -> bool:
+    return file_path.lower().endswith(REPORT_SUFFIX)
+
+
+def _header(root_directory: str, timestamp: str) -> str:
+    return _dumps({
+        "format": REPORT_FORMAT,
+        "version": REPORT_VERSION,
+        "root_directory": root_directory,
+        "timestamp": timestamp,
+    }) + "\n"
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+# ===============================
+# 写入
+# ===============================
+class ReportWriter:
+    """
+    扫描过程中增量写出；dir_done 可直接作为 ScanEngine 的 on_dir_done
+    （与其它回调组合时在扫描线程中调用）
+    """
+
+    def __init__(self, file_path: str, root_directory: str, timestamp: str):
+        self.file_path = file_path
+        self._file = open(file_path, "w", encoding="utf-8")
+        self._file.write(_header(root_directory, timestamp))
+        self._rel = {}  # DirNode -> 相对路径，目录完成时移除
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _relpath(self, node) -> str:
+        rel = self._rel.get(node)
+        if rel is None:
+            rel = "" if node.parent is None else _join(self._relpath(node.parent), node.name)
+            self._rel[node] = rel
+        return rel
+
+    def dir_done(self, node):
+        rel = self._relpath(node)
+        lines = [
+            _dumps({
+                "path": _join(rel, name), "duration": length,
+                "size": stat[0] if stat else 0, "mtime_ns": stat[1] if stat else 0,
+            })
+            for name, length, stat in zip(node.files, node.lengths, node.stats)
+        ]
+        lines.append(_dumps({
+            "dir": rel, "total_length": node.total, "order": node.index, "mtime_ns": node.mtime_ns
+        }))
+        lines.append("")
+        self._file.write("\n".join(lines))
+        self._rel.pop(node, None)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def write_index(file_path: str, index: ScanIndex, root_directory: str, timestamp: str):
+    """把已有的 ScanIndex（如加载的 JSON 结果）写成流式报告"""
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(_header(root_directory, timestamp))
+        if not index.dir_names:
+            return
+        rel = [""] * len(index.dir_names)
+        for dir_id in range(1, len(index.dir_names)):
+            rel[dir_id] = _join(rel[index.dir_parent[dir_id]], index.dir_names[dir_id])
+        # 广度优先编号倒序写出，子目录先于父目录；order 沿用编号
+        for dir_id in range(len(index.dir_names) - 1, -1, -1):
+            for file_id in index.files(dir_id):
+                f.write(_dumps({
+                    "path": _join(rel[dir_id], index.file_names[file_id]),
+                    "duration": index.file_lengths[file_id],
+                    "size": index.file_sizes[file_id],
+                    "mtime_ns": index.file_mtimes[file_id],
+                }) + "\n")
+            f.write(_dumps({
+                "dir": rel[dir_id], "total_length": index.dir_totals[dir_id], "order": dir_id,
+                "mtime_ns": index.dir_mtimes[dir_id],
+            }) + "\n")
+
+
+# ===============================
+# 读取
+# ===============================
+def iter_records(file_path: str):
+    """逐行读取记录（不含头部），返回 (头部, 记录生成器)"""
+    f = open(file_path, "r", encoding="utf-8")
+    header = json.loads(f.readline() or "{}")
+    if header.get("format") != REPORT_FORMAT:
+        f.close()
+        raise ValueError(f"不是视频扫描报告: {file_path}")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+
+def read_report(file_path: str):
+    """读取流式报告，返回 (头部, ScanIndex)"""
+    header, records = iter_records(file_path)
+    root_directory = header.get("root_directory", "")
+    root_name = os.path.basename(root_directory) or root_directory
+    files = {}  # 目录相对路径 -> [(文件名, 时长, 大小, mtime_ns), ...]
+    entries = {}
+    for record in records:
+        if "dir" in record:
+            rel = record["dir"]
+            parent, _, name = rel.rpartition("/")
+            entries[rel] = (
+                parent if rel else None,
+                record.get("order", 0),
+                name if rel else root_name,
+                os.path.join(root_directory, *rel.split("/")) if rel else root_directory,
+                record.get("total_length", 0),
+                record.get("mtime_ns", 0),
+                files.pop(rel, ()),
+            )
+        else:
+            parent, _, name = record["path"].rpartition("/")
+            files.setdefault(parent, []).append((
+                name, record.get("duration", 0), record.get("size", 0), record.get("mtime_ns", 0)
+            ))
+    return header, ScanIndex.from_entries(entries, "")
@@ -0,0 +1,334 @@
+"""
+压缩段文件（.tsegz）：按设备分组的 delta-of-delta / XOR 编码
+
+电表读数变化缓慢、上报间隔基本固定，但段文件与 data_log.csv 都按原样保存每个值。
+这里借鉴 Gorilla（Facebook 时序库）的思路，按列、按设备编码:
+
+    时间戳   同一设备相邻两帧的间隔之差（delta-of-delta），zigzag 后多为 0
+    9 个通道 float32 按位视为 uint32，与同一设备上一帧的同一通道异或；
+             值不变时为 0，变化很小时高位字节为 0
+    设备ID   按原始到达顺序保存（轮询上报时高度重复）
+
+Gorilla 原文逐个值做变长位编码，无法向量化；这里改为 NumPy 整列运算：
+异或/差分结果按字节拆成字节平面（同一字节位置的所有值连续存放，
+高位的全零平面集中在一起），再交给 zlib。解码同样是整列的
+累积异或 / 累加，不逐条循环。
+
+“按设备分组”只发生在编码域：解码时由设备ID列稳定排序得到同一个排列，
+在分组顺序下还原后再按原顺序放回，因此解码结果与原始记录逐字节相同。
+
+文件格式:
+    64 字节文件头（与 .tseg 相同的结构，magic 为 b"PWRSEGZ1"）
+    若干个块，每块 = BLOCK_STRUCT + 4 段 zlib 数据（设备ID、每组首帧时间、时间戳、通道值）
+
+用法:
+    python segment_codec.py compress segments/        # 压缩已封存的 .tseg（保留最新一个）
+    python segment_codec.py verify   segments/        # 校验 .tsegz 可完整解码
+"""
+
+import argparse
+import os
+import struct
+import sys
+import zlib
+
+from frame_codec import FRAME_DTYPE, FRAME_FORMAT, FRAME_SIZE, np
+from segment_store import (
+    COMPRESSED_SUFFIX,
+    HEADER_SIZE,
+    HEADER_STRUCT,
+    SEGMENT_SUFFIX,
+    SEGMENT_VERSION,
+    read_header,
+    segment_record_count,
+)
+
+COMPRESSED_MAGIC = b"PWRSEGZ1"
+BLOCK_FRAMES = 1 << 20  # 每块最多帧数；块越大，同一设备在块内的帧越多
+ZLIB_LEVEL = 1  # 字节平面化后 1 级与 6 级大小相差约 2%，速度快一倍
+
+# 帧数、组数（设备数）、基准时间戳、时间戳字节宽度、四段数据长度
+BLOCK_STRUCT = struct.Struct("<IIIIIIII")
+CHANNELS = 9
+
+
+# ===============================
+# 向量化工具
+# ===============================
+def _groups(device_ids):
+    """按设备稳定排序的排列、各组起点与长度"""
+    order = np.argsort(device_ids, kind="stable")
+    sorted_ids = device_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_ids)])
+    return order, starts, counts
+
+
+def _segmented_cumsum(x, starts, counts):
+    """各组内独立累加；要求每组首元素为 0"""
+    total = np.cumsum(x)
+    return total - np.repeat(total[starts], counts)
+
+
+def _shuffle(arr) -> bytes:
+    """(n, k) 或 (n,) 的整数数组 -> 字节平面（每个字节位置的全部值连续存放）"""
+    n = len(arr)
+    width = arr.dtype.itemsize
+    planes = arr.reshape(n, -1).view(np.uint8).reshape(n, -1, width)
+    return np.ascontiguousarray(planes.transpose(1, 2, 0)).tobytes()
+
+
+def _unshuffle(raw: bytes, dtype, n: int, columns: int = 1):
+    width = np.dtype(dtype).itemsize
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(columns, width, n)
+    arr = np.ascontiguousarray(planes.transpose(2, 0, 1)).view(dtype).reshape(n, columns)
+    return arr[:, 0] if columns == 1 else arr
+
+
+def _zigzag(x):
+    return ((x << 1) ^ (x >> 63)).astype(np.uint64)
+
+
+def _unzigzag(z):
+    z = z.astype(np.int64)
+    return (z >> 1) ^ -(z & 1)
+
+
+def _narrowest(values):
+    """能容纳全部值的最窄无符号类型"""
+    top = int(values.max()) if len(values) else 0
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if top <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
+
+
+# ===============================
+# 块编解码
+# ===============================
+def encode_block(arr, level: int = ZLIB_LEVEL) -> bytes:
+    """FRAME_DTYPE 数组 -> 压缩块"""
+    n = len(arr)
+    device_ids = np.ascontiguousarray(arr["device_id"])
+    order, starts, counts = _groups(device_ids)
+
+    # 时间戳：组内 delta-of-delta，每组首帧单独保存（相对块内最小时间戳）
+    ts = arr["timestamp"][order].astype(np.int64)
+    base = int(ts.min()) if n else 0
+    if not n:
+        empty = zlib.compress(b"", level)
+        return BLOCK_STRUCT.pack(0, 0, 0, 1, *[len(empty)] * 4) + empty * 4
+    delta = np.diff(ts, prepend=ts[:1])
+    delta[starts] = 0
+    dod = delta - np.r_[0, delta[:-1]]
+    dod[starts] = 0
+    firsts = (ts[starts] - base).astype(np.uint32)
+    dod = _narrowest(_zigzag(dod))
+
+    # 通道值：组内与上一帧异或，每组首帧保留原值
+    bits = np.ascontiguousarray(arr["values"][order]).view(np.uint32)
+    xor = bits.copy()
+    xor[1:] ^= bits[:-1]
+    xor[starts] = bits[starts]
+
+    sections = [
+        zlib.compress(_shuffle(device_ids), level),
+        zlib.compress(_shuffle(firsts), level),
+        zlib.compress(_shuffle(dod), level),
+        zlib.compress(_shuffle(xor), level),
+    ]
+    header = BLOCK_STRUCT.pack(
+        n, len(starts), base, dod.dtype.itemsize, *(len(section) for section in sections)
+    )
+    return header + b"".join(sections)
+
+
+def decode_block(buf, offset: int = 0):
+    """压缩块 -> (FRAME_DTYPE 数组, 下一块的偏移)"""
+    n, groups, base, ts_width, *lengths = BLOCK_STRUCT.unpack_from(buf, offset)
+    offset += BLOCK_STRUCT.size
+    sections = []
+    for length in lengths:
+        sections.append(zlib.decompress(buf[offset : offset + length]))
+        offset += length
+
+    out = np.empty(n, dtype=FRAME_DTYPE)
+    if not n:
+        return out, offset
+    device_ids = _unshuffle(sections[0], np.uint32, n)
+    order, starts, counts = _groups(device_ids)
+    if len(starts) != groups:
+        raise ValueError(f"压缩块损坏: 设备组数 {len(starts)}，应为 {groups}")
+    firsts = _unshuffle(sections[1], np.uint32, groups).astype(np.int64)
+    dod = _unzigzag(_unshuffle(sections[2], np.dtype(f"<u{ts_width}"), n))
+    xor = _unshuffle(sections[3], np.uint32, n, CHANNELS)
+
+    delta = _segmented_cumsum(dod, starts, counts)
+    ts = _segmented_cumsum(delta, starts, counts) + np.repeat(firsts + base, counts)
+
+    # 组内累积异或：整体累积后再异或掉各组之前的累积值
+    acc = np.bitwise_xor.accumulate(xor, axis=0)
+    before = acc[starts] ^ xor[starts]
+    acc ^= np.repeat(before, counts, axis=0)
+
+    out["device_id"] = device_ids
+    out["timestamp"][order] = ts.astype(np.uint32)
+    out["values"][order] = acc.view(np.float32)
+    return out, offset
+
+
+# ===============================
+# 压缩段文件
+# ===============================
+def pack_compressed_header(created_at: float) -> bytes:
+    header = HEADER_STRUCT.pack(
+        COMPRESSED_MAGIC,
+        SEGMENT_VERSION,
+        HEADER_SIZE,
+        FRAME_SIZE,
+        0,
+        created_at,
+        FRAME_FORMAT.encode("ascii"),
+    )
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(COMPRESSED_SUFFIX)
+
+
+def compressed_path_for(segment_path: str) -> str:
+    return segment_path[: -len(SEGMENT_SUFFIX)] + COMPRESSED_SUFFIX
+
+
+def write_compressed(path: str, arr, created_at: float, block_frames: int = BLOCK_FRAMES):
+    """先写临时文件再改名，读者不会看到写了一半的压缩段"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(pack_compressed_header(created_at))
+        for lo in range(0, len(arr), block_frames):
+            f.write(encode_block(arr[lo : lo + block_frames]))
+    os.replace(tmp, path)
+
+
+def compress_segment(segment_path: str, remove: bool = True) -> str:
+    """把已封存的 .tseg 压缩为同名 .tsegz，返回新路径"""
+    from segment_store import open_segment
+
+    header = read_header(segment_path)
+    arr = open_segment(segment_path)
+    path = compressed_path_for(segment_path)
+    try:
+        write_compressed(path, arr, header["created_at"])
+    except BaseException:
+        # 不完整的 .tsegz 会遮住原段（两者并存时 list_segments 只取压缩后的）
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    del arr  # 释放 memmap 后才能在 Windows 上删除原文件
+    if remove:
+        os.remove(segment_path)
+    return path
+
+
+def read_compressed_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_STRUCT.size:
+        raise ValueError(f"段文件头不完整: {path}")
+    magic, version, header_size, record_size, _, created_at, frame_format = (
+        HEADER_STRUCT.unpack_from(raw)
+    )
+    if magic != COMPRESSED_MAGIC:
+        raise ValueError(f"不是有效的压缩段文件: {path}")
+    return {
+        "version": version,
+        "header_size": header_size,
+        "record_size": record_size,
+        "created_at": created_at,
+        "frame_format": frame_format.rstrip(b"\0").decode("ascii"),
+    }
+
+
+def iter_compressed_blocks(path: str):
+    """逐块读取并解码，产出 FRAME_DTYPE 数组；内存中只有当前一块"""
+    header = read_compressed_header(path)
+    with open(path, "rb") as f:
+        f.seek(header["header_size"])
+        while True:
+            head = f.read(BLOCK_STRUCT.size)
+            if len(head) < BLOCK_STRUCT.size:
+                return
+            lengths = BLOCK_STRUCT.unpack(head)[4:]
+            body = f.read(sum(lengths))
+            if len(body) < sum(lengths):
+                raise ValueError(f"压缩段不完整: {path}")
+            arr, _ = decode_block(head + body)
+            yield arr
+
+
+def read_compressed(path: str):
+    """整个压缩段解码为一个 FRAME_DTYPE 数组（只读）"""
+    blocks = list(iter_compressed_blocks(path))
+    arr = blocks[0] if len(blocks) == 1 else np.concatenate(blocks) if blocks else (
+        np.empty(0, dtype=FRAME_DTYPE)
+    )
+    arr.flags.writeable = False
+    return arr
+
+
+def compressed_record_count(path: str) -> int:
+    """只读各块头部，不解压"""
+    header = read_compressed_header(path)
+    count = 0
+    with open(path, "rb") as f:
+        f.seek(header["header_size"])
+        while True:
+            raw = f.read(BLOCK_STRUCT.size)
+            if len(raw) < BLOCK_STRUCT.size:
+                return count
+            n, _, _, _, *lengths = BLOCK_STRUCT.unpack(raw)
+            count += n
+            f.seek(sum(lengths), os.SEEK_CUR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="压缩段文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compress = sub.add_parser("compress", help="压缩已封存的 .tseg")
+    compress.add_argument("path", help="段文件目录")
+    compress.add_argument("--all", action="store_true", help="连同最新的段一起压缩（确认接收端已停止）")
+    verify = sub.add_parser("verify", help="校验压缩段可完整解码")
+    verify.add_argument("path", help="压缩段文件或目录")
+    args = parser.parse_args(argv)
+    if np is None:
+        print("需要安装 numpy", file=sys.stderr)
+        return 1
+
+    if args.command == "compress":
+        names = sorted(name for name in os.listdir(args.path) if name.endswith(SEGMENT_SUFFIX))
+        if not args.all:
+            # 每个前缀（多进程时每个 worker 一个）最新的段可能仍在写入
+            latest = {name.rsplit("-", 1)[0]: name for name in names}
+            names = [name for name in names if name not in latest.values()]
+        for name in names:
+            segment_path = os.path.join(args.path, name)
+            raw_size = os.path.getsize(segment_path)
+            count = segment_record_count(segment_path)
+            path = compress_segment(segment_path)
+            size = os.path.getsize(path)
+            print(f"[压缩] {name}: {count} 条，{raw_size} -> {size} 字节（{raw_size / max(size, 1):.1f} 倍）")
+    else:
+        paths = [args.path] if os.path.isfile(args.path) else sorted(
+            os.path.join(args.path, name)
+            for name in os.listdir(args.path)
+            if name.endswith(COMPRESSED_SUFFIX)
+        )
+        for path in paths:
+            count = sum(len(arr) for arr in iter_compressed_blocks(path))
+            print(f"[校验] {path}: {count} 条记录")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
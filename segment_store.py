@@ -0,0 +1,326 @@
+"""
+二进制分段存储（.tseg）
+
+每个段文件 = 64 字节文件头 + 若干条 44 字节定长记录。
+记录与网络报文逐字节相同（<2I9f），接收时无需任何转换即可追加写入；
+分析时用 numpy.memmap 直接映射为结构化数组，零拷贝读取。
+
+文件头（小端序）:
+    magic        8s   b"PWRSEG01"
+    version      H    格式版本
+    header_size  H    文件头长度（记录区起始偏移）
+    record_size  H    单条记录长度（44）
+    reserved     H
+    created_at   d    段创建时间（UNIX 秒）
+    frame_format 16s  记录的 struct 格式串
+
+封存后的段可以压缩为 .tsegz（segment_codec，SegmentSink(compress=True) 时滚动即压缩），
+下面的读取函数对两种文件透明。
+
+用法:
+    python segment_store.py info  segments/
+    python segment_store.py export segments/ -o data_log.csv
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+from frame_codec import (
+    CSV_HEADER,
+    FRAME_FORMAT,
+    FRAME_DTYPE,
+    FRAME_SIZE,
+    format_csv_lines,
+    np,
+    unpack_rows,
+)
+
+SEGMENT_MAGIC = b"PWRSEG01"
+SEGMENT_VERSION = 1
+SEGMENT_SUFFIX = ".tseg"
+COMPRESSED_SUFFIX = ".tsegz"  # 见 segment_codec
+HEADER_SIZE = 64
+HEADER_STRUCT = struct.Struct("<8sHHHHd16s")
+
+
+# ===============================
+# 文件头
+# ===============================
+def pack_header(created_at: float) -> bytes:
+    header = HEADER_STRUCT.pack(
+        SEGMENT_MAGIC,
+        SEGMENT_VERSION,
+        HEADER_SIZE,
+        FRAME_SIZE,
+        0,
+        created_at,
+        FRAME_FORMAT.encode("ascii"),
+    )
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_STRUCT.size:
+        raise ValueError(f"段文件头不完整: {path}")
+    magic, version, header_size, record_size, _, created_at, frame_format = (
+        HEADER_STRUCT.unpack_from(raw)
+    )
+    if magic != SEGMENT_MAGIC:
+        raise ValueError(f"不是有效的段文件: {path}")
+    if record_size != FRAME_SIZE:
+        raise ValueError(f"记录长度不匹配: {record_size}（应为 {FRAME_SIZE}）")
+    return {
+        "version": version,
+        "header_size": header_size,
+        "record_size": record_size,
+        "created_at": created_at,
+        "frame_format": frame_format.rstrip(b"\0").decode("ascii"),
+    }
+
+
+def segment_record_count(path: str, header: dict = None) -> int:
+    """完整记录条数（忽略崩溃时可能残留的半条记录）"""
+    if path.endswith(COMPRESSED_SUFFIX):
+        from segment_codec import compressed_record_count
+
+        return compressed_record_count(path)
+    header = header or read_header(path)
+    return (os.path.getsize(path) - header["header_size"]) // header["record_size"]
+
+
+# ===============================
+# 写入：按条数/时间滚动的段文件
+# ===============================
+class SegmentSink:
+    """
+    追加写入的段文件存储后端，接口与 log_writer.CsvSink 相同
+
+    当前段达到 max_frames 条或存在超过 max_age 秒时滚动到新段；
+    compress=True 时滚动出的旧段立即压缩为 .tsegz（在写入线程中完成）。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_frames: int = 1_000_000,
+        max_age: float = 3600.0,
+        prefix: str = "segment",
+        buffer_size: int = 1 << 20,
+        compress: bool = False,
+    ):
+        self.directory = directory
+        self.compress = compress
+        self.max_frames = max_frames
+        self.max_age = max_age
+        self.prefix = prefix
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+        self._seq = self._next_sequence()
+        self._file = None
+        self._frames = 0
+        self._opened_at = 0.0
+
+    def _next_sequence(self) -> int:
+        """续接目录中已有段文件的序号，重启后不会覆盖旧段"""
+        head = self.prefix + "-"
+        seqs = [
+            int(seq)
+            for name in os.listdir(self.directory)
+            if name.startswith(head)
+            for suffix in (SEGMENT_SUFFIX, COMPRESSED_SUFFIX)
+            if name.endswith(suffix)
+            for seq in [name[len(head) : -len(suffix)]]
+            if seq.isdigit()
+        ]
+        return max(seqs, default=-1) + 1
+
+    @property
+    def current_path(self):
+        return self._file.name if self._file else None
+
+    def _open_segment(self):
+        path = os.path.join(
+            self.directory, f"{self.prefix}-{self._seq:06d}{SEGMENT_SUFFIX}"
+        )
+        self._seq += 1
+        self._opened_at = time.time()
+        self._file = open(path, "xb", buffering=self.buffer_size)
+        self._file.write(pack_header(self._opened_at))
+        self._frames = 0
+
+    def _close_segment(self):
+        if self._file:
+            segment_path = self._file.name
+            self._file.close()
+            self._file = None  # 先清空：压缩失败也不能让后续写入落到已关闭的文件上
+            if self.compress and self._frames:
+                from segment_codec import compress_segment
+
+                try:
+                    compress_segment(segment_path)
+                except Exception as e:
+                    # 保留未压缩的 .tseg，读取函数同样可以读，之后可用 segment_codec compress 补压
+                    print(f"[错误] 段文件压缩失败，保留 {segment_path}: {e}")
+
+    def encode(self, buf: bytes) -> bytes:
+        return buf  # 段文件记录即原始报文，无需编码
+
+    def write_encoded(self, payload: bytes):
+        self.write_frames(payload)
+
+    def write_frames(self, buf: bytes):
+        view = memoryview(buf)
+        while view:
+            if self._file is None or (
+                time.time() - self._opened_at >= self.max_age
+            ):
+                self._close_segment()
+                self._open_segment()
+            room = self.max_frames - self._frames
+            chunk = view[: room * FRAME_SIZE]
+            self._file.write(chunk)
+            self._frames += len(chunk) // FRAME_SIZE
+            view = view[len(chunk) :]
+            if self._frames >= self.max_frames:
+                self._close_segment()
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def sync(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._close_segment()
+
+
+# ===============================
+# 读取
+# ===============================
+def list_segments(path: str, prefix: str = None):
+    """
+    返回目录下按序号排序的段文件路径（.tseg 与 .tsegz）；path 为单个文件时原样返回。
+    压缩过程中同一段短暂地两种文件并存，此时只取压缩后的
+    """
+    if os.path.isfile(path):
+        return [path]
+    names = set(os.listdir(path))
+    selected = sorted(
+        name
+        for name in names
+        if (prefix is None or name.startswith(prefix))
+        and (
+            name.endswith(COMPRESSED_SUFFIX)
+            or name.endswith(SEGMENT_SUFFIX)
+            and name[: -len(SEGMENT_SUFFIX)] + COMPRESSED_SUFFIX not in names
+        )
+    )
+    return [os.path.join(path, name) for name in selected]
+
+
+def open_segment(path: str):
+    """
+    以 numpy.memmap 只读映射段文件，返回结构化数组（零拷贝）；
+    压缩段整段解码到内存，返回只读数组
+    """
+    if np is None:
+        raise RuntimeError("open_segment 需要安装 numpy")
+    if path.endswith(COMPRESSED_SUFFIX):
+        from segment_codec import read_compressed
+
+        return read_compressed(path)
+    header = read_header(path)
+    count = segment_record_count(path, header)
+    if count == 0:
+        return np.empty(0, dtype=FRAME_DTYPE)
+    return np.memmap(
+        path, dtype=FRAME_DTYPE, mode="r", offset=header["header_size"], shape=(count,)
+    )
+
+
+def iter_segment_blocks(path: str, block_frames: int = 65536):
+    """不依赖 numpy 的分块读取，产出长度为 44 整数倍的 bytes（压缩段需要 numpy）"""
+    if path.endswith(COMPRESSED_SUFFIX):
+        from segment_codec import iter_compressed_blocks
+
+        for arr in iter_compressed_blocks(path):
+            yield arr.tobytes()
+        return
+    header = read_header(path)
+    remaining = segment_record_count(path, header)
+    with open(path, "rb") as f:
+        f.seek(header["header_size"])
+        while remaining:
+            count = min(block_frames, remaining)
+            block = f.read(count * FRAME_SIZE)
+            if not block:
+                break
+            remaining -= count
+            yield block
+
+
+# ===============================
+# 导出为 data_log.csv 格式
+# ===============================
+def export_csv(paths, out, header: bool = True) -> int:
+    """将段文件依次转换为与 data_log.csv 完全一致的文本，返回记录条数"""
+    total = 0
+    if header:
+        out.write(CSV_HEADER)
+    for path in paths:
+        for block in iter_segment_blocks(path):
+            out.writelines(format_csv_lines(unpack_rows(block)))
+            total += len(block) // FRAME_SIZE
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="二进制段文件工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    info = sub.add_parser("info", help="查看段文件信息")
+    info.add_argument("path", help="段文件或目录")
+
+    export = sub.add_parser("export", help="导出为 CSV")
+    export.add_argument("path", help="段文件或目录")
+    export.add_argument("-o", "--output", help="输出 CSV 文件（默认标准输出）")
+    export.add_argument("--no-header", action="store_true", help="不写 CSV 表头")
+
+    args = parser.parse_args(argv)
+    paths = list_segments(args.path)
+
+    if args.command == "info":
+        for path in paths:
+            if path.endswith(COMPRESSED_SUFFIX):
+                from segment_codec import read_compressed_header
+
+                header = read_compressed_header(path)
+                count = segment_record_count(path)
+            else:
+                header = read_header(path)
+                count = segment_record_count(path, header)
+            created = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(header["created_at"])
+            )
+            print(
+                f"{path}: {count} 条记录，{os.path.getsize(path)} 字节，"
+                f"创建于 {created}，格式 {header['frame_format']}"
+            )
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            total = export_csv(paths, f, header=not args.no_header)
+        print(f"[导出完成] {total} 条记录 -> {args.output}")
+    else:
+        export_csv(paths, sys.stdout, header=not args.no_header)
+
+
+if __name__ == "__main__":
+    main()
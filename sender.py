@@ -1,10 +1,16 @@
+"""
+每台设备一个线程的简单模拟器，适合几十台设备的联调；
+压测大量连接请使用 load_gen.py
+"""
+
 import socket
-import struct
 import random
 import time
 from datetime import datetime
 import threading
 
+from frame_codec import encode_frame
+
 # === 配置项 ===
 DEVICE_IDS = [i for i in range(10)]  # 模拟设备列表
 SERVER_HOST = "127.0.0.1"
@@ -31,20 +37,21 @@ def generate_message(device_id: int):
     power_b = round(random.uniform(0, 10000), 2)
     power_c = round(random.uniform(0, 10000), 2)
 
-    # 小端打包（2x INT32 + 9x FLOAT32）
-    packed = struct.pack(
-        "<2I9f",
+    # 小端打包（2x UINT32 + 9x FLOAT32），格式见 frame_codec
+    packed = encode_frame(
         device_id,
         timestamp,
-        current_a,
-        current_b,
-        current_c,
-        voltage_a,
-        voltage_b,
-        voltage_c,
-        power_a,
-        power_b,
-        power_c,
+        (
+            current_a,
+            current_b,
+            current_c,
+            voltage_a,
+            voltage_b,
+            voltage_c,
+            power_a,
+            power_b,
+            power_c,
+        ),
     )
     return packed
 
@@ -1,11 +1,17 @@
+"""
+小规模设备模拟器（与 sender.py 使用同一端口与报文格式）；
+压测大量连接请使用 load_gen.py
+"""
+
 import socket
-import struct
 import time
 import threading
 import random
 
+from frame_codec import encode_frame
+
 SERVER_HOST = '127.0.0.1'
-SERVER_PORT = 8080
+SERVER_PORT = 9527  # 与 client.py / sender.py 一致
 REPORT_INTERVAL = 1  # 每秒上报
 
 def generate_packet(device_id: int) -> bytes:
@@ -24,13 +30,11 @@ def generate_packet(device_id: int) -> bytes:
     power_b = round(random.uniform(0, 5000), 2)
     power_c = round(random.uniform(0, 5000), 2)
     
-    # 按协议打包为二进制数据（小端）
-    packet = struct.pack('<ii' + 'f'*9,
-                         device_id,
-                         timestamp,
-                         current_a, current_b, current_c,
-                         voltage_a, voltage_b, voltage_c,
-                         power_a, power_b, power_c)
+    # 按协议打包为二进制数据（小端，格式见 frame_codec）
+    packet = encode_frame(device_id, timestamp,
+                          (current_a, current_b, current_c,
+                           voltage_a, voltage_b, voltage_c,
+                           power_a, power_b, power_c))
     return packet
 
 def simulate_device(device_id: int):
@@ -0,0 +1,447 @@
+"""
+基于段文件的时间/设备查询
+
+为每个段文件维护稀疏索引（.tidx.npz 旁路文件）：按 BLOCK_FRAMES 条记录分块，
+记录每块的最小/最大时间戳以及块内出现的设备ID集合。查询时先用索引筛掉
+无关的段和块，只对命中的块做 memmap 读取和逐条过滤。
+
+设备上报是交错写入的，大多数块都会包含任意一台设备，因此索引另外保存
+按设备分组的行号表（每条记录 4 字节）。按设备查询时若行号表给出的候选行
+少于命中块的总行数，就只按行号读取这些记录。
+
+正在写入的段会持续增长，索引按已有完整块增量补齐，无需整段重建。
+
+用法:
+    python telemetry_query.py segments/ --device 7 \\
+        --start "2025-04-16 13:00:00" --end "2025-04-16 14:00:00"
+    python telemetry_query.py segments/ --device 7 --count
+    python telemetry_query.py segments/ --merge-to merged/   # 多进程段文件按时间合并
+"""
+
+import argparse
+import calendar
+import os
+import sys
+import time
+
+from frame_codec import CSV_HEADER, FRAME_DTYPE, format_csv_lines, iter_array_rows, np
+from segment_store import (
+    COMPRESSED_SUFFIX,
+    SEGMENT_SUFFIX,
+    SegmentSink,
+    list_segments,
+    open_segment,
+    segment_record_count,
+)
+
+BLOCK_FRAMES = 8192
+INDEX_SUFFIX = ".tidx.npz"
+INDEX_VERSION = 1
+
+
+# ===============================
+# 稀疏索引
+# ===============================
+class SegmentIndex:
+    """
+    单个段文件的块级索引
+
+    min_ts/max_ts[b]   第 b 块的时间戳范围
+    dev_ids[dev_offsets[b]:dev_offsets[b + 1]]  第 b 块内出现的设备ID（升序去重）
+    post_rows[post_offsets[i]:post_offsets[i + 1]]  设备 post_ids[i] 的全部行号（升序）
+    """
+
+    def __init__(
+        self,
+        record_count,
+        block_frames,
+        min_ts,
+        max_ts,
+        dev_offsets,
+        dev_ids,
+        post_ids,
+        post_offsets,
+        post_rows,
+    ):
+        self.record_count = record_count
+        self.block_frames = block_frames
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        self.dev_offsets = dev_offsets
+        self.dev_ids = dev_ids
+        self.post_ids = post_ids
+        self.post_offsets = post_offsets
+        self.post_rows = post_rows
+
+    @property
+    def block_count(self) -> int:
+        return len(self.min_ts)
+
+    def overlaps(self, start=None, end=None) -> bool:
+        if not self.block_count:
+            return False
+        if start is not None and self.max_ts.max() < start:
+            return False
+        if end is not None and self.min_ts.min() >= end:
+            return False
+        return True
+
+    def select_blocks(self, start=None, end=None, devices=None):
+        """返回可能包含匹配记录的块号数组"""
+        mask = np.ones(self.block_count, dtype=bool)
+        if start is not None:
+            mask &= self.max_ts >= start
+        if end is not None:
+            mask &= self.min_ts < end
+        if devices is not None and self.block_count:
+            hits = np.isin(self.dev_ids, devices).astype(np.int32)
+            mask &= np.add.reduceat(hits, self.dev_offsets[:-1]) > 0
+        return np.flatnonzero(mask)
+
+    def device_rows(self, devices):
+        """返回给定设备的全部行号（升序）"""
+        pos = np.searchsorted(self.post_ids, devices)
+        found = pos < len(self.post_ids)
+        pos = pos[found]
+        pos = pos[self.post_ids[pos] == devices[found]]
+        runs = [self.post_rows[self.post_offsets[i] : self.post_offsets[i + 1]] for i in pos]
+        if not runs:
+            return np.empty(0, dtype=np.uint32)
+        return runs[0] if len(runs) == 1 else np.sort(np.concatenate(runs))
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            version=INDEX_VERSION,
+            record_count=self.record_count,
+            block_frames=self.block_frames,
+            min_ts=self.min_ts,
+            max_ts=self.max_ts,
+            dev_offsets=self.dev_offsets,
+            dev_ids=self.dev_ids,
+            post_ids=self.post_ids,
+            post_offsets=self.post_offsets,
+            post_rows=self.post_rows,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                return None
+            return cls(
+                int(data["record_count"]),
+                int(data["block_frames"]),
+                data["min_ts"],
+                data["max_ts"],
+                data["dev_offsets"],
+                data["dev_ids"],
+                data["post_ids"],
+                data["post_offsets"],
+                data["post_rows"],
+            )
+
+
+def index_path_for(segment_path: str) -> str:
+    """压缩前后记录顺序不变，.tseg 与对应的 .tsegz 共用同一个索引文件"""
+    if segment_path.endswith(COMPRESSED_SUFFIX):
+        return segment_path[: -len(COMPRESSED_SUFFIX)] + INDEX_SUFFIX
+    return segment_path[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+
+def build_index(arr, block_frames: int = BLOCK_FRAMES, previous: SegmentIndex = None):
+    """
+    为段数组建立索引；给出 previous 时复用其中已完整的块，只计算新增部分
+    """
+    reuse = 0
+    if previous is not None and previous.block_frames == block_frames:
+        reuse = min(previous.record_count, len(arr)) // block_frames
+
+    new_min, new_max, new_ids = [], [], []
+    timestamps = arr["timestamp"]
+    device_ids = arr["device_id"]
+    for lo in range(reuse * block_frames, len(arr), block_frames):
+        ts = timestamps[lo : lo + block_frames]
+        new_min.append(ts.min())
+        new_max.append(ts.max())
+        new_ids.append(np.unique(device_ids[lo : lo + block_frames]))
+
+    counts = np.array([len(ids) for ids in new_ids], dtype=np.int64)
+    min_ts = np.array(new_min, dtype=np.uint32)
+    max_ts = np.array(new_max, dtype=np.uint32)
+    dev_ids = np.concatenate(new_ids).astype(np.uint32) if new_ids else np.empty(0, np.uint32)
+    if reuse:
+        counts = np.concatenate([np.diff(previous.dev_offsets[: reuse + 1]), counts])
+        min_ts = np.concatenate([previous.min_ts[:reuse], min_ts])
+        max_ts = np.concatenate([previous.max_ts[:reuse], max_ts])
+        dev_ids = np.concatenate([previous.dev_ids[: previous.dev_offsets[reuse]], dev_ids])
+
+    dev_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=dev_offsets[1:])
+
+    # 设备行号表：旧表中已复用部分 + 新增行，按设备稳定排序后行号仍然升序
+    first_new = reuse * block_frames
+    rows = np.arange(first_new, len(arr), dtype=np.uint32)
+    row_devices = np.asarray(device_ids[first_new:], dtype=np.uint32)
+    if reuse:
+        prev_devices = np.repeat(previous.post_ids, np.diff(previous.post_offsets))
+        keep = previous.post_rows < first_new
+        rows = np.concatenate([previous.post_rows[keep], rows])
+        row_devices = np.concatenate([prev_devices[keep], row_devices])
+    order = np.argsort(row_devices, kind="stable")
+    row_devices = row_devices[order]
+    post_ids, starts = np.unique(row_devices, return_index=True)
+    post_offsets = np.append(starts, len(row_devices)).astype(np.int64)
+
+    return SegmentIndex(
+        len(arr),
+        block_frames,
+        min_ts,
+        max_ts,
+        dev_offsets,
+        dev_ids,
+        post_ids.astype(np.uint32),
+        post_offsets,
+        rows[order],
+    )
+
+
+# ===============================
+# 查询
+# ===============================
+class TelemetryStore:
+    """
+    段文件目录上的查询入口，索引在内存中缓存并落盘到旁路文件
+    """
+
+    def __init__(self, path: str, block_frames: int = BLOCK_FRAMES, save_index: bool = True):
+        if np is None:
+            raise RuntimeError("TelemetryStore 需要安装 numpy")
+        self.path = path
+        self.block_frames = block_frames
+        self.save_index = save_index
+        self._indexes = {}
+        self.last_stats = {}
+
+    def index_for(self, segment_path: str, arr=None) -> SegmentIndex:
+        """
+        arr 为 None 时只在需要建立索引时才打开段文件，
+        压缩段在索引排除整段时不必解码
+        """
+        index = self._indexes.get(segment_path)
+        if index is None:
+            sidecar = index_path_for(segment_path)
+            if os.path.exists(sidecar):
+                try:
+                    index = SegmentIndex.load(sidecar)
+                except (OSError, ValueError, KeyError):
+                    index = None
+        count = segment_record_count(segment_path) if arr is None else len(arr)
+        if index is None or index.record_count != count:
+            if arr is None:
+                arr = open_segment(segment_path)
+            index = build_index(arr, self.block_frames, previous=index)
+            if self.save_index:
+                index.save(index_path_for(segment_path))
+        self._indexes[segment_path] = index
+        return index
+
+    def time_range(self):
+        """全部段文件的 (最小时间戳, 最大时间戳)，无数据时返回 None"""
+        lo = hi = None
+        for segment_path in list_segments(self.path):
+            index = self.index_for(segment_path)
+            if not index.block_count:
+                continue
+            seg_lo, seg_hi = int(index.min_ts.min()), int(index.max_ts.max())
+            lo = seg_lo if lo is None else min(lo, seg_lo)
+            hi = seg_hi if hi is None else max(hi, seg_hi)
+        return None if lo is None else (lo, hi)
+
+    def iter_time_ordered(self, window: int = 3600, devices=None):
+        """
+        按时间窗口逐段产出按时间戳排序的记录，内存占用只与窗口大小有关。
+        多进程接收（--workers）写出的各自段文件在这里合并为一条时间序列。
+        """
+        bounds = self.time_range()
+        if bounds is None:
+            return
+        # 压缩段（.tsegz）每次打开都要整段解码：解码结果在各窗口间复用，
+        # 窗口越过该段的最大时间戳后释放
+        decoded = {}
+        for start in range(bounds[0], bounds[1] + 1, window):
+            chunk = self._query(start, start + window, devices, True, decoded)
+            if len(chunk):
+                yield chunk
+            for segment_path in list(decoded):
+                if int(self._indexes[segment_path].max_ts.max()) < start + window:
+                    del decoded[segment_path]
+
+    def query(self, start=None, end=None, devices=None, sort: bool = False):
+        """
+        读取 [start, end) 时间范围内、设备ID属于 devices 的全部记录
+
+        start/end 为 UTC 时间戳（int），devices 为设备ID序列，None 表示不限。
+        返回 FRAME_DTYPE 结构化数组；sort=True 时按时间戳稳定排序。
+        """
+        return self._query(start, end, devices, sort)
+
+    def _query(self, start, end, devices, sort: bool, decoded: dict = None):
+        """query 的实现；decoded 不为 None 时在其中缓存解码后的压缩段（段路径 -> 数组）"""
+        wanted = None if devices is None else np.unique(np.asarray(devices, dtype=np.uint32))
+        parts = []
+        stats = {
+            "segments": 0,
+            "segments_read": 0,
+            "blocks": 0,
+            "blocks_read": 0,
+            "rows_read": 0,
+        }
+
+        for segment_path in list_segments(self.path):
+            index = self.index_for(segment_path)
+            stats["segments"] += 1
+            stats["blocks"] += index.block_count
+            if not index.overlaps(start, end):
+                continue
+            blocks = index.select_blocks(start, end, wanted)
+            if not len(blocks):
+                continue
+            stats["segments_read"] += 1
+            arr = None if decoded is None else decoded.get(segment_path)
+            if arr is None:
+                arr = open_segment(segment_path)
+                if decoded is not None and segment_path.endswith(COMPRESSED_SUFFIX):
+                    decoded[segment_path] = arr
+
+            rows = None
+            if wanted is not None:
+                rows = index.device_rows(wanted)
+                rows = rows[np.isin(rows // index.block_frames, blocks)]
+                if len(rows) >= len(blocks) * index.block_frames // 4:
+                    rows = None  # 候选行太密集，按块顺序读取更快
+            if rows is not None:
+                stats["rows_read"] += len(rows)
+                chunk = arr[rows]
+                mask = _row_mask(chunk, start, end, None)
+                parts.append(chunk if mask is None else chunk[mask])
+                continue
+
+            stats["blocks_read"] += len(blocks)
+            for lo, hi in _block_ranges(blocks, index.block_frames, len(arr)):
+                chunk = arr[lo:hi]
+                stats["rows_read"] += len(chunk)
+                mask = _row_mask(chunk, start, end, wanted)
+                if mask is None:
+                    parts.append(np.array(chunk))
+                elif mask.any():
+                    parts.append(chunk[mask])
+
+        self.last_stats = stats
+        result = np.concatenate(parts) if parts else np.empty(0, dtype=FRAME_DTYPE)
+        if sort and len(result):
+            result = result[np.argsort(result["timestamp"], kind="stable")]
+        return result
+
+
+def _block_ranges(blocks, block_frames: int, record_count: int):
+    """把连续的块号合并为 [lo, hi) 记录区间，减少切片次数"""
+    breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+    for run in np.split(blocks, breaks):
+        yield int(run[0]) * block_frames, min(
+            (int(run[-1]) + 1) * block_frames, record_count
+        )
+
+
+def _row_mask(chunk, start, end, devices):
+    mask = None
+    if start is not None:
+        mask = chunk["timestamp"] >= start
+    if end is not None:
+        m = chunk["timestamp"] < end
+        mask = m if mask is None else mask & m
+    if devices is not None:
+        m = np.isin(chunk["device_id"], devices)
+        mask = m if mask is None else mask & m
+    return mask
+
+
+def query(path: str, start=None, end=None, devices=None, sort: bool = False):
+    """一次性查询的便捷函数，参数同 TelemetryStore.query"""
+    return TelemetryStore(path).query(start, end, devices, sort)
+
+
+def merge_time_ordered(path: str, dest: str, window: int = 3600, prefix: str = "merged") -> int:
+    """把目录下（可能来自多个工作进程的）段文件合并为按时间排序的新段文件"""
+    sink = SegmentSink(dest, max_age=float("inf"), prefix=prefix)
+    total = 0
+    try:
+        for chunk in TelemetryStore(path).iter_time_ordered(window):
+            sink.write_frames(chunk.tobytes())
+            total += len(chunk)
+    finally:
+        sink.close()
+    return total
+
+
+# ===============================
+# 命令行
+# ===============================
+def parse_time(value: str) -> int:
+    """接受 UNIX 时间戳或 "YYYY-MM-DD HH:MM:SS"（UTC，与 CSV 上报时间一致）"""
+    if value.isdigit():
+        return int(value)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法识别的时间: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按时间/设备查询段文件")
+    parser.add_argument("path", help="段文件或目录")
+    parser.add_argument("--start", type=parse_time, help="起始时间（含）")
+    parser.add_argument("--end", type=parse_time, help="结束时间（不含）")
+    parser.add_argument(
+        "--device", type=int, action="append", dest="devices", help="设备ID，可重复"
+    )
+    parser.add_argument("--sort", action="store_true", help="按时间戳排序输出")
+    parser.add_argument("--count", action="store_true", help="只输出匹配条数")
+    parser.add_argument("--no-header", action="store_true", help="不输出 CSV 表头")
+    parser.add_argument(
+        "--merge-to", metavar="DIR", help="把全部段文件按时间顺序合并写入 DIR 后退出"
+    )
+    args = parser.parse_args(argv)
+
+    if args.merge_to:
+        if os.path.abspath(args.merge_to) == os.path.abspath(args.path):
+            parser.error("--merge-to 不能与源目录相同")
+        total = merge_time_ordered(args.path, args.merge_to)
+        print(f"[合并完成] {total} 条记录 -> {args.merge_to}", file=sys.stderr)
+        return
+
+    store = TelemetryStore(args.path)
+    start = time.perf_counter()
+    result = store.query(args.start, args.end, args.devices, sort=args.sort)
+    elapsed = time.perf_counter() - start
+
+    if args.count:
+        print(len(result))
+    else:
+        if not args.no_header:
+            sys.stdout.write(CSV_HEADER)
+        sys.stdout.writelines(format_csv_lines(iter_array_rows(result)))
+    stats = store.last_stats
+    print(
+        f"[查询] {len(result)} 条，耗时 {elapsed:.3f}s，"
+        f"读取段 {stats['segments_read']}/{stats['segments']}，"
+        f"读取块 {stats['blocks_read']}/{stats['blocks']}，"
+        f"读取记录 {stats['rows_read']}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+时长缓存：文件大小或 mtime 变化即失效，按上限淘汰，跨实例持久化
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import duration_cache
+from duration_cache import DurationCache
+
+
+class DurationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.cache_path = os.path.join(self.workdir, "cache.sqlite3")
+        self.video = self.make_file("a.mp4", b"x" * 100)
+
+    def make_file(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.workdir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        os.utime(path, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+        return path
+
+    def open_cache(self, **options) -> DurationCache:
+        cache = DurationCache(self.cache_path, **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_hit_after_put(self):
+        cache = self.open_cache()
+        self.assertIsNone(cache.get(self.video))
+        cache.put(self.video, os.stat(self.video), 12.5)
+        cache.flush()
+        self.assertEqual(cache.get(self.video), 12.5)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_persists_across_instances(self):
+        with DurationCache(self.cache_path) as cache:
+            cache.put(self.video, os.stat(self.video), 30.0)
+        self.assertEqual(self.open_cache().get(self.video), 30.0)
+
+    def test_mtime_change_invalidates(self):
+        cache = self.open_cache()
+        cache.put(self.video, os.stat(self.video), 12.5)
+        cache.flush()
+        os.utime(self.video, ns=(1_700_000_000_000_000_001, 1_700_000_000_000_000_001))
+        self.assertIsNone(cache.get(self.video))
+        cache.flush()
+        self.assertEqual(len(cache), 0, "失效的记录应被删除")
+
+    def test_size_change_invalidates(self):
+        cache = self.open_cache()
+        cache.put(self.video, os.stat(self.video), 12.5)
+        cache.flush()
+        stat = os.stat(self.video)
+        self.make_file("a.mp4", b"x" * 101)  # mtime 保持不变
+        self.assertEqual(os.stat(self.video).st_mtime_ns, stat.st_mtime_ns)
+        self.assertIsNone(cache.get(self.video))
+
+    def test_eviction_keeps_recently_used(self):
+        cache = self.open_cache(max_entries=3)
+        paths = [self.make_file(f"{i}.mp4", b"x" * i) for i in range(1, 6)]
+        with mock.patch.object(duration_cache.time, "time", side_effect=range(100, 200)):
+            for path in paths[:3]:
+                cache.put(path, os.stat(path), 1.0)
+            cache.flush()
+            cache.get(paths[0])  # 最早写入的刚被用过
+            for path in paths[3:]:
+                cache.put(path, os.stat(path), 1.0)
+            cache.flush()
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(paths[0]), 1.0)
+        self.assertIsNone(cache.get(paths[1]))
+        self.assertIsNone(cache.get(paths[2]))
+        self.assertEqual(cache.get(paths[4]), 1.0)
+
+    def test_video_length_measures_once(self):
+        cache = self.open_cache()
+        with mock.patch.object(duration_cache, "get_video_length", return_value=42.0) as probe:
+            self.assertEqual(cache.video_length(self.video), 42.0)
+            cache.flush()
+            self.assertEqual(cache.video_length(self.video), 42.0)
+        self.assertEqual(probe.call_count, 1)
+
+    def test_failed_measurement_not_cached(self):
+        cache = self.open_cache()
+        with mock.patch.object(duration_cache, "get_video_length", return_value=0) as probe:
+            cache.video_length(self.video)
+            cache.flush()
+            cache.video_length(self.video)
+        self.assertEqual(probe.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
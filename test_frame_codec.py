@@ -0,0 +1,65 @@
+"""
+批量解码：与逐条 struct.unpack / parse_message 的结果一致
+"""
+
+import struct
+import unittest
+
+import client
+from frame_codec import (
+    FRAME_SIZE,
+    decode_frames,
+    format_csv_lines,
+    format_record,
+    iter_array_rows,
+    np,
+    parse_csv_row,
+    unpack_rows,
+)
+from test_framing import make_stream
+
+
+class FrameCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = make_stream(200, seed=5)
+        self.frames = [
+            self.stream[i : i + FRAME_SIZE] for i in range(0, len(self.stream), FRAME_SIZE)
+        ]
+
+    def test_unpack_rows_matches_struct(self):
+        self.assertEqual(
+            list(unpack_rows(self.stream)), [struct.unpack("<2I9f", frame) for frame in self.frames]
+        )
+
+    def test_format_record_matches_parse_message(self):
+        rows = list(unpack_rows(self.stream))
+        self.assertEqual(
+            [format_record(row) for row in rows], [client.parse_message(frame) for frame in self.frames]
+        )
+
+    def test_csv_lines_round_trip(self):
+        lines = format_csv_lines(unpack_rows(self.stream))
+        for line, frame in zip(lines, self.frames):
+            parsed = parse_csv_row(line.rstrip("\n").split(","))
+            device_id, timestamp = struct.unpack_from("<2I", frame)
+            self.assertEqual(parsed[:2], (device_id, timestamp))
+        with self.assertRaises(ValueError):
+            parse_csv_row(["1", "2"])
+
+    @unittest.skipIf(np is None, "需要 numpy")
+    def test_decode_frames_columns(self):
+        arr = decode_frames(self.stream)
+        rows = list(unpack_rows(self.stream))
+        self.assertEqual(len(arr), len(rows))
+        self.assertEqual(arr["device_id"].tolist(), [row[0] for row in rows])
+        self.assertEqual(arr["timestamp"].tolist(), [row[1] for row in rows])
+        self.assertEqual(list(iter_array_rows(arr)), rows)
+
+    @unittest.skipIf(np is None, "需要 numpy")
+    def test_decode_frames_rejects_partial_frame(self):
+        with self.assertRaises(ValueError):
+            decode_frames(self.stream[:-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+"""
+FrameBuffer 分帧：拆分 / 合并的字节流、跨读取的半帧，以及与原始逐条解析的 CSV 输出一致
+"""
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import client
+from frame_codec import CSV_HEADER, FRAME_SIZE, encode_frame
+from framing import FrameBuffer
+from log_writer import CsvSink
+
+
+def make_stream(count: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    return b"".join(
+        encode_frame(
+            rng.randrange(1, 1000),
+            1_744_000_000 + i // 7,
+            [rng.uniform(0, 100) for _ in range(3)]
+            + [rng.uniform(210, 230) for _ in range(3)]
+            + [rng.uniform(0, 10000) for _ in range(3)],
+        )
+        for i in range(count)
+    )
+
+
+def feed(frames: FrameBuffer, chunks):
+    """按给定的分块依次写入缓冲区（分块大于可写区域时分多次），返回取出的完整报文"""
+    out = []
+    for chunk in chunks:
+        view = memoryview(chunk)
+        while view:
+            target = frames.writable()
+            n = min(len(target), len(view))
+            target[:n] = view[:n]
+            frames.commit(n)
+            view = view[n:]
+            out.extend(bytes(frame) for frame in frames.iter_frames())
+    return out
+
+
+def split(data: bytes, sizes):
+    chunks, offset = [], 0
+    for size in sizes:
+        chunks.append(data[offset : offset + size])
+        offset += size
+    if offset < len(data):
+        chunks.append(data[offset:])
+    return chunks
+
+
+class FrameBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.stream = make_stream(500)
+        self.expected = [
+            self.stream[i : i + FRAME_SIZE] for i in range(0, len(self.stream), FRAME_SIZE)
+        ]
+
+    def test_split_reads(self):
+        rng = random.Random(1)
+        sizes = [rng.randint(1, 3 * FRAME_SIZE) for _ in range(2000)]
+        frames = FrameBuffer(capacity_frames=4)
+        self.assertEqual(feed(frames, split(self.stream, sizes)), self.expected)
+        self.assertEqual(frames.pending, 0)
+
+    def test_one_byte_reads(self):
+        frames = FrameBuffer(capacity_frames=2)
+        self.assertEqual(feed(frames, split(self.stream, [1] * len(self.stream))), self.expected)
+
+    def test_coalesced_reads(self):
+        # 一次读取包含多条报文（大于缓冲区时按可写区域分多次）
+        frames = FrameBuffer(capacity_frames=64)
+        self.assertEqual(feed(frames, [self.stream]), self.expected)
+        frames = FrameBuffer(capacity_frames=64)
+        sizes = [FRAME_SIZE * 10 + 3, FRAME_SIZE * 30 - 3, FRAME_SIZE * 100]
+        self.assertEqual(feed(frames, split(self.stream, sizes)), self.expected)
+
+    def test_partial_frame_carried_across_reads(self):
+        frames = FrameBuffer(capacity_frames=4)
+        first, second = self.expected[0], self.expected[1]
+        self.assertEqual(feed(frames, [first + second[:30]]), [first])
+        self.assertEqual(frames.pending, 30)
+        self.assertEqual(feed(frames, [second[30:40]]), [])
+        self.assertEqual(frames.pending, 40)
+        self.assertEqual(feed(frames, [second[40:]]), [second])
+        self.assertEqual(frames.pending, 0)
+
+    def test_pop_frames_returns_whole_frames_only(self):
+        frames = FrameBuffer(capacity_frames=8)
+        target = frames.writable()
+        target[: FRAME_SIZE * 3 - 5] = self.stream[: FRAME_SIZE * 3 - 5]
+        frames.commit(FRAME_SIZE * 3 - 5)
+        block = frames.pop_frames()
+        self.assertEqual(bytes(block), self.stream[: FRAME_SIZE * 2])
+        self.assertTrue(block.readonly)
+        self.assertEqual(frames.pending, FRAME_SIZE - 5)
+
+    def test_rejects_tiny_capacity(self):
+        with self.assertRaises(ValueError):
+            FrameBuffer(capacity_frames=1)
+
+    def test_recv_from_socket(self):
+        left, right = socket.socketpair()
+        rng = random.Random(2)
+        chunks = split(self.stream, [rng.randint(1, 200) for _ in range(400)])
+
+        def send():
+            with left:
+                for chunk in chunks:
+                    left.sendall(chunk)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        frames = FrameBuffer(capacity_frames=4)
+        received = []
+        with right:
+            while frames.recv_from(right):
+                received.extend(bytes(frame) for frame in frames.iter_frames())
+        sender.join()
+        self.assertEqual(received, self.expected)
+
+
+class CsvParityTest(unittest.TestCase):
+    """分帧后批量写出的 CSV 与原来逐条 parse_message + handle_parsed_data 的结果逐字节相同"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+
+    def baseline_csv(self, frames) -> str:
+        path = os.path.join(self.workdir, "baseline.csv")
+        with mock.patch.object(client, "OUTPUT_FILE", path), contextlib.redirect_stdout(io.StringIO()):
+            for frame in frames:
+                client.handle_parsed_data(client.parse_message(frame))
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_csv_matches_baseline(self):
+        stream = make_stream(300, seed=3)
+        rng = random.Random(4)
+        frames = feed(FrameBuffer(capacity_frames=4), split(stream, [rng.randint(1, 100) for _ in range(500)]))
+        path = os.path.join(self.workdir, "batched.csv")
+        sink = CsvSink(path)
+        sink.write_frames(b"".join(frames))
+        sink.close()
+        with open(path, encoding="utf-8") as f:
+            batched = f.read()
+        self.assertTrue(batched.startswith(CSV_HEADER))
+        self.assertEqual(batched[len(CSV_HEADER) :], self.baseline_csv(frames))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+树视图选中统计：目录与其下的项目同时选中只计一次，增减选中与整体重算一致，
+增量更新后仍然选中的项目按新结果重新统计
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import video_save
+import video_scan
+from index_tree import IndexTree
+from scan_index import ScanIndex
+from test_scan_index import make_tree, scan
+from test_video_save import FakeTree, VideoSaveTestCase
+from video_save import format_time
+
+
+def brute_force(view: IndexTree, selection):
+    """直接按节点计算 (文件数, 目录数, 视频数, 总时长)：祖先目录已选中的节点不计入时长"""
+    tree, index = view.tree, view.index
+    parents = {child: parent for parent, children in tree.children.items() for child in children}
+    selected = set(selection)
+
+    def covered(item):
+        parent = parents.get(item, "")
+        while parent:
+            if parent in selected:
+                return True
+            parent = parents.get(parent, "")
+        return False
+
+    files = sum(item in view.file_items for item in selection)
+    dirs = sum(item in view.dir_items for item in selection)
+    videos = 0
+    total = 0.0
+    for item in selection:
+        if covered(item):
+            continue
+        if item in view.file_items:
+            videos += 1
+            total += index.file_lengths[view.file_items[item]]
+        elif item in view.dir_items:
+            videos += index.dir_videos[view.dir_items[item]]
+            total += index.dir_totals[view.dir_items[item]]
+    return files, dirs, videos, total
+
+
+class IndexTreeSelectionTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.root = os.path.join(self.workdir, "videos")
+        make_tree(self.root)
+        self.index = ScanIndex.from_node(scan(self.root))
+        self.tree = FakeTree()
+        self.view = IndexTree(self.tree, format_time)
+        self.view.show(self.index)
+        expanded = set()
+        while expanded != set(self.view.dir_items):  # 全部展开，所有节点都可选中
+            for item in set(self.view.dir_items) - expanded:
+                self.view.expand(item)
+                expanded.add(item)
+
+    def item(self, name: str) -> str:
+        """按相对路径找节点，如 "season1/e1.mp4"，"" 为根目录"""
+        item = self.tree.get_children()[0]
+        for part in filter(None, name.split("/")):
+            item = next(child for child in self.tree.get_children(item)
+                        if self.tree.texts[child] == part)
+        return item
+
+    def select(self, *names):
+        self.tree.selected = tuple(self.item(name) for name in names)
+        return self.view.update_selection(self.tree.selection())
+
+    def test_directory_covers_items_inside(self):
+        self.assertEqual(self.select("a.mp4"), (1, 0, 1, 10.0))
+        self.assertEqual(self.select("season1", "season1/e1.mp4", "season1/extras/clip.avi"), (2, 1, 3, 75.0))
+        self.assertEqual(self.select("season1", "season1/extras", "a.mp4"), (1, 2, 4, 85.0))
+        self.assertEqual(self.select("", "season2", "b.mkv"), (1, 2, 6, 155.0))
+        self.assertEqual(self.select("empty"), (0, 1, 0, 0.0))
+
+    def test_incremental_changes_match_recount(self):
+        items = list(self.view.dir_items) + list(self.view.file_items)
+        rng = random.Random(7)
+        selection = []
+        for _ in range(300):
+            # 多数时候只增减一个文件（走增量路径），偶尔换成任意集合
+            choice = rng.random()
+            if choice < 0.4 and selection:
+                selection.remove(rng.choice(selection))
+            elif choice < 0.9:
+                item = rng.choice(list(self.view.file_items))
+                if item not in selection:
+                    selection.append(item)
+            else:
+                selection = rng.sample(items, rng.randint(0, 5))
+            self.tree.selected = tuple(selection)
+            actual = self.view.update_selection(self.tree.selection())
+            expected = brute_force(self.view, selection)
+            self.assertEqual(actual[:3], expected[:3], selection)
+            self.assertAlmostEqual(actual[3], expected[3], places=6)
+
+    def test_patch_recounts_selection(self):
+        self.assertEqual(self.select("season1", "b.mkv"), (1, 1, 4, 95.0))
+        with open(os.path.join(self.root, "season1", "e1.mp4"), "ab") as f:
+            f.write(b"x" * 5)
+        os.remove(os.path.join(self.root, "b.mkv"))
+        index = ScanIndex.from_node(scan(self.root, previous=self.index))
+        # b.mkv 已删除，不再处于选中状态；season1 按新的总时长统计
+        self.assertEqual(self.view.patch(index), (0, 1, 3, 80.0))
+        self.assertEqual(self.view.update_selection(self.tree.selection()), (0, 1, 3, 80.0))
+
+
+class RescanSelectionTest(VideoSaveTestCase):
+    def test_rescan_refreshes_selection_label(self):
+        root = os.path.join(self.workdir, "videos")
+        make_tree(root)
+        previous = ScanIndex.from_node(scan(root))
+        video_save.view.show(previous)
+        season1 = next(item for item, dir_id in video_save.view.dir_items.items()
+                       if previous.dir_names[dir_id] == "season1")
+        video_save.tree.selected = (season1,)
+        video_save.calculate_selected_duration()
+        self.assertIn("共3个视频", video_save.selection_label.text)
+        self.assertIn(format_time(75.0), video_save.selection_label.text)
+
+        os.remove(os.path.join(root, "season1", "e2.mp4"))
+        with mock.patch.object(video_scan, "get_video_length", lambda path: float(os.path.getsize(path))):
+            video_save.run_scan(root, previous=previous)
+            self.pump_until(lambda: video_save.status_label.text.startswith("增量更新完成"))
+        self.assertEqual(self.errors, [])
+        self.assertIn("共2个视频", video_save.selection_label.text)
+        self.assertIn(format_time(35.0), video_save.selection_label.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
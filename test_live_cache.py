@@ -0,0 +1,107 @@
+"""
+最新值缓存：整块（numpy）更新与逐帧更新的结果一致，环形缓冲区保持到达顺序
+"""
+
+import contextlib
+import io
+import json
+import random
+import unittest
+import urllib.request
+from collections import defaultdict
+
+from frame_codec import FRAME_SIZE, FRAME_STRUCT, format_record, np
+from live_cache import VECTOR_MIN_FRAMES, LatestTable, start_live_server
+from test_framing import make_stream
+
+
+def make_blocks(seed: int, devices: int = 12):
+    """设备数少、块大小不一：同一设备在一个块内出现多次，常常超过 history"""
+    rng = random.Random(seed)
+    stream = bytearray(make_stream(3000, seed=seed))
+    for offset in range(0, len(stream), FRAME_SIZE):
+        stream[offset : offset + 4] = rng.randrange(1, devices + 1).to_bytes(4, "little")
+    blocks, offset = [], 0
+    while offset < len(stream):
+        size = rng.choice((1, 5, VECTOR_MIN_FRAMES, 100, 700)) * FRAME_SIZE
+        blocks.append(bytes(stream[offset : offset + size]))
+        offset += size
+    return blocks
+
+
+def snapshot(table: LatestTable):
+    return {
+        device_id: (table.latest(device_id)[0], table.latest(device_id)[2], table.recent(device_id))
+        for device_id in table.devices()
+    }
+
+
+class LatestTableTest(unittest.TestCase):
+    def check_against_reference(self, table: LatestTable, blocks):
+        """逐帧重放得到的参考结果：最新一帧、累计条数、最近 history 帧"""
+        seen = defaultdict(list)
+        for block in blocks:
+            for offset in range(0, len(block), FRAME_SIZE):
+                frame = block[offset : offset + FRAME_SIZE]
+                seen[int.from_bytes(frame[:4], "little")].append(frame)
+        self.assertEqual(table.devices(), sorted(seen))
+        for device_id, frames in seen.items():
+            frame, _, count = table.latest(device_id)
+            self.assertEqual(frame, frames[-1])
+            self.assertEqual(count, len(frames))
+            if table.history:
+                self.assertEqual(table.recent(device_id), frames[-table.history :])
+                self.assertEqual(table.recent(device_id, 2), frames[-2:])
+            else:
+                self.assertEqual(table.recent(device_id), [frames[-1]])
+        self.assertEqual(sorted(table.counts()), sorted((d, len(f)) for d, f in seen.items()))
+
+    def test_matches_reference(self):
+        for history in (0, 5):
+            blocks = make_blocks(seed=history)
+            table = LatestTable(capacity=2, history=history)  # 小容量，覆盖扩容
+            for block in blocks:
+                table.update(block)
+            self.check_against_reference(table, blocks)
+
+    @unittest.skipIf(np is None, "需要 numpy")
+    def test_block_and_frame_paths_agree(self):
+        for history in (0, 3, 8):
+            blocks = make_blocks(seed=10 + history, devices=30)
+            by_block = LatestTable(capacity=4, history=history)
+            by_frame = LatestTable(capacity=4, history=history)
+            for block in blocks:
+                by_block._update_block(block, len(block) // FRAME_SIZE)
+                by_frame._update_frames(block)
+            self.assertEqual(snapshot(by_block), snapshot(by_frame))
+            self.check_against_reference(by_block, blocks)
+
+    def test_http_endpoint(self):
+        blocks = make_blocks(seed=20)
+        table = LatestTable(history=3)
+        for block in blocks:
+            table.update(block)
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = start_live_server(table, "127.0.0.1", 0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def get(path):
+            with urllib.request.urlopen(base + path, timeout=5) as response:
+                return json.loads(response.read())
+
+        device_id = table.devices()[0]
+        latest = get(f"/latest/{device_id}")
+        expected = format_record(FRAME_STRUCT.unpack(table.latest(device_id)[0]))
+        self.assertEqual({key: latest[key] for key in expected}, expected)
+        self.assertEqual(get("/devices")["devices"], table.devices())
+
+    def test_unknown_device(self):
+        table = LatestTable(history=4)
+        self.assertIsNone(table.latest(1))
+        self.assertEqual(table.recent(1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
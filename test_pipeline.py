@@ -0,0 +1,114 @@
+"""
+有界队列的三种过载策略：block / drop-oldest / spill
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from frame_codec import FRAME_SIZE
+from pipeline import BoundedQueue
+
+
+def block(tag: int, frames: int = 4) -> bytes:
+    """frames 条报文，字节内容带编号以便核对顺序"""
+    return bytes([tag % 256]) * (FRAME_SIZE * frames)
+
+
+def drain(q: BoundedQueue):
+    items = []
+    while True:
+        item = q.get(timeout=0)
+        if item is None:
+            return items
+        items.append(item)
+
+
+class BoundedQueueTest(unittest.TestCase):
+    def test_rejects_bad_configuration(self):
+        with self.assertRaises(ValueError):
+            BoundedQueue(10, "discard")
+        with self.assertRaises(ValueError):
+            BoundedQueue(10, "spill")
+
+    def test_drop_oldest(self):
+        q = BoundedQueue(10, "drop-oldest")
+        for tag in range(5):
+            self.assertTrue(q.put(block(tag)))
+        self.assertEqual(q.depth, 8)
+        self.assertEqual(q.dropped_frames, 12)
+        self.assertEqual(q.put_frames, 20)
+        self.assertEqual(drain(q), [block(3), block(4)])
+
+    def test_block_without_wait_reports_overload(self):
+        q = BoundedQueue(10, "block")
+        self.assertTrue(q.put(block(0), wait=False))
+        self.assertTrue(q.put(block(1), wait=False))
+        # 超出容量仍然入队（不丢数据），返回 False 让调用方暂停读取
+        self.assertFalse(q.put(block(2), wait=False))
+        self.assertEqual(q.delayed_frames, 4)
+        self.assertEqual(q.depth, 12)
+        self.assertFalse(q.has_room())
+        self.assertEqual(drain(q), [block(0), block(1), block(2)])
+        self.assertTrue(q.has_room())
+
+    def test_block_waits_for_consumer(self):
+        q = BoundedQueue(8, "block")
+        q.put(block(0))
+        q.put(block(1))
+        done = threading.Event()
+
+        def produce():
+            q.put(block(2))
+            done.set()
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        self.assertFalse(done.wait(0.1), "队列已满时投递方应当阻塞")
+        self.assertEqual(q.get(), block(0))
+        self.assertTrue(done.wait(5))
+        producer.join()
+        self.assertEqual(q.delayed_frames, 4)
+        self.assertGreater(q.delay_seconds, 0)
+        self.assertEqual(drain(q), [block(1), block(2)])
+        self.assertEqual(q.dropped_frames, 0)
+
+    def test_spill_to_disk_and_read_back(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        spill_path = os.path.join(workdir, "spill", "spill-00.bin")
+        q = BoundedQueue(8, "spill", spill_path)
+        for tag in range(6):
+            self.assertTrue(q.put(block(tag)))
+        self.assertEqual(q.spilled_frames, 16)
+        self.assertEqual(q.spill_pending, 16)
+        self.assertTrue(os.path.exists(spill_path))
+
+        items = drain(q)
+        # 先取内存中的数据，再按写入顺序读回溢出数据（可能合并为更大的块）
+        self.assertEqual(items[:2], [block(0), block(1)])
+        self.assertEqual(b"".join(items[2:]), b"".join(block(tag) for tag in range(2, 6)))
+        self.assertEqual(q.spill_pending, 0)
+        self.assertEqual(os.path.getsize(spill_path), 0, "全部读回后溢出文件应被截断")
+        self.assertEqual(q.dropped_frames, 0)
+        q.close()
+        self.assertFalse(os.path.exists(spill_path))
+
+    def test_controls_after_data_and_timeout(self):
+        q = BoundedQueue(10)
+        start = time.monotonic()
+        self.assertIsNone(q.get(timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        q.put_control("stop")
+        q.put(block(0))
+        self.assertEqual(q.get(), block(0))
+        self.assertEqual(q.get(), "stop")
+        stats = q.stats()
+        self.assertEqual((stats["put"], stats["max_depth"], stats["depth"]), (4, 4, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
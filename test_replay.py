@@ -0,0 +1,168 @@
+"""
+录制报文回放：按秒分组、时间过滤与平移、CSV 读取，以及对本地接收端的端到端回放
+"""
+
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+import replay
+from frame_codec import FRAME_SIZE, encode_frame
+from log_writer import CsvSink
+from segment_store import SegmentSink
+from test_framing import make_stream
+
+
+def frames(*rows) -> bytes:
+    """(设备ID, 时间戳) -> 报文，通道值取时间戳以便核对"""
+    return b"".join(encode_frame(device_id, ts, [float(ts % 1000)] * 9) for device_id, ts in rows)
+
+
+def split(buf: bytes, frames_per_block: int):
+    size = FRAME_SIZE * frames_per_block
+    return [buf[i : i + size] for i in range(0, len(buf), size)]
+
+
+def unpack(buf: bytes):
+    return [struct.unpack_from("<2I", buf, i) for i in range(0, len(buf), FRAME_SIZE)]
+
+
+class IterSecondsTest(unittest.TestCase):
+    def test_groups_by_second_across_blocks(self):
+        stream = make_stream(300, seed=4)
+        for per_block in (1, 7, 300):
+            seconds = list(replay.iter_seconds(split(stream, per_block)))
+            self.assertEqual(b"".join(data for _, data, _ in seconds), stream)
+            self.assertEqual([second for second, _, _ in seconds], list(range(1_744_000_000, 1_744_000_043)))
+            for second, data, devices in seconds:
+                rows = unpack(data)
+                self.assertEqual({ts for _, ts in rows}, {second})
+                self.assertEqual(list(devices), [device_id for device_id, _ in rows])
+
+    def test_late_frames_join_current_second(self):
+        buf = frames((1, 100), (2, 101), (3, 99), (4, 101), (5, 102), (6, 100))
+        seconds = [(second, unpack(data)) for second, data, _ in replay.iter_seconds(split(buf, 2))]
+        self.assertEqual(seconds, [
+            (100, [(1, 100)]),
+            (101, [(2, 101), (3, 99), (4, 101)]),
+            (102, [(5, 102), (6, 100)]),
+        ])
+
+    def test_start_end_and_retime(self):
+        buf = frames(*((i, 1000 + i // 3) for i in range(30)))
+        seconds = list(replay.iter_seconds(split(buf, 4), start=1002, end=1005))
+        self.assertEqual([second for second, _, _ in seconds], [1002, 1003, 1004])
+        self.assertEqual(list(seconds[0][2]), [6, 7, 8])
+
+        now = int(time.time())
+        with mock.patch.object(replay.time, "time", return_value=now):
+            seconds = list(replay.iter_seconds(split(buf, 4), start=1002, end=1005, retime=True))
+        self.assertEqual([second for second, _, _ in seconds], [now, now + 1, now + 2])
+        # 只平移时间戳，通道值不变
+        self.assertEqual(unpack(seconds[0][1])[0], (6, now))
+        self.assertEqual(seconds[0][1][8:FRAME_SIZE], frames((6, 1002))[8:])
+
+
+class CsvBlocksTest(unittest.TestCase):
+    def test_csv_rows_round_trip(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        original = os.path.join(workdir, "data_log.csv")
+        sink = CsvSink(original)
+        sink.write_frames(make_stream(500, seed=5))
+        sink.close()
+        with open(original, "a", encoding="utf-8") as f:
+            f.write("bad,row\n")
+        stats = {"bad_rows": 0}
+        blocks = list(replay.iter_csv_blocks(original, stats, block_frames=64))
+        self.assertEqual([len(block) // FRAME_SIZE for block in blocks], [64] * 7 + [52])
+        self.assertEqual(stats["bad_rows"], 1)
+        # CSV 中的数值是格式化后的文本：重新写出与原文件（去掉错误行）逐字节相同
+        copy = os.path.join(workdir, "copy.csv")
+        sink = CsvSink(copy)
+        sink.write_frames(b"".join(blocks))
+        sink.close()
+        with open(original, encoding="utf-8") as a, open(copy, encoding="utf-8") as b:
+            self.assertEqual(b.read(), a.read().replace("bad,row\n", ""))
+
+
+class ReplayEndToEndTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+
+    def run_replay(self, path: str, *options):
+        """启动本地接收端并回放，返回 (回放摘要, 每个连接收到的报文列表)"""
+        received = []
+
+        async def handle(reader, writer):
+            data = bytearray()
+            received.append(data)
+            while chunk := await reader.read(65536):
+                data += chunk
+            writer.close()
+
+        async def main():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            args = replay.parse_args([path, "--host", "127.0.0.1", "--port", str(port), *options])
+            summary = await replay.Replayer(args).run()
+            deadline = time.monotonic() + 5
+            while sum(map(len, received)) < summary["sent_bytes"] and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            server.close()
+            await server.wait_closed()
+            return summary
+
+        with mock.patch("builtins.print"):
+            summary = asyncio.run(main())
+        return summary, [bytes(data) for data in received]
+
+    def assert_delivered(self, stream: bytes, summary, received):
+        frame_count = len(stream) // FRAME_SIZE
+        self.assertEqual(summary["sent_frames"], frame_count)
+        self.assertEqual(summary["undelivered"], 0)
+        expected = defaultdict(list)
+        for i in range(0, len(stream), FRAME_SIZE):
+            expected[struct.unpack_from("<I", stream, i)[0]].append(stream[i : i + FRAME_SIZE])
+        # 每台设备一条连接，连接内按日志顺序
+        per_device = {}
+        for data in received:
+            devices = {device_id for device_id, _ in unpack(data)}
+            self.assertEqual(len(devices), 1)
+            per_device[devices.pop()] = data
+        self.assertEqual(summary["devices"], len(expected))
+        self.assertEqual(per_device, {device_id: b"".join(rows) for device_id, rows in expected.items()})
+
+    def test_fast_replay_of_segments(self):
+        stream = make_stream(2000, seed=8)
+        directory = os.path.join(self.workdir, "segments")
+        sink = SegmentSink(directory, max_frames=700)
+        sink.write_frames(stream)
+        sink.close()
+        summary, received = self.run_replay(directory, "--fast")
+        self.assert_delivered(stream, summary, received)
+        self.assertEqual(summary["seconds"], 286)
+
+    def test_paced_replay_skips_gaps(self):
+        stream = frames(*((device_id, ts) for ts in (500, 501, 502, 600, 601) for device_id in (1, 2, 3)))
+        path = os.path.join(self.workdir, "data_log.csv")
+        sink = CsvSink(path)
+        sink.write_frames(stream)
+        sink.close()
+        summary, received = self.run_replay(path, "--speed", "20")
+        self.assert_delivered(stream, summary, received)
+        self.assertEqual((summary["seconds"], summary["skipped_gap"]), (5, 97))
+        # 去掉空档后共 4 秒日志，20 倍速约 0.2s
+        self.assertGreaterEqual(summary["elapsed"], 0.15)
+        self.assertLess(summary["elapsed"], 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
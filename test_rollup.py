@@ -0,0 +1,88 @@
+"""
+流式汇总：分批合并的窗口统计与对全部记录一次性计算的结果一致
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from frame_codec import np
+from rollup import ROLLUP_HEADER, RollupAggregator, RollupTable, read_rollups
+from test_telemetry_query import make_frames
+
+
+def expected_rows(arr, seconds: int):
+    """逐窗口直接计算：{(设备ID, 窗口起始): (条数, 最小, 最大, 平均, 功率累计)}"""
+    result = {}
+    starts = arr["timestamp"].astype(np.int64) // seconds * seconds
+    for key in set(zip(arr["device_id"].tolist(), starts.tolist())):
+        mask = (arr["device_id"] == key[0]) & (starts == key[1])
+        values = arr["values"][mask].astype(np.float64)
+        result[key] = (
+            int(mask.sum()), values[:, :6].min(0), values[:, :6].max(0),
+            values[:, :6].mean(0), values[:, 6:].sum(0),
+        )
+    return result
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class RollupTest(unittest.TestCase):
+    def setUp(self):
+        self.arr = make_frames(4000, devices=20, seed=7)
+
+    def test_table_matches_direct_computation(self):
+        table = RollupTable("1m", 60, capacity=4)  # 小容量，覆盖扩容
+        for batch in np.array_split(self.arr, 13):
+            table.update(batch["device_id"], batch["timestamp"], batch["values"])
+        rows = table.close_before(None)
+        expected = expected_rows(self.arr, 60)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row[1], row[0])))
+        for row in rows:
+            count, mins, maxs, means, power = expected[(row[0], row[1])]
+            self.assertEqual(row[2], count)
+            stats = np.array(row[3:21]).reshape(6, 3)
+            np.testing.assert_allclose(stats[:, 0], mins, atol=0.006)
+            np.testing.assert_allclose(stats[:, 1], maxs, atol=0.006)
+            np.testing.assert_allclose(stats[:, 2], means, atol=1e-3)
+            np.testing.assert_allclose(row[21:24], power, atol=0.006)
+            self.assertAlmostEqual(row[24], power.sum(), delta=0.01)
+        self.assertEqual(table.open_windows, 0)
+
+    def test_close_before_watermark(self):
+        table = RollupTable("1m", 60)
+        batch = self.arr[:500]
+        table.update(batch["device_id"], batch["timestamp"], batch["values"])
+        watermark = int(batch["timestamp"].max()) // 60 * 60
+        closed = table.close_before(watermark)
+        self.assertTrue(closed)
+        self.assertTrue(all(row[1] + 60 <= watermark for row in closed))
+        remaining = table.close_before(None)
+        self.assertTrue(all(row[1] + 60 > watermark for row in remaining))
+
+    def test_partial_rows_merged_on_read(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir, True)
+        # 迟到时间为 0：乱序到达的记录会产生同一窗口的多行部分汇总
+        shuffled = self.arr[np.random.default_rng(8).permutation(len(self.arr))]
+        aggregator = RollupAggregator(workdir, resolutions=("1m",), lateness=0)
+        for batch in np.array_split(shuffled, 40):
+            aggregator.consume(batch.tobytes())
+        aggregator.close()
+        self.assertGreater(aggregator.rows_written, len(expected_rows(self.arr, 60)))
+
+        merged = read_rollups(workdir, "1m")
+        expected = expected_rows(self.arr, 60)
+        self.assertEqual(len(merged), len(expected))
+        self.assertEqual(sum(row["条数"] for row in merged), len(self.arr))
+        device = merged[0]["设备ID"]
+        only = read_rollups(workdir, "1m", devices=[device])
+        self.assertTrue(only and all(row["设备ID"] == device for row in only))
+        power_total = sum(row[ROLLUP_HEADER[-1]] for row in merged)
+        self.assertAlmostEqual(
+            power_total, float(self.arr["values"][:, 6:].astype(np.float64).sum()), delta=len(merged) * 0.02
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
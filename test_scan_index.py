@@ -0,0 +1,138 @@
+"""
+扫描结果索引：子树总时长 / 视频数、与嵌套结构互转，以及树视图的按需展开
+"""
+
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import video_scan
+from index_tree import IndexTree
+from duration_cache import DurationCache
+from scan_index import ScanIndex
+from test_video_save import FakeTree
+from video_save import format_time
+
+# 相对路径 -> 文件内容长度（测量结果按字节数当作秒数）
+LAYOUT = {
+    "a.mp4": 10,
+    "b.mkv": 20,
+    "notes.txt": 99,  # 非视频文件不计入
+    "season1/e1.mp4": 30,
+    "season1/e2.mp4": 40,
+    "season1/extras/clip.avi": 5,
+    "season2/e1.mp4": 50,
+    "empty/": 0,
+}
+
+
+def make_tree(root: str, layout: dict = LAYOUT):
+    for rel, size in layout.items():
+        path = os.path.join(root, rel)
+        if rel.endswith("/"):
+            os.makedirs(path, exist_ok=True)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+
+def scan(root: str, **options):
+    """扫描目录，时长取文件字节数（不依赖真实视频）"""
+    with mock.patch.object(video_scan, "get_video_length", lambda path: float(os.path.getsize(path))):
+        return video_scan.scan_tree(root, workers=4, **options)
+
+
+def subtree_totals(root: str):
+    """直接遍历目录计算：目录相对路径 -> (总时长, 视频数)"""
+    totals = {}
+    for dirpath, _, filenames in os.walk(root):
+        videos = [name for name in filenames if name.lower().endswith(video_scan.VIDEO_EXTENSIONS)]
+        rel = os.path.relpath(dirpath, root)
+        length = sum(os.path.getsize(os.path.join(dirpath, name)) for name in videos)
+        parts = [] if rel == "." else rel.split(os.sep)
+        for depth in range(len(parts) + 1):
+            key = "/".join(parts[:depth]) or "."
+            total, count = totals.get(key, (0.0, 0))
+            totals[key] = (total + length, count + len(videos))
+    return totals
+
+
+class ScanIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.root = os.path.join(self.workdir, "videos")
+        make_tree(self.root)
+        self.index = ScanIndex.from_node(scan(self.root))
+
+    def test_totals_match_directory_walk(self):
+        expected = subtree_totals(self.root)
+        self.assertEqual(self.index.total_length, 155.0)
+        self.assertEqual(len(self.index.dir_names), len(expected))
+        for dir_id, path in enumerate(self.index.dir_paths):
+            rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+            self.assertEqual(
+                (self.index.dir_totals[dir_id], self.index.dir_videos[dir_id]), expected[rel], rel
+            )
+
+    def test_ranges_and_parents(self):
+        index = self.index
+        self.assertEqual(index.dir_parent[0], -1)
+        for dir_id in range(len(index.dir_names)):
+            for child in index.subdirs(dir_id):
+                self.assertEqual(index.dir_parent[child], dir_id)
+            for file_id in index.files(dir_id):
+                self.assertEqual(index.file_dir[file_id], dir_id)
+            files = sum(index.file_lengths[file_id] for file_id in index.files(dir_id))
+            subdirs = sum(index.dir_totals[child] for child in index.subdirs(dir_id))
+            self.assertEqual(index.dir_totals[dir_id], files + subdirs)
+        empty = index.dir_names.index("empty")
+        self.assertFalse(index.has_children(empty))
+        self.assertEqual(index.dir_lookup()[index.dir_paths[empty]], empty)
+
+    def test_nested_data_round_trip(self):
+        restored = ScanIndex.from_data(self.index.to_data())
+        for name in ("dir_names", "dir_paths", "dir_parent", "file_names", "file_dir"):
+            self.assertEqual(list(getattr(restored, name)), list(getattr(self.index, name)), name)
+        self.assertEqual(list(restored.dir_totals), list(self.index.dir_totals))
+        self.assertEqual(list(restored.file_lengths), list(self.index.file_lengths))
+        self.assertEqual(list(restored.file_sizes), list(self.index.file_sizes))
+        self.assertEqual(list(restored.dir_videos), list(self.index.dir_videos))
+        self.assertEqual(ScanIndex.from_data({}).total_length, 0.0)
+
+    def test_tree_expands_lazily(self):
+        tree = FakeTree()
+        view = IndexTree(tree, format_time)
+        root_id = view.show(self.index)
+        # 只插入根目录及其直接子项，子目录内容用占位节点代替
+        self.assertEqual(len(tree.get_children(root_id)), 2 + 3)
+        season1 = next(item for item, dir_id in view.dir_items.items()
+                       if self.index.dir_names[dir_id] == "season1")
+        self.assertEqual(tree.get_children(season1), (season1 + "~",))
+        view.expand(season1)
+        children = tree.get_children(season1)
+        self.assertEqual(len(children), 3)
+        self.assertNotIn(season1 + "~", children)
+        view.expand(season1)  # 重复展开不再插入
+        self.assertEqual(tree.get_children(season1), children)
+
+    def test_cache_errors_do_not_stop_scan(self):
+        cache = DurationCache(os.path.join(self.workdir, "cache.sqlite3"))
+        self.addCleanup(cache.close)
+        locked = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(cache, "get", side_effect=locked), \
+                mock.patch.object(cache, "put", side_effect=locked), \
+                mock.patch("sys.stderr", io.StringIO()) as stderr:
+            index = ScanIndex.from_node(scan(self.root, cache=cache))
+        # 读取失败按未命中处理，照常测量；写入失败只警告一次
+        self.assertEqual(index.total_length, 155.0)
+        self.assertEqual(stderr.getvalue().count("时长缓存"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
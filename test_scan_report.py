@@ -0,0 +1,81 @@
+"""
+流式扫描报告：扫描时写出的报告读回后与扫描结果的索引一致
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from scan_index import ScanIndex
+from scan_report import ReportWriter, read_report, write_index
+from test_scan_index import make_tree, scan
+
+FIELDS = (
+    "dir_names", "dir_paths", "dir_totals", "dir_mtimes", "dir_parent", "dir_videos",
+    "file_names", "file_lengths", "file_sizes", "file_mtimes", "file_dir",
+)
+
+
+class ScanReportTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.root = os.path.join(self.workdir, "videos")
+        make_tree(self.root)
+        self.report_path = os.path.join(self.workdir, "report.jsonl")
+        with ReportWriter(self.report_path, self.root, "2026-01-01 00:00:00") as report:
+            self.index = ScanIndex.from_node(scan(self.root, on_dir_done=report.dir_done))
+
+    def assert_same_index(self, actual, expected):
+        for name in FIELDS:
+            self.assertEqual(list(getattr(actual, name)), list(getattr(expected, name)), name)
+
+    def test_streamed_report_round_trip(self):
+        header, index = read_report(self.report_path)
+        self.assertEqual(header["root_directory"], self.root)
+        self.assertEqual(header["timestamp"], "2026-01-01 00:00:00")
+        self.assert_same_index(index, self.index)
+
+    def test_children_written_before_parents(self):
+        with open(self.report_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f][1:]
+        dirs = [record["dir"] for record in records if "dir" in record]
+        self.assertEqual(dirs[-1], "")
+        for rel in dirs:
+            if rel:
+                parent = rel.rpartition("/")[0]
+                self.assertLess(dirs.index(rel), dirs.index(parent))
+
+    def test_write_index_round_trip(self):
+        path = os.path.join(self.workdir, "saved.jsonl")
+        write_index(path, self.index, self.root, "2026-01-02 00:00:00")
+        self.assert_same_index(read_report(path)[1], self.index)
+
+    def test_version_1_report_without_stats(self):
+        path = os.path.join(self.workdir, "v1.jsonl")
+        lines = [
+            {"format": "video-scan-report", "version": 1, "root_directory": "/v", "timestamp": ""},
+            {"path": "sub/a.mp4", "duration": 3.0},
+            {"dir": "sub", "total_length": 3.0, "order": 1},
+            {"path": "b.mp4", "duration": 4.0},
+            {"dir": "", "total_length": 7.0, "order": 0},
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+        index = read_report(path)[1]
+        self.assertEqual(index.total_length, 7.0)
+        self.assertEqual(index.file_names, ["b.mp4", "a.mp4"])
+        self.assertEqual(list(index.file_sizes), [0, 0])
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.workdir, "other.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"hello": 1}\n')
+        with self.assertRaises(ValueError):
+            read_report(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
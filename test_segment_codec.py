@@ -0,0 +1,132 @@
+"""
+压缩段文件（.tsegz）：编解码逐字节还原，读取 / 导出 / 查询与未压缩段一致
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import client
+import segment_codec
+from frame_codec import np
+from segment_codec import (
+    compress_segment,
+    compressed_record_count,
+    decode_block,
+    encode_block,
+    read_compressed,
+    write_compressed,
+)
+from segment_store import (
+    COMPRESSED_SUFFIX,
+    SEGMENT_SUFFIX,
+    SegmentSink,
+    export_csv,
+    iter_segment_blocks,
+    list_segments,
+    open_segment,
+)
+from telemetry_query import TelemetryStore
+from test_telemetry_query import make_frames
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class SegmentCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.arr = make_frames(5000, seed=3)
+
+    def write(self, directory: str, compress: bool, max_frames: int = 1500):
+        sink = SegmentSink(directory, max_frames=max_frames, compress=compress)
+        sink.write_frames(self.arr.tobytes())
+        sink.close()
+        return list_segments(directory)
+
+    def test_block_round_trip(self):
+        arr = self.arr.copy()
+        arr["values"][10] = [np.nan, np.inf, -np.inf, -0.0, 0.0, 1e-45, 3.4e38, -1.0, 7.5]
+        arr["timestamp"][20:40] = arr["timestamp"][20]  # 同一秒多帧、时间回退
+        arr["timestamp"][41] = arr["timestamp"][40] - 100
+        for part in (arr, arr[:1], arr[:0], arr[arr["device_id"] == 7]):
+            buf = encode_block(part)
+            decoded, offset = decode_block(buf)
+            self.assertEqual(offset, len(buf))
+            self.assertEqual(decoded.tobytes(), part.tobytes())
+
+    def test_file_round_trip_in_blocks(self):
+        path = os.path.join(self.workdir, "a" + COMPRESSED_SUFFIX)
+        write_compressed(path, self.arr, 1.5, block_frames=1024)
+        self.assertEqual(compressed_record_count(path), 5000)
+        self.assertEqual(read_compressed(path).tobytes(), self.arr.tobytes())
+        blocks = list(iter_segment_blocks(path))
+        self.assertEqual(len(blocks), 5)
+        self.assertEqual(b"".join(blocks), self.arr.tobytes())
+
+    def test_compress_segment_replaces_original(self):
+        path = self.write(os.path.join(self.workdir, "raw"), compress=False, max_frames=10_000)[0]
+        size = os.path.getsize(path)
+        compressed = compress_segment(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(compressed.endswith(COMPRESSED_SUFFIX))
+        self.assertLess(os.path.getsize(compressed), size)
+        self.assertEqual(open_segment(compressed).tobytes(), self.arr.tobytes())
+
+    def test_export_and_query_match_uncompressed(self):
+        raw = self.write(os.path.join(self.workdir, "raw"), compress=False)
+        packed = self.write(os.path.join(self.workdir, "packed"), compress=True)
+        self.assertEqual([os.path.splitext(path)[1] for path in packed], [COMPRESSED_SUFFIX] * 4)
+        expected, actual = io.StringIO(), io.StringIO()
+        self.assertEqual(export_csv(raw, expected), 5000)
+        self.assertEqual(export_csv(packed, actual), 5000)
+        self.assertEqual(actual.getvalue(), expected.getvalue())
+
+        raw_store = TelemetryStore(os.path.join(self.workdir, "raw"), block_frames=256)
+        packed_store = TelemetryStore(os.path.join(self.workdir, "packed"), block_frames=256)
+        start = int(self.arr["timestamp"][1200])
+        for args in ((None, None, None), (start, start + 90, None), (start, None, [3, 9, 27])):
+            self.assertEqual(packed_store.query(*args).tobytes(), raw_store.query(*args).tobytes())
+
+    def test_iter_time_ordered_decodes_each_segment_once(self):
+        directory = os.path.join(self.workdir, "packed")
+        paths = self.write(directory, compress=True)
+        store = TelemetryStore(directory, block_frames=256)
+        store.time_range()  # 先建好索引，只统计查询时的解码
+        with mock.patch.object(segment_codec, "decode_block", wraps=decode_block) as decode:
+            chunks = list(store.iter_time_ordered(window=20))
+        self.assertGreater(len(chunks), len(paths))
+        self.assertEqual(decode.call_count, len(paths))
+        expected = self.arr[np.argsort(self.arr["timestamp"], kind="stable")]
+        self.assertEqual(np.concatenate(chunks).tobytes(), expected.tobytes())
+
+    def test_failed_compression_keeps_segment(self):
+        directory = os.path.join(self.workdir, "packed")
+        with mock.patch.object(segment_codec, "write_compressed", side_effect=OSError("磁盘已满")):
+            with mock.patch("builtins.print") as output:
+                paths = self.write(directory, compress=True)
+        self.assertTrue(all(path.endswith(SEGMENT_SUFFIX) for path in paths))
+        self.assertFalse([name for name in os.listdir(directory) if COMPRESSED_SUFFIX in name])
+        self.assertEqual(output.call_count, len(paths))
+        self.assertEqual(b"".join(block for path in paths for block in iter_segment_blocks(path)),
+                         self.arr.tobytes())
+
+
+class CompressOptionTest(unittest.TestCase):
+    def test_requires_numpy(self):
+        argv = ["--storage", "segment", "--segment-compress"]
+        with mock.patch.object(client, "np", None), mock.patch("sys.stderr", io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit):
+                client.parse_args(argv)
+        self.assertIn("numpy", stderr.getvalue())
+
+    def test_requires_segment_storage(self):
+        with mock.patch("sys.stderr", io.StringIO()):
+            with self.assertRaises(SystemExit):
+                client.parse_args(["--segment-compress"])
+
+
+if __name__ == "__main__":
+    unittest.main()
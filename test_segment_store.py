@@ -0,0 +1,90 @@
+"""
+二进制段文件：滚动写入、读回与 CSV 导出
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from frame_codec import FRAME_SIZE, np
+from log_writer import CsvSink
+from segment_store import (
+    SegmentSink,
+    export_csv,
+    iter_segment_blocks,
+    list_segments,
+    open_segment,
+    read_header,
+    segment_record_count,
+)
+from test_framing import make_stream
+
+
+class SegmentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.segments = os.path.join(self.workdir, "segments")
+        self.stream = make_stream(250, seed=6)
+
+    def write(self, buf, **options):
+        sink = SegmentSink(self.segments, **options)
+        sink.write_frames(buf)
+        sink.close()
+
+    def read_back(self) -> bytes:
+        return b"".join(
+            block for path in list_segments(self.segments) for block in iter_segment_blocks(path)
+        )
+
+    def test_rolls_by_frame_count(self):
+        self.write(self.stream, max_frames=100)
+        paths = list_segments(self.segments)
+        self.assertEqual([segment_record_count(path) for path in paths], [100, 100, 50])
+        self.assertEqual(self.read_back(), self.stream)
+
+    def test_sequence_continues_after_restart(self):
+        half = FRAME_SIZE * 120
+        self.write(self.stream[:half], max_frames=100)
+        self.write(self.stream[half:], max_frames=100)
+        names = [os.path.basename(path) for path in list_segments(self.segments)]
+        self.assertEqual(names, [f"segment-{seq:06d}.tseg" for seq in range(4)])
+        self.assertEqual(self.read_back(), self.stream)
+
+    def test_trailing_partial_record_ignored(self):
+        self.write(self.stream, max_frames=1000)
+        path = list_segments(self.segments)[0]
+        with open(path, "ab") as f:
+            f.write(b"\x01" * 10)  # 崩溃时残留的半条记录
+        self.assertEqual(segment_record_count(path), 250)
+        self.assertEqual(self.read_back(), self.stream)
+
+    def test_export_matches_csv_sink(self):
+        self.write(self.stream, max_frames=100)
+        exported = io.StringIO()
+        self.assertEqual(export_csv(list_segments(self.segments), exported), 250)
+        csv_path = os.path.join(self.workdir, "data_log.csv")
+        sink = CsvSink(csv_path)
+        sink.write_frames(self.stream)
+        sink.close()
+        with open(csv_path, encoding="utf-8") as f:
+            self.assertEqual(exported.getvalue(), f.read())
+
+    def test_rejects_foreign_file(self):
+        path = os.path.join(self.workdir, "bogus.tseg")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            read_header(path)
+
+    @unittest.skipIf(np is None, "需要 numpy")
+    def test_open_segment_memmap(self):
+        self.write(self.stream, max_frames=1000)
+        arr = open_segment(list_segments(self.segments)[0])
+        self.assertEqual(arr.tobytes(), self.stream)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+容器头部解析：用最小的 MP4 / MKV / AVI 结构验证时长
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from video_probe import probe_duration
+
+
+# ===============================
+# 构造容器
+# ===============================
+def box(kind: bytes, payload: bytes = b"", large: bool = False) -> bytes:
+    if large:
+        return struct.pack(">I4sQ", 1, kind, 16 + len(payload)) + payload
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def mvhd(timescale: int, duration: int, version: int = 0) -> bytes:
+    if version == 1:
+        body = struct.pack(">QQIQ", 0, 0, timescale, duration)
+    else:
+        body = struct.pack(">IIII", 0, 0, timescale, duration)
+    return box(b"mvhd", bytes([version, 0, 0, 0]) + body + b"\0" * 80)
+
+
+def mp4(*moov_children, moov_last: bool = False) -> bytes:
+    ftyp = box(b"ftyp", b"isom\0\0\0\0isommp41")
+    moov = box(b"moov", b"".join(moov_children))
+    mdat = box(b"mdat", b"\0" * 100, large=True)
+    return ftyp + (mdat + moov if moov_last else moov + mdat)
+
+
+def ebml(element_id: int, payload: bytes = b"", unknown_size: bool = False) -> bytes:
+    head = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    if unknown_size:
+        return head + b"\x01" + b"\xff" * 7 + payload
+    return head + (0x4000 | len(payload)).to_bytes(2, "big") + payload
+
+
+def mkv(duration_ticks: float, scale: int = 1_000_000, float_size: int = 8) -> bytes:
+    info = ebml(0x2AD7B1, scale.to_bytes(3, "big")) + ebml(
+        0x4489, struct.pack(">d" if float_size == 8 else ">f", duration_ticks)
+    )
+    segment = ebml(0x1549A966, info) + ebml(0x1F43B675, b"\0" * 16)
+    return ebml(0x1A45DFA3, ebml(0x4282, b"webm")) + ebml(0x18538067, segment, unknown_size=True)
+
+
+def riff_chunk(chunk_id: bytes, payload: bytes) -> bytes:
+    return struct.pack("<4sI", chunk_id, len(payload)) + payload + b"\0" * (len(payload) & 1)
+
+
+def riff_list(list_type: bytes, payload: bytes) -> bytes:
+    return riff_chunk(b"LIST", list_type + payload)
+
+
+def avi(micro_sec_per_frame: int, total_frames: int, odml_frames: int = None) -> bytes:
+    avih = riff_chunk(b"avih", struct.pack("<5I", micro_sec_per_frame, 0, 0, 0, total_frames) + b"\0" * 36)
+    hdrl = avih + riff_chunk(b"strl", b"\0" * 3)  # 奇数长度，覆盖补齐字节
+    if odml_frames is not None:
+        hdrl += riff_list(b"odml", riff_chunk(b"dmlh", struct.pack("<I", odml_frames) + b"\0" * 244))
+    body = b"AVI " + riff_list(b"hdrl", hdrl) + riff_list(b"movi", b"\0" * 32)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+class VideoProbeTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+
+    def probe(self, data: bytes, name: str = "video.bin"):
+        path = os.path.join(self.workdir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return probe_duration(path)
+
+    def test_mp4(self):
+        self.assertAlmostEqual(self.probe(mp4(mvhd(1000, 83_500))), 83.5)
+        self.assertAlmostEqual(self.probe(mp4(mvhd(90_000, 90_000 * 7200, version=1))), 7200.0)
+        # moov 在 mdat（64 位长度）之后
+        self.assertAlmostEqual(self.probe(mp4(mvhd(600, 6000), moov_last=True)), 10.0)
+
+    def test_fragmented_mp4(self):
+        mehd = box(b"mehd", bytes(4) + struct.pack(">I", 45_000))
+        self.assertAlmostEqual(self.probe(mp4(mvhd(1000, 0), box(b"mvex", mehd))), 45.0)
+        self.assertIsNone(self.probe(mp4(mvhd(1000, 0))))
+
+    def test_mkv(self):
+        self.assertAlmostEqual(self.probe(mkv(12_345.0)), 12.345)
+        self.assertAlmostEqual(self.probe(mkv(1_500.0, scale=1_000_000, float_size=4)), 1.5)
+        self.assertAlmostEqual(self.probe(mkv(400.0, scale=100_000)), 0.04)
+
+    def test_avi(self):
+        self.assertAlmostEqual(self.probe(avi(40_000, 250)), 10.0)
+        # OpenDML：avih 只统计第一个 RIFF 块，总帧数以 dmlh 为准
+        self.assertAlmostEqual(self.probe(avi(40_000, 250, odml_frames=90_000)), 3600.0)
+
+    def test_format_detected_by_content_not_extension(self):
+        self.assertAlmostEqual(self.probe(mkv(2_000.0), name="mislabelled.mp4"), 2.0)
+
+    def test_unknown_or_broken_files(self):
+        self.assertIsNone(self.probe(b"not a video at all"))
+        self.assertIsNone(self.probe(mp4(mvhd(1000, 83_500))[:40]))  # 截断
+        self.assertIsNone(self.probe(avi(0, 250)))
+        self.assertIsNone(self.probe(mkv(float("nan"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+video_save 扫描失败时的界面恢复
+
+不创建 Tk 窗口：按钮、状态栏、树视图与 root.after 用假对象代替，
+测试中手动运行 root.after 排队的回调（相当于 Tk 主循环）。
+"""
+
+import glob
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import video_save
+from duration_cache import DurationCache
+from index_tree import IndexTree
+from scan_index import ScanIndex
+from video_scan import ScanEngine
+
+
+class FakeWidget:
+    def __init__(self, state="normal"):
+        self.state = state
+        self.text = ""
+
+    def config(self, **options):
+        self.__dict__.update(options)
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+        self.destroyed = False
+
+    def destroy(self):
+        self.destroyed = True
+
+    def after(self, ms, func):
+        self.scheduled.append(func)
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for func in scheduled:
+            func()
+
+
+class FakeTree:
+    def __init__(self):
+        self.children = {"": []}
+        self.selected = ()
+        self.texts = {}
+
+    def insert(self, parent, position, iid, text="", values=()):
+        self.children[parent].append(iid)
+        self.texts[iid] = text
+        self.children[iid] = []
+        return iid
+
+    def item(self, iid, **options):
+        pass
+
+    def exists(self, iid):
+        return iid in self.children
+
+    def get_children(self, iid=""):
+        return tuple(self.children[iid])
+
+    def selection(self):
+        # 与 Treeview 相同：删除的节点不再处于选中状态
+        return tuple(item for item in self.selected if item in self.children)
+
+    def delete(self, iid):
+        for child in self.children.pop(iid):
+            self.delete(child)
+        for children in self.children.values():
+            if iid in children:
+                children.remove(iid)
+
+
+class VideoSaveTestCase(unittest.TestCase):
+    """用假控件替换 video_save 的模块全局变量"""
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.addCleanup(shutil.rmtree, self.report_dir, True)
+        self.errors = []
+        self.root = FakeRoot()
+        tree = FakeTree()
+        widgets = {
+            "root": self.root,
+            "tree": tree,
+            "view": IndexTree(tree, video_save.format_time),
+            "status_label": FakeWidget(),
+            "select_button": FakeWidget(),
+            "load_button": FakeWidget(),
+            "save_button": FakeWidget("disabled"),
+            "rescan_button": FakeWidget("disabled"),
+            "selection_label": FakeWidget(),
+            "current_scan_data": None,
+            "active_report": None,
+        }
+        cache_path = os.path.join(self.workdir, "cache.sqlite3")
+        patches = [mock.patch.object(video_save, name, value, create=True) for name, value in widgets.items()]
+        patches += [
+            mock.patch.object(video_save, "DurationCache", lambda: DurationCache(cache_path)),
+            mock.patch.object(video_save.messagebox, "showerror", lambda *args: self.errors.append(args)),
+            mock.patch.object(video_save.tempfile, "tempdir", self.report_dir),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def pump_until(self, done, timeout=5.0):
+        """运行主线程回调直到 done() 为真，再运行一轮确认轮询已停止"""
+        deadline = time.time() + timeout
+        while not done() and time.time() < deadline:
+            self.root.run_pending()
+            time.sleep(0.01)
+        self.root.run_pending()
+
+
+class ScanFailureTest(VideoSaveTestCase):
+    def pump_until_error(self):
+        self.pump_until(lambda: self.errors)
+
+    def assert_restored(self, has_result):
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn("磁盘错误", self.errors[0][1])
+        self.assertEqual(video_save.status_label.text, "统计失败")
+        self.assertEqual(video_save.select_button.state, "normal")
+        self.assertEqual(video_save.load_button.state, "normal")
+        expected = "normal" if has_result else "disabled"
+        self.assertEqual(video_save.save_button.state, expected)
+        self.assertEqual(video_save.rescan_button.state, expected)
+        self.assertEqual(self.root.scheduled, [], "扫描失败后树视图仍在轮询")
+        self.assertIsNone(video_save.active_report)
+        self.assertEqual(glob.glob(os.path.join(self.report_dir, "video_scan_*")), [], "留下了不完整的报告")
+
+    def test_scan_error_restores_ui(self):
+        with mock.patch.object(ScanEngine, "scan", side_effect=RuntimeError("磁盘错误")):
+            video_save.run_scan(self.workdir)
+            self.assertEqual(video_save.select_button.state, "disabled")
+            self.pump_until_error()
+        self.assert_restored(has_result=False)
+        self.assertIsNone(video_save.current_scan_data)
+
+    def test_rescan_error_keeps_previous_result(self):
+        previous = ScanIndex.from_data({"name": "videos", "path": self.workdir, "total_length": 90})
+        video_save.view.show(previous)
+        scan_data = {"timestamp": "", "root_directory": self.workdir, "total_length": 90}
+        video_save.current_scan_data = scan_data
+        with mock.patch.object(ScanEngine, "scan", side_effect=RuntimeError("磁盘错误")):
+            video_save.run_scan(self.workdir, previous=previous)
+            self.pump_until_error()
+        self.assert_restored(has_result=True)
+        self.assertIs(video_save.view.index, previous)
+        self.assertIs(video_save.current_scan_data, scan_data)
+
+    def test_cache_open_error_restores_ui(self):
+        def locked():
+            raise sqlite3.OperationalError("磁盘错误: database is locked")
+
+        with mock.patch.object(video_save, "DurationCache", locked):
+            video_save.run_scan(self.workdir)
+            self.pump_until_error()
+        self.assert_restored(has_result=False)
+
+    def test_close_window_removes_temp_reports(self):
+        finished = os.path.join(self.report_dir, "video_scan_done.jsonl")
+        in_progress = os.path.join(self.report_dir, "video_scan_running.jsonl")
+        for path in (finished, in_progress):
+            open(path, "w").close()
+        video_save.current_scan_data = {"report": finished}
+        video_save.active_report = in_progress
+        video_save.close_window()
+        self.assertFalse(os.path.exists(finished))
+        self.assertFalse(os.path.exists(in_progress))
+        self.assertTrue(self.root.destroyed)
+
+
+if __name__ == "__main__":
+    unittest.main()
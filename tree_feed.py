@@ -0,0 +1,111 @@
+"""
+扫描线程 -> Tk 主线程的树视图更新通道
+
+Tk 不是线程安全的，扫描线程不能直接调用 tree.insert / tree.item / tree.update。
+扫描线程只把更新追加到队列（deque 的 append/popleft 是原子操作，不需要加锁），
+主线程用 root.after 定时取出并批量应用，每一轮最多占用 BATCH_BUDGET 的时间，
+剩余的留到下一轮，界面始终可以响应。
+
+树节点 ID 由扫描线程预先分配（tree.insert 的 iid 参数），扫描线程不需要等待
+主线程返回 ID，扫描速度与树的大小无关。
+"""
+
+import collections
+import itertools
+import time
+
+from video_scan import DirNode
+
+PLACEHOLDER = "计算中..."
+POLL_INTERVAL_MS = 50  # 队列为空时的轮询间隔
+BATCH_BUDGET = 0.03  # 每一轮最多占用主线程的时间（秒）
+PROGRESS_INTERVAL = 0.25  # 进度文字的最小刷新间隔（秒）
+
+
+class TreeFeed:
+    """
+    扫描线程调用 dir_listed / file_done / dir_done / call（可直接作为 ScanEngine 的回调），
+    主线程调用 start() 开始轮询；format_time 用于把秒数转为显示文字，
+    on_progress() 在主线程中按 PROGRESS_INTERVAL 节流调用
+    """
+
+    def __init__(self, root, tree, format_time, parent: str = "", on_progress=None):
+        self.root = root
+        self.tree = tree
+        self.format_time = format_time
+        self.parent = parent
+        self.on_progress = on_progress
+        self.applied = 0
+        self._updates = collections.deque()
+        self._ids = itertools.count()
+        self._running = False
+        self._last_progress = 0.0
+
+    # ---------- 扫描线程 ----------
+    def dir_listed(self, node: DirNode):
+        """分配目录与文件的节点ID（node.tag = (目录ID, [文件ID...])），并排队插入"""
+        prefix = f"s{next(self._ids)}"
+        node.tag = (prefix, [f"{prefix}.{index}" for index in range(len(node.files))])
+        self._updates.append(("dir", node))
+
+    def file_done(self, node: DirNode, index: int):
+        self._updates.append(("file", node, index))
+
+    def dir_done(self, node: DirNode):
+        self._updates.append(("total", node))
+
+    def call(self, func):
+        """在之前排队的更新全部应用之后，于主线程中调用 func()"""
+        self._updates.append(("call", func))
+
+    # ---------- 主线程 ----------
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(0, self._pump)
+
+    def stop(self):
+        self._running = False
+
+    def _pump(self):
+        if not self._running:
+            return
+        updates = self._updates
+        deadline = time.perf_counter() + BATCH_BUDGET
+        count = 0
+        while updates:
+            self._apply(updates.popleft())
+            count += 1
+            if not count & 63 and time.perf_counter() > deadline:
+                break
+        self.applied += count
+        if not self._running:
+            return  # 回调中调用了 stop()（完成或失败），不再刷新进度，以免覆盖最终状态
+
+        now = time.perf_counter()
+        if self.on_progress and now - self._last_progress >= PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.on_progress()
+        # 还有积压时尽快进入下一轮（先让 Tk 处理一次事件），否则按间隔轮询
+        self.root.after(1 if updates else POLL_INTERVAL_MS, self._pump)
+
+    def _apply(self, update):
+        kind, node = update[0], update[1]
+        tree = self.tree
+        if kind == "dir":
+            current_id, file_ids = node.tag
+            parent_id = node.parent.tag[0] if node.parent is not None else self.parent
+            tree.insert(parent_id, "end", iid=current_id, text=node.name, values=[PLACEHOLDER])
+            lengths = node.lengths
+            for index, (name, item_id) in enumerate(zip(node.files, file_ids)):
+                # 插入时已经测完的直接写入时长，之后的 "file" 更新只是重复设置同一个值
+                length = lengths[index]
+                value = PLACEHOLDER if length is None else self.format_time(length)
+                tree.insert(current_id, "end", iid=item_id, text=name, values=[value])
+        elif kind == "file":
+            index = update[2]
+            tree.item(node.tag[1][index], values=[self.format_time(node.lengths[index])])
+        elif kind == "total":
+            tree.item(node.tag[0], values=[self.format_time(node.total)])
+        else:
+            node()
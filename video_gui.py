@@ -1,19 +1,10 @@
-import os
 import tkinter as tk
-from tkinter import filedialog, ttk
-from moviepy import *
+from tkinter import filedialog, ttk, messagebox
+from video_scan import ScanEngine
+from tree_feed import TreeFeed
 
 import threading
 
-def get_video_length(file_path):
-    """获取单个视频文件的长度（秒）"""
-    try:
-        with VideoFileClip(file_path) as video:
-            return video.duration
-    except Exception as e:
-        print(f"无法处理文件 {file_path}: {e}")
-        return 0
-
 def format_time(seconds):
     """将秒数格式化为时分秒"""
     hours = int(seconds // 3600)
@@ -21,44 +12,8 @@ def format_time(seconds):
     seconds = int(seconds % 60)
     return f"{hours}时{minutes}分{seconds}秒"
 
-def scan_directory(directory, tree, parent=""):
-    """递归扫描目录，计算视频长度并更新树形视图"""
-    total_length = 0
-    video_extensions = (".mp4", ".avi", ".mkv", ".mov", ".flv", ".wmv")
-    
-    # 添加当前目录到树中
-    dir_name = os.path.basename(directory)
-    if not dir_name:  # 如果是根目录
-        dir_name = directory
-    
-    current_id = tree.insert(parent, "end", text=dir_name, values=["计算中..."])
-    tree.update()
-    
-    # 首先处理当前目录中的视频文件
-    files_length = 0
-    for file in os.listdir(directory):
-        file_path = os.path.join(directory, file)
-        if os.path.isfile(file_path) and file.lower().endswith(video_extensions):
-            length = get_video_length(file_path)
-            tree.insert(current_id, "end", text=file, values=[format_time(length)])
-            files_length += length
-    
-    total_length += files_length
-    
-    # 处理子目录
-    for subdir in os.listdir(directory):
-        subdir_path = os.path.join(directory, subdir)
-        if os.path.isdir(subdir_path):
-            subdir_length = scan_directory(subdir_path, tree, current_id)
-            total_length += subdir_length
-    
-    # 更新当前目录的总长度
-    tree.item(current_id, values=[format_time(total_length)])
-    
-    return total_length
-
 def start_scan():
-    """在后台线程中开始扫描，避免GUI卡顿"""
+    """在后台线程中开始扫描，避免GUI卡顿；树视图由主线程通过 TreeFeed 批量更新"""
     directory = filedialog.askdirectory(title="选择要统计的视频目录")
     if not directory:
         return
@@ -69,15 +24,38 @@ def start_scan():
     
     status_label.config(text="正在统计中，请稍候...")
     select_button.config(state="disabled")
+
+    feed = TreeFeed(root, tree, format_time, on_progress=lambda: status_label.config(
+        text=f"正在统计中... 已测量 {engine.files_done}/{engine.files_found} 个文件，"
+             f"{engine.dirs_found} 个目录"
+    ))
+    engine = ScanEngine(on_dir_listed=feed.dir_listed, on_file=feed.file_done, on_dir_done=feed.dir_done)
+    feed.start()
     
+    def fail(error):
+        # 扫描线程出错：停止轮询，撤掉不完整的树，恢复按钮
+        feed.stop()
+        for item in tree.get_children():
+            tree.delete(item)
+        status_label.config(text="统计失败")
+        select_button.config(state="normal")
+        messagebox.showerror("错误", f"统计失败: {error}")
+
     def scan_thread():
-        total_length = scan_directory(directory, tree)
-        
-        # 更新界面状态
-        root.after(0, lambda: status_label.config(
-            text=f"统计完成！总时长: {format_time(total_length)}"
-        ))
-        root.after(0, lambda: select_button.config(state="normal"))
+        try:
+            total_length = engine.scan(directory).total
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            feed.call(lambda: fail(error))
+            return
+
+        def finish():
+            # 所有树更新应用完之后再更新界面状态
+            feed.stop()
+            status_label.config(text=f"统计完成！总时长: {format_time(total_length)}")
+            select_button.config(state="normal")
+
+        feed.call(finish)
     
     threading.Thread(target=scan_thread, daemon=True).start()
 
@@ -0,0 +1,413 @@
+"""
+只读容器头部获取视频时长（纯 Python）
+
+VideoFileClip 为了读一个 duration 要启动 ffmpeg 子进程并建立帧读取器；
+这里直接解析容器元数据，每个文件只读几 KB:
+
+    MP4 / MOV   moov/mvhd（分片 MP4 用 moov/mvex/mehd）
+    MKV / WebM  Segment/Info/Duration × TimecodeScale
+    AVI         hdrl/avih 的总帧数 × 帧间隔（OpenDML 大文件用 odml/dmlh 总帧数）
+    FLV         onMetaData 脚本标签中的 duration
+    WMV / ASF   File Properties Object 的播放时长 - 预滚时间
+
+按文件头魔数识别格式（不看扩展名）；无法识别或元数据缺失时才退回 moviepy。
+
+用法:
+    python video_probe.py 文件或目录 ...
+    python video_probe.py --compare 文件 ...   # 与 moviepy 对比结果与耗时
+"""
+
+import os
+import struct
+import sys
+import time
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".flv", ".wmv")
+
+MP4_TOP_LEVEL = (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid")
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+
+
+def _guid(text: str) -> bytes:
+    """GUID 字符串 -> 文件中的小端字节序（同 uuid.UUID(text).bytes_le，省去导入 uuid 的 10ms）"""
+    raw = bytes.fromhex(text.replace("-", ""))
+    return raw[3::-1] + raw[5:3:-1] + raw[7:5:-1] + raw[8:]
+
+
+ASF_HEADER_GUID = _guid("75B22630-668E-11CF-A6D9-00AA0062CE6C")
+ASF_FILE_PROPERTIES_GUID = _guid("8CABDCA1-A947-11CF-8EE4-00C00C205365")
+
+# Matroska 元素 ID
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_CLUSTER = 0x1F43B675
+
+
+class ProbeError(Exception):
+    """容器结构不完整或不符合预期"""
+
+
+def read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ProbeError("文件提前结束")
+    return data
+
+
+# ===============================
+# MP4 / MOV
+# ===============================
+def iter_boxes(f, start: int, end: int):
+    """遍历 [start, end) 范围内的 box，产出 (类型, 数据起点, box 终点)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", read_exact(f, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", read_exact(f, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ProbeError(f"box 长度无效: {kind!r}")
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def find_box(f, start: int, end: int, kind: bytes):
+    for box, data_start, box_end in iter_boxes(f, start, end):
+        if box == kind:
+            return data_start, box_end
+    return None
+
+
+def probe_mp4(f, file_size: int):
+    moov = find_box(f, 0, file_size, b"moov")
+    if moov is None:
+        return None
+    mvhd = find_box(f, moov[0], moov[1], b"mvhd")
+    if mvhd is None:
+        return None
+    f.seek(mvhd[0])
+    version = read_exact(f, 4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack(">QQIQ", read_exact(f, 28))
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        _, _, timescale, duration = struct.unpack(">IIII", read_exact(f, 16))
+        unknown = 0xFFFFFFFF
+    if duration in (0, unknown):
+        # 分片 MP4：总时长在 mvex/mehd 中
+        mvex = find_box(f, moov[0], moov[1], b"mvex")
+        mehd = mvex and find_box(f, mvex[0], mvex[1], b"mehd")
+        if not mehd:
+            return None
+        f.seek(mehd[0])
+        version = read_exact(f, 4)[0]
+        fmt = ">Q" if version == 1 else ">I"
+        duration = struct.unpack(fmt, read_exact(f, struct.calcsize(fmt)))[0]
+    if not timescale or not duration:
+        return None
+    return duration / timescale
+
+
+# ===============================
+# MKV / WebM（EBML）
+# ===============================
+def read_vint(f, keep_marker: bool):
+    """读取 EBML 变长整数；keep_marker=True 用于元素 ID，返回 (值, 是否为未知长度)"""
+    first = read_exact(f, 1)[0]
+    if not first:
+        raise ProbeError("EBML 变长整数无效")
+    length = 1
+    mask = 0x80
+    while not first & mask:
+        length += 1
+        mask >>= 1
+    value = first if keep_marker else first & (mask - 1)
+    for byte in read_exact(f, length - 1):
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, unknown
+
+
+def iter_ebml(f, start: int, end: int):
+    """产出 (元素ID, 数据起点, 数据长度或 None 表示未知长度)"""
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        element_id, _ = read_vint(f, keep_marker=True)
+        size, unknown = read_vint(f, keep_marker=False)
+        data_start = f.tell()
+        yield element_id, data_start, None if unknown else size
+        if unknown:
+            return
+        pos = data_start + size
+
+
+def probe_mkv(f, file_size: int):
+    for element_id, data_start, size in iter_ebml(f, 0, file_size):
+        if element_id != MKV_SEGMENT:
+            continue
+        segment_end = file_size if size is None else data_start + size
+        for child_id, child_start, child_size in iter_ebml(f, data_start, segment_end):
+            if child_id == MKV_CLUSTER or child_size is None:
+                return None  # Info 应在第一个 Cluster 之前
+            if child_id != MKV_INFO:
+                continue
+            scale, duration = 1_000_000, None
+            for info_id, info_start, info_size in iter_ebml(f, child_start, child_start + child_size):
+                if info_size is None:
+                    break
+                f.seek(info_start)
+                raw = read_exact(f, info_size)
+                if info_id == MKV_TIMECODE_SCALE:
+                    scale = int.from_bytes(raw, "big")
+                elif info_id == MKV_DURATION:
+                    duration = struct.unpack(">f" if info_size == 4 else ">d", raw)[0]
+            if duration is None:
+                return None
+            return duration * scale / 1e9
+        return None
+    return None
+
+
+# ===============================
+# AVI（RIFF）
+# ===============================
+def iter_riff(f, start: int, end: int):
+    """产出 (块ID, LIST 类型或 None, 数据起点, 数据长度)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        chunk_id, size = struct.unpack("<4sI", read_exact(f, 8))
+        if chunk_id == b"LIST":
+            yield chunk_id, read_exact(f, 4), pos + 12, size - 4
+        else:
+            yield chunk_id, None, pos + 8, size
+        pos += 8 + size + (size & 1)
+
+
+def probe_avi(f, file_size: int):
+    hdrl = None
+    for chunk_id, list_type, data_start, size in iter_riff(f, 12, file_size):
+        if list_type == b"hdrl":
+            hdrl = (data_start, data_start + size)
+            break
+    if hdrl is None:
+        return None
+    micro_sec_per_frame = total_frames = None
+    for chunk_id, list_type, data_start, size in iter_riff(f, *hdrl):
+        if chunk_id == b"avih":
+            f.seek(data_start)
+            micro_sec_per_frame, _, _, _, total_frames = struct.unpack("<5I", read_exact(f, 20))
+        elif list_type == b"odml":
+            for sub_id, _, sub_start, _ in iter_riff(f, data_start, data_start + size):
+                if sub_id == b"dmlh":
+                    f.seek(sub_start)
+                    # 超过 1GB 的 AVI 中 avih 只统计第一个 RIFF 块
+                    total_frames = struct.unpack("<I", read_exact(f, 4))[0]
+    if not micro_sec_per_frame or not total_frames:
+        return None
+    return total_frames * micro_sec_per_frame / 1e6
+
+
+# ===============================
+# FLV（AMF0 onMetaData）
+# ===============================
+class Amf0Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise ProbeError("AMF 数据提前结束")
+        chunk = self.data[self.pos : self.pos + size]
+        self.pos += size
+        return chunk
+
+    def string(self, long: bool = False) -> str:
+        size = struct.unpack(">I" if long else ">H", self.take(4 if long else 2))[0]
+        return self.take(size).decode("utf-8", "replace")
+
+    def properties(self) -> dict:
+        result = {}
+        while True:
+            key = self.string()
+            if not key and self.data[self.pos : self.pos + 1] == b"\x09":
+                self.pos += 1
+                return result
+            result[key] = self.value()
+
+    def value(self):
+        marker = self.take(1)[0]
+        if marker == 0x00:
+            return struct.unpack(">d", self.take(8))[0]
+        if marker == 0x01:
+            return bool(self.take(1)[0])
+        if marker == 0x02:
+            return self.string()
+        if marker == 0x03:
+            return self.properties()
+        if marker in (0x05, 0x06):
+            return None
+        if marker == 0x08:
+            self.take(4)  # ECMA 数组的元素个数（不可靠，以结束标记为准）
+            return self.properties()
+        if marker == 0x0A:
+            count = struct.unpack(">I", self.take(4))[0]
+            return [self.value() for _ in range(count)]
+        if marker == 0x0B:
+            timestamp = struct.unpack(">d", self.take(8))[0]
+            self.take(2)
+            return timestamp
+        if marker == 0x0C:
+            return self.string(long=True)
+        raise ProbeError(f"不支持的 AMF0 类型: {marker:#x}")
+
+
+def probe_flv(f, file_size: int):
+    f.seek(5)
+    header_size = struct.unpack(">I", read_exact(f, 4))[0]
+    pos = header_size + 4  # 跳过 PreviousTagSize0
+    while pos + 11 <= file_size:
+        f.seek(pos)
+        tag = read_exact(f, 11)
+        tag_type = tag[0] & 0x1F
+        data_size = int.from_bytes(tag[1:4], "big")
+        if tag_type == 18:
+            reader = Amf0Reader(read_exact(f, data_size))
+            if reader.value() == "onMetaData":
+                metadata = reader.value()
+                duration = metadata.get("duration") if isinstance(metadata, dict) else None
+                return duration or None
+        elif tag_type in (8, 9):
+            return None  # 音视频数据已开始，没有元数据标签
+        pos += 11 + data_size + 4
+    return None
+
+
+# ===============================
+# WMV / ASF
+# ===============================
+def probe_asf(f, file_size: int):
+    f.seek(16)
+    header_size, _ = struct.unpack("<QI", read_exact(f, 12))
+    pos = 30
+    end = min(header_size, file_size)
+    while pos + 24 <= end:
+        f.seek(pos)
+        guid, size = struct.unpack("<16sQ", read_exact(f, 24))
+        if guid == ASF_FILE_PROPERTIES_GUID:
+            f.seek(pos + 64)
+            play_duration, _, preroll = struct.unpack("<QQQ", read_exact(f, 24))
+            duration = play_duration / 1e7 - preroll / 1000
+            return duration if duration > 0 else None
+        if size < 24:
+            break
+        pos += size
+    return None
+
+
+# ===============================
+# 入口
+# ===============================
+def detect_format(head: bytes):
+    if head[:4] == EBML_MAGIC:
+        return probe_mkv
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return probe_avi
+    if head[:3] == b"FLV":
+        return probe_flv
+    if head[:16] == ASF_HEADER_GUID:
+        return probe_asf
+    if head[4:8] in MP4_TOP_LEVEL:
+        return probe_mp4
+    return None
+
+
+def probe_duration(file_path):
+    """
+    返回时长（秒）；格式无法识别或元数据缺失/损坏时返回 None
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(16)
+        probe = detect_format(head)
+        if probe is None:
+            return None
+        try:
+            duration = probe(f, os.fstat(f.fileno()).st_size)
+        except (ProbeError, struct.error, ValueError, OverflowError):
+            return None
+    if duration is None or duration != duration or duration <= 0:  # NaN
+        return None
+    return float(duration)
+
+
+def moviepy_duration(file_path):
+    """原来的做法：打开完整的 VideoFileClip（按需导入 moviepy）"""
+    from moviepy import VideoFileClip
+
+    with VideoFileClip(file_path) as video:
+        return video.duration
+
+
+def get_video_length(file_path):
+    """获取单个视频文件的长度（秒）"""
+    try:
+        duration = probe_duration(file_path)
+        if duration is None:
+            duration = moviepy_duration(file_path)
+        return duration
+    except Exception as e:
+        print(f"无法处理文件 {file_path}: {e}", file=sys.stderr)
+        return 0
+
+
+def iter_video_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in sorted(files):
+                    if file.lower().endswith(VIDEO_EXTENSIONS):
+                        yield os.path.join(root, file)
+        else:
+            yield path
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    compare = "--compare" in argv
+    paths = [arg for arg in argv if arg != "--compare"]
+    if not paths:
+        print(__doc__)
+        return
+    probe_total = moviepy_total = 0.0
+    for file_path in iter_video_files(paths):
+        start = time.perf_counter()
+        duration = probe_duration(file_path)
+        probe_time = time.perf_counter() - start
+        probe_total += probe_time
+        text = "未识别" if duration is None else f"{duration:.3f}s"
+        line = f"{text:>14} {probe_time * 1000:8.2f}ms  {file_path}"
+        if compare:
+            start = time.perf_counter()
+            try:
+                expected = moviepy_duration(file_path)
+            except Exception as e:
+                expected = f"失败: {e}"
+            moviepy_time = time.perf_counter() - start
+            moviepy_total += moviepy_time
+            line += f"  | moviepy {expected} {moviepy_time * 1000:.0f}ms"
+        print(line)
+    if compare and probe_total:
+        print(f"[对比] 头部解析 {probe_total:.3f}s，moviepy {moviepy_total:.3f}s，"
+              f"加速 {moviepy_total / probe_total:.0f} 倍")
+
+
+if __name__ == "__main__":
+    main()
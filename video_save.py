@@ -1,19 +1,17 @@
 import os
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from moviepy import *
+from duration_cache import DurationCache
+from video_scan import ScanEngine
+from tree_feed import TreeFeed
+from scan_index import ScanIndex
+from index_tree import IndexTree
+from scan_report import REPORT_SUFFIX, ReportWriter, is_report, read_report, write_index
 import threading
 import json
 import datetime
-
-def get_video_length(file_path):
-    """获取单个视频文件的长度（秒）"""
-    try:
-        with VideoFileClip(file_path) as video:
-            return video.duration
-    except Exception as e:
-        print(f"无法处理文件 {file_path}: {e}")
-        return 0
+import shutil
+import tempfile
 
 def format_time(seconds):
     """将秒数格式化为时分秒"""
@@ -22,307 +20,339 @@ def format_time(seconds):
     seconds = int(seconds % 60)
     return f"{hours}时{minutes}分{seconds}秒"
 
-def scan_directory(directory, tree, parent=""):
-    """递归扫描目录，计算视频长度并更新树形视图"""
-    total_length = 0
-    video_extensions = (".mp4", ".avi", ".mkv", ".mov", ".flv", ".wmv")
-    
-    # 添加当前目录到树中
-    dir_name = os.path.basename(directory)
-    if not dir_name:  # 如果是根目录
-        dir_name = directory
-    
-    current_id = tree.insert(parent, "end", text=dir_name, values=["计算中..."])
-    tree.update()
-    
-    # 首先处理当前目录中的视频文件
-    files_length = 0
-    files_data = []
-    for file in os.listdir(directory):
-        file_path = os.path.join(directory, file)
-        if os.path.isfile(file_path) and file.lower().endswith(video_extensions):
-            length = get_video_length(file_path)
-            item_id = tree.insert(current_id, "end", text=file, values=[format_time(length)])
-            files_length += length
-            files_data.append({"name": file, "length": length, "id": item_id})
-    
-    total_length += files_length
-    
-    # 处理子目录
-    subdirs_data = []
-    for subdir in os.listdir(directory):
-        subdir_path = os.path.join(directory, subdir)
-        if os.path.isdir(subdir_path):
-            subdir_length, subdir_data = scan_directory(subdir_path, tree, current_id)
-            total_length += subdir_length
-            subdirs_data.append({"name": subdir, "data": subdir_data, "length": subdir_length})
-    
-    # 更新当前目录的总长度
-    tree.item(current_id, values=[format_time(total_length)])
-    
-    # 返回总长度和当前目录的数据结构
-    dir_data = {
-        "path": directory,
-        "name": dir_name,
-        "total_length": total_length,
-        "files": files_data,
-        "subdirs": subdirs_data,
-        "id": current_id
-    }
-    
-    return total_length, dir_data
+def scan_directory(directory, engine):
+    """用 ScanEngine 扫描目录（在后台线程中调用），返回 (根 DirNode, ScanIndex)；
+    树视图的更新由 engine 的回调（TreeFeed）交给主线程批量应用"""
+    root_node = engine.scan(directory)
+    return root_node, ScanIndex.from_node(root_node)
+
+def remove_report(report_path):
+    """删除临时报告文件（不存在或仍被占用时忽略）"""
+    if report_path and os.path.exists(report_path):
+        try:
+            os.remove(report_path)
+        except OSError:
+            pass
+
+def discard_report():
+    """删除上一次扫描的临时报告文件"""
+    remove_report(current_scan_data and current_scan_data.get("report"))
+
+def close_window():
+    """关闭窗口时删除临时报告（包括仍在扫描中写入的），否则每次运行都会留下一个"""
+    discard_report()
+    remove_report(active_report)
+    root.destroy()
 
 def start_scan():
-    """在后台线程中开始扫描，避免GUI卡顿"""
-    global current_scan_data, current_directory
+    """选择目录并完整扫描"""
+    global current_directory
     
     directory = filedialog.askdirectory(title="选择要统计的视频目录")
     if not directory:
         return
     
     current_directory = directory
+    run_scan(directory)
+
+def start_rescan():
+    """以当前结果（扫描或加载的）为基础增量更新：只测量新增或变化的文件，原地修改树视图"""
+    if view.index is None:
+        messagebox.showinfo("提示", "请先扫描目录或加载统计结果")
+        return
+    if not os.path.isdir(current_directory):
+        messagebox.showerror("错误", f"目录不存在：\n{current_directory}")
+        return
+    run_scan(current_directory, previous=view.index)
+
+def set_buttons_busy(busy):
+    """扫描期间禁用全部按钮；结束后保存 / 增量更新只在有结果时可用"""
+    if busy:
+        for button in (select_button, save_button, load_button, rescan_button):
+            button.config(state="disabled")
+        return
+    select_button.config(state="normal")
+    load_button.config(state="normal")
+    has_result = "normal" if view.index is not None else "disabled"
+    save_button.config(state=has_result)
+    rescan_button.config(state=has_result)
+
+def run_scan(directory, previous=None):
+    """在后台线程中扫描，避免GUI卡顿；结果同时流式写入临时报告文件。
+    previous 为上次结果的 ScanIndex 时做增量更新，完成后再原地修改树视图；
+    增量更新失败时保留原来的结果"""
+    global current_scan_data
     
-    # 清空树视图
-    for item in tree.get_children():
-        tree.delete(item)
+    if previous is None:
+        discard_report()
+        current_scan_data = None
+        view.clear()
     
     status_label.config(text="正在统计中，请稍候...")
-    select_button.config(state="disabled")
-    save_button.config(state="disabled")
+    set_buttons_busy(True)
     
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    engine = None
+
+    def show_progress():
+        if engine is not None:
+            status_label.config(
+                text=f"正在统计中... 已测量 {engine.files_done}/{engine.files_found} 个文件，"
+                     f"{engine.dirs_found} 个目录"
+            )
+
+    feed = TreeFeed(root, tree, format_time, on_progress=show_progress)
+    feed.start()
+
+    def fail(error):
+        # 扫描线程出错：停止轮询，撤掉不完整的树，恢复按钮（不完整的报告已由扫描线程删除）
+        global active_report
+        active_report = None
+        feed.stop()
+        if previous is None:
+            view.clear()
+        status_label.config(text="统计失败")
+        set_buttons_busy(False)
+        messagebox.showerror("错误", f"统计失败: {error}")
+
     def scan_thread():
-        global current_scan_data
-        total_length, scan_data = scan_directory(directory, tree)
-        current_scan_data = {
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "root_directory": directory,
-            "total_length": total_length,
-            "data": scan_data
-        }
-        
-        # 更新界面状态
-        root.after(0, lambda: status_label.config(
-            text=f"统计完成！总时长: {format_time(total_length)}"
-        ))
-        root.after(0, lambda: select_button.config(state="normal"))
-        root.after(0, lambda: save_button.config(state="normal"))
+        # 缓存（SQLite）与报告文件都在这里打开：任何一步出错都要交给 fail 恢复界面
+        global active_report
+        nonlocal engine
+        report_path = None
+        try:
+            fd, report_path = tempfile.mkstemp(prefix="video_scan_", suffix=REPORT_SUFFIX)
+            os.close(fd)
+            active_report = report_path
+            with DurationCache() as cache, ReportWriter(report_path, directory, timestamp) as report:
+                if previous is None:
+                    def on_dir_done(node):
+                        feed.dir_done(node)
+                        report.dir_done(node)
+
+                    engine = ScanEngine(
+                        cache=cache, on_dir_listed=feed.dir_listed, on_file=feed.file_done,
+                        on_dir_done=on_dir_done
+                    )
+                else:
+                    engine = ScanEngine(cache=cache, on_dir_done=report.dir_done, previous=previous)
+                root_node, index = scan_directory(directory, engine)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            remove_report(report_path)
+            feed.call(lambda: fail(error))
+            return
+
+        def finish():
+            # 所有树更新应用完之后再更新界面状态
+            global current_scan_data, active_report
+            active_report = None
+            feed.stop()
+            if previous is None:
+                view.attach_scan(root_node, index)
+                summary = f"统计完成！总时长: {format_time(index.total_length)}" \
+                          f"（缓存命中 {cache.hits}/{cache.hits + cache.misses}）"
+            else:
+                view.patch(index)
+                calculate_selected_duration()  # 选中项目的时长按新结果刷新
+                summary = f"增量更新完成！总时长: {format_time(index.total_length)}" \
+                          f"（重新测量 {engine.files_probed} 个文件，沿用 {engine.files_reused} 个，" \
+                          f"{engine.dirs_changed} 个目录有增删）"
+            discard_report()
+            current_scan_data = {
+                "timestamp": timestamp,
+                "root_directory": directory,
+                "total_length": index.total_length,
+                "report": report_path
+            }
+            status_label.config(text=summary)
+            set_buttons_busy(False)
+
+        feed.call(finish)
     
     threading.Thread(target=scan_thread, daemon=True).start()
 
 def save_results():
-    """保存统计结果到JSON文件"""
+    """保存统计结果：.jsonl 为流式报告（扫描时已写好，直接复制），.json 为原来的嵌套格式"""
     if not current_scan_data:
         messagebox.showinfo("提示", "没有可保存的统计结果")
         return
     
     # 默认使用当前目录的名称作为文件名
     default_filename = os.path.basename(current_directory) or "video_stats"
-    default_filename = f"{default_filename}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    default_filename = f"{default_filename}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{REPORT_SUFFIX}"
     
     file_path = filedialog.asksaveasfilename(
         title="保存统计结果",
-        defaultextension=".json",
+        defaultextension=REPORT_SUFFIX,
         initialfile=default_filename,
-        filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+        filetypes=[("扫描报告（JSON Lines）", "*" + REPORT_SUFFIX), ("JSON文件", "*.json"), ("所有文件", "*.*")]
     )
     
     if not file_path:
         return
     
     try:
-        # 准备保存数据，移除树视图的ID引用
-        save_data = prepare_data_for_save(current_scan_data)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
+        report_path = current_scan_data.get("report")
+        if is_report(file_path):
+            if report_path and os.path.exists(report_path):
+                shutil.copyfile(report_path, file_path)
+            else:
+                write_index(
+                    file_path, view.index,
+                    current_scan_data.get("root_directory", ""), current_scan_data.get("timestamp", "")
+                )
+        else:
+            # 兼容原来的 JSON 格式：由索引还原嵌套结构
+            save_data = {key: value for key, value in current_scan_data.items() if key != "report"}
+            save_data["data"] = view.index.to_data()
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(save_data, f, ensure_ascii=False, indent=2)
         
         messagebox.showinfo("成功", f"统计结果已保存至：\n{file_path}")
     except Exception as e:
         messagebox.showerror("错误", f"保存失败: {str(e)}")
 
-def prepare_data_for_save(data):
-    """递归处理数据，移除不需要保存的字段"""
-    if isinstance(data, dict):
-        result = {}
-        for key, value in data.items():
-            if key != "id":  # 不保存树视图ID
-                result[key] = prepare_data_for_save(value)
-        return result
-    elif isinstance(data, list):
-        return [prepare_data_for_save(item) for item in data]
-    else:
-        return data
-
 def load_results():
-    """从JSON文件加载统计结果"""
+    """加载统计结果（流式报告或 JSON）；数据压平为 ScanIndex，树视图只插入已展开的部分"""
     file_path = filedialog.askopenfilename(
         title="加载统计结果",
-        filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
+        filetypes=[
+            ("统计结果", "*" + REPORT_SUFFIX + " *.json"),
+            ("扫描报告（JSON Lines）", "*" + REPORT_SUFFIX),
+            ("JSON文件", "*.json"),
+            ("所有文件", "*.*"),
+        ]
     )
     
     if not file_path:
         return
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 清空树视图
-        for item in tree.get_children():
-            tree.delete(item)
+        # 嵌套数据压平后即可释放，保存时再由索引还原
+        if is_report(file_path):
+            header, index = read_report(file_path)
+            data = {
+                "timestamp": header.get("timestamp", "未知"),
+                "root_directory": header.get("root_directory", ""),
+                "total_length": index.total_length,
+            }
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            index = ScanIndex.from_data(data.pop("data", {}))
         
-        # 加载数据到树视图
         global current_scan_data, current_directory
+        discard_report()
         current_scan_data = data
         current_directory = data.get("root_directory", "")
         
         status_label.config(text=f"加载统计数据 - 时间: {data.get('timestamp', '未知')}") 
         
-        # 递归构建树视图
-        build_tree_from_data(data.get("data", {}))
-        
-        # 展开根节点
-        if tree.get_children():
-            tree.item(tree.get_children()[0], open=True)
+        # 只插入根目录，并展开根节点
+        view.show(index)
             
         save_button.config(state="normal")
+        rescan_button.config(state="normal")
         
     except Exception as e:
         messagebox.showerror("错误", f"加载失败: {str(e)}")
 
-def build_tree_from_data(data, parent=""):
-    """从保存的数据构建树视图"""
-    if not data:
-        return
-    
-    # 创建当前目录节点
-    current_id = tree.insert(
-        parent, "end", 
-        text=data.get("name", "未知目录"),
-        values=[format_time(data.get("total_length", 0))]
-    )
-    
-    # 添加文件
-    for file_info in data.get("files", []):
-        tree.insert(
-            current_id, "end",
-            text=file_info.get("name", "未知文件"),
-            values=[format_time(file_info.get("length", 0))]
-        )
-    
-    # 递归添加子目录
-    for subdir in data.get("subdirs", []):
-        build_tree_from_data(subdir.get("data", {}), current_id)
-    
-    return current_id
-
 def calculate_selected_duration():
-    """计算选中项目的总时长"""
+    """计算选中项目的总时长（由 IndexTree 按索引增量统计，目录按子树总时长计）"""
     selected_items = tree.selection()
     if not selected_items:
+        view.update_selection(())
         selection_label.config(text="未选中任何项目")
         return
+    if view.index is None:
+        selection_label.config(text="统计完成后可查看选中项目的总时长")
+        return
     
-    total_duration = 0
-    selected_files_count = 0
-    selected_dirs_count = 0
-    
-    for item_id in selected_items:
-        # 检查是否为文件
-        item_text = tree.item(item_id, "text")
-        item_values = tree.item(item_id, "values")
-        parent_id = tree.parent(item_id)
-        
-        # 如果有父节点且值包含时间，则可能是文件
-        if parent_id and item_values and item_values[0]:
-            try:
-                # 尝试从文件节点的数据中获取时长
-                time_str = item_values[0]
-                # 解析时间字符串
-                hours, minutes, seconds = 0, 0, 0
-                if "时" in time_str:
-                    hours = int(time_str.split("时")[0])
-                    time_str = time_str.split("时")[1]
-                if "分" in time_str:
-                    minutes = int(time_str.split("分")[0])
-                    time_str = time_str.split("分")[1]
-                if "秒" in time_str:
-                    seconds = int(time_str.split("秒")[0])
-                
-                duration = hours * 3600 + minutes * 60 + seconds
-                total_duration += duration
-                selected_files_count += 1
-            except:
-                # 如果解析失败，可能是目录
-                selected_dirs_count += 1
-        else:
-            selected_dirs_count += 1
+    selected_files_count, selected_dirs_count, video_count, total_duration = \
+        view.update_selection(selected_items)
     
     # 显示结果
     selection_text = f"已选择: {selected_files_count}个文件"
     if selected_dirs_count > 0:
-        selection_text += f", {selected_dirs_count}个目录"
+        selection_text += f", {selected_dirs_count}个目录（共{video_count}个视频）"
     selection_text += f" | 选中视频总时长: {format_time(total_duration)}"
     selection_label.config(text=selection_text)
 
-# 创建主窗口
-root = tk.Tk()
-root.title("视频时长统计工具")
-root.geometry("800x600")
-
 # 全局变量
 current_scan_data = None
 current_directory = ""
+active_report = None  # 正在扫描写入的临时报告，完成后转入 current_scan_data
+
+def build_window():
+    """创建主窗口与控件（控件保存在模块全局变量中，供上面的函数使用）"""
+    global root, tree, view, status_label, selection_label
+    global select_button, save_button, load_button, rescan_button
+
+    # 创建主窗口
+    root = tk.Tk()
+    root.title("视频时长统计工具")
+    root.geometry("800x600")
+    root.protocol("WM_DELETE_WINDOW", close_window)
+
+    # 顶部控制区域
+    frame_top = tk.Frame(root, pady=10, padx=10)
+    frame_top.pack(fill="x")
+
+    select_button = tk.Button(frame_top, text="选择目录", command=start_scan, width=15)
+    select_button.pack(side="left", padx=5)
 
-# 顶部控制区域
-frame_top = tk.Frame(root, pady=10, padx=10)
-frame_top.pack(fill="x")
+    save_button = tk.Button(frame_top, text="保存结果", command=save_results, width=15, state="disabled")
+    save_button.pack(side="left", padx=5)
 
-select_button = tk.Button(frame_top, text="选择目录", command=start_scan, width=15)
-select_button.pack(side="left", padx=5)
+    load_button = tk.Button(frame_top, text="加载结果", command=load_results, width=15)
+    load_button.pack(side="left", padx=5)
 
-save_button = tk.Button(frame_top, text="保存结果", command=save_results, width=15, state="disabled")
-save_button.pack(side="left", padx=5)
+    rescan_button = tk.Button(frame_top, text="增量更新", command=start_rescan, width=15, state="disabled")
+    rescan_button.pack(side="left", padx=5)
 
-load_button = tk.Button(frame_top, text="加载结果", command=load_results, width=15)
-load_button.pack(side="left", padx=5)
+    status_label = tk.Label(frame_top, text="请选择一个目录开始统计")
+    status_label.pack(side="left", padx=10)
 
-status_label = tk.Label(frame_top, text="请选择一个目录开始统计")
-status_label.pack(side="left", padx=10)
+    # 创建树形视图
+    frame_tree = tk.Frame(root)
+    frame_tree.pack(fill="both", expand=True, padx=10, pady=5)
 
-# 创建树形视图
-frame_tree = tk.Frame(root)
-frame_tree.pack(fill="both", expand=True, padx=10, pady=5)
+    # 设置树的列，启用多选功能
+    tree = ttk.Treeview(frame_tree, selectmode="extended")
+    tree["columns"] = ("length")
+    tree.column("#0", width=400, minwidth=200)
+    tree.column("length", width=150, minwidth=100, anchor="center")
+    tree.heading("#0", text="目录/文件")
+    tree.heading("length", text="时长")
 
-# 设置树的列，启用多选功能
-tree = ttk.Treeview(frame_tree, selectmode="extended")
-tree["columns"] = ("length")
-tree.column("#0", width=400, minwidth=200)
-tree.column("length", width=150, minwidth=100, anchor="center")
-tree.heading("#0", text="目录/文件")
-tree.heading("length", text="时长")
+    # 添加滚动条
+    vsb = ttk.Scrollbar(frame_tree, orient="vertical", command=tree.yview)
+    hsb = ttk.Scrollbar(frame_tree, orient="horizontal", command=tree.xview)
+    tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
 
-# 添加滚动条
-vsb = ttk.Scrollbar(frame_tree, orient="vertical", command=tree.yview)
-hsb = ttk.Scrollbar(frame_tree, orient="horizontal", command=tree.xview)
-tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+    vsb.pack(side="right", fill="y")
+    hsb.pack(side="bottom", fill="x")
+    tree.pack(fill="both", expand=True)
 
-vsb.pack(side="right", fill="y")
-hsb.pack(side="bottom", fill="x")
-tree.pack(fill="both", expand=True)
+    # 树视图与当前结果（ScanIndex）的绑定
+    view = IndexTree(tree, format_time)
 
-# 选中项目信息区域
-selection_frame = tk.Frame(root, pady=5, padx=10)
-selection_frame.pack(fill="x")
-selection_label = tk.Label(selection_frame, text="未选中任何项目", anchor="w")
-selection_label.pack(fill="x")
+    # 选中项目信息区域
+    selection_frame = tk.Frame(root, pady=5, padx=10)
+    selection_frame.pack(fill="x")
+    selection_label = tk.Label(selection_frame, text="未选中任何项目", anchor="w")
+    selection_label.pack(fill="x")
 
-# 绑定选择事件
-tree.bind("<<TreeviewSelect>>", lambda e: calculate_selected_duration())
+    # 绑定选择事件
+    tree.bind("<<TreeviewSelect>>", lambda e: calculate_selected_duration())
+    tree.bind("<<TreeviewOpen>>", lambda e: view.expand(tree.focus()))
 
-# 说明标签
-help_text = "说明：目录旁显示的是该目录（包含子目录）所有视频的总时长。可以保存和加载统计结果。选中一个或多个视频可以查看选中项目的总时长。"
-help_label = tk.Label(root, text=help_text, pady=5)
-help_label.pack(side="bottom", fill="x")
+    # 说明标签
+    help_text = "说明：目录旁显示的是该目录（包含子目录）所有视频的总时长。可以保存和加载统计结果。选中一个或多个视频可以查看选中项目的总时长。"
+    help_label = tk.Label(root, text=help_text, pady=5)
+    help_label.pack(side="bottom", fill="x")
 
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    build_window()
+    root.mainloop()
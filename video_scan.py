@@ -0,0 +1,406 @@
+"""
+并行视频扫描引擎
+
+扫描线程用 os.scandir 深度优先遍历目录（一次 readdir 同时得到文件类型），
+时长测量分发到线程池（或进程池）；缓存命中的文件不进入线程池。
+测量结果回到扫描线程统一汇总，因此各回调都在扫描线程中执行、无需加锁。
+
+每个目录在其文件全部测完、子目录全部完成后才计算总时长，累加顺序与原来的
+顺序扫描（先按列表顺序累加文件，再按列表顺序累加子目录）完全一致，
+结果与顺序扫描逐位相同。
+
+增量更新（previous 为上次结果的 ScanIndex）：每个目录仍只做一次 scandir，
+文件的 (大小, mtime_ns) 与上次记录一致时直接沿用上次的时长，只测量新增或
+变化的文件；目录 mtime 变化（有文件增删）的目录数记在 dirs_changed。
+
+无界面使用:
+    python video_scan.py 目录                      # 逐个文件输出 JSON Lines，最后一行为汇总
+    python video_scan.py 目录 --quiet              # 只输出汇总
+    python video_scan.py 目录 --report 报告.jsonl   # 同时写出可被图形界面加载的报告
+    python video_scan.py 目录 --previous 报告.jsonl --report 新报告.jsonl   # 增量更新
+
+    from video_scan import scan_tree, iter_files
+    root = scan_tree("目录")
+    print(root.total)
+
+启动时只导入标准库的轻量模块；线程池/进程池、SQLite 缓存、报告读写在用到时才导入，
+moviepy 只在头部解析失败时才导入。
+"""
+
+import os
+import queue
+import sys
+
+from video_probe import VIDEO_EXTENSIONS, get_video_length
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+class DirNode:
+    """
+    一个目录的扫描结果；files 与 lengths 按目录列表顺序一一对应，
+    lengths 中尚未测完的为 None，stats 为 (大小, mtime_ns)（无法读取时为 None）；
+    index 为列出目录的先后序号（前序，根为 0）；tag 供调用方挂载自己的数据（如树节点ID）
+    """
+
+    __slots__ = (
+        "path", "name", "parent", "index", "mtime_ns", "files", "lengths", "stats", "subdirs",
+        "total", "pending", "tag",
+    )
+
+    def __init__(self, path: str, name: str, parent=None, index: int = 0, mtime_ns: int = 0):
+        self.path = path
+        self.name = name
+        self.parent = parent
+        self.index = index
+        self.mtime_ns = mtime_ns
+        self.files = []
+        self.lengths = []
+        self.stats = []
+        self.subdirs = []
+        self.total = None
+        self.pending = 1  # 目录列表未处理完之前保持不为 0
+        self.tag = None
+
+    @property
+    def done(self) -> bool:
+        return self.total is not None
+
+
+class ScanEngine:
+    """
+    回调（均在调用 scan 的线程中执行）:
+        on_dir_listed(node)      目录已列出，node.files 已确定，时长尚未测量
+        on_file(node, index)     node.lengths[index] 已得到
+        on_dir_done(node)        node.total 已得到（子目录先于父目录）
+    previous 为上次结果的 ScanIndex 时做增量更新，未变化的文件不再测量
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        cache=None,
+        use_processes: bool = False,
+        on_dir_listed=None,
+        on_file=None,
+        on_dir_done=None,
+        previous=None,
+    ):
+        self.workers = workers
+        self.cache = cache
+        self.previous = previous
+        self.use_processes = use_processes
+        self.on_dir_listed = on_dir_listed
+        self.on_file = on_file
+        self.on_dir_done = on_dir_done
+        self.files_found = 0
+        self.files_done = 0
+        self.dirs_found = 0
+        self.dirs_changed = 0
+        self.files_reused = 0
+        self.files_probed = 0
+        self._previous_dirs = previous.dir_lookup() if previous is not None else {}
+        self._results = queue.Queue()
+        self._outstanding = 0
+        self._pool = None
+        self._cache_errors = (OSError,)
+        self._cache_warned = False
+        if cache is not None:
+            import sqlite3
+
+            # 缓存出错（如多个扫描共用缓存时 database is locked、缓存文件损坏）不中断扫描
+            self._cache_errors = (OSError, sqlite3.Error)
+
+    # ---------- 入口 ----------
+    def scan(self, directory: str) -> DirNode:
+        if self.use_processes:
+            from concurrent.futures import ProcessPoolExecutor as executor
+        else:
+            from concurrent.futures import ThreadPoolExecutor as executor
+        with executor(max_workers=self.workers) as pool:
+            self._pool = pool
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtime_ns = 0
+            root = self._walk(directory, os.path.basename(directory) or directory, None, mtime_ns)
+            while self._outstanding:
+                self._handle(self._results.get())
+        self._pool = None
+        return root
+
+    # ---------- 遍历 ----------
+    def _walk(self, path: str, name: str, parent, mtime_ns: int) -> DirNode:
+        node = DirNode(path, name, parent, self.dirs_found, mtime_ns)
+        self.dirs_found += 1
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file():
+                            if entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                                files.append(entry)
+                        elif entry.is_dir():
+                            dirs.append(entry)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"无法读取目录 {path}: {e}", file=sys.stderr)
+
+        stats = []
+        for entry in files:
+            try:
+                stats.append(entry.stat())
+            except OSError:
+                stats.append(None)
+        node.files = [entry.name for entry in files]
+        node.lengths = [None] * len(files)
+        node.stats = [stat and (stat.st_size, stat.st_mtime_ns) for stat in stats]
+        node.pending += len(files) + len(dirs)
+        self.files_found += len(files)
+        if self.on_dir_listed:
+            self.on_dir_listed(node)
+
+        previous_files = self._previous_files(node)
+        for index, entry in enumerate(files):
+            file_id = previous_files.get(entry.name)
+            if file_id is not None and self._unchanged(file_id, node.stats[index]):
+                self.files_reused += 1
+                self._set(node, index, self.previous.file_lengths[file_id])
+            else:
+                self._submit(node, index, entry, stats[index])
+        self._drain()
+        for entry in dirs:
+            try:
+                mtime_ns = entry.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = 0
+            node.subdirs.append(self._walk(entry.path, entry.name, node, mtime_ns))
+        self._complete(node)
+        return node
+
+    def _previous_files(self, node: DirNode) -> dict:
+        """上次结果中同一目录的 文件名 -> 文件编号；目录为新增或有文件增删时计入 dirs_changed"""
+        if self.previous is None:
+            return {}
+        dir_id = self._previous_dirs.get(node.path)
+        if dir_id is None:
+            self.dirs_changed += 1
+            return {}
+        if self.previous.dir_mtimes[dir_id] != node.mtime_ns:
+            self.dirs_changed += 1
+        names = self.previous.file_names
+        return {names[file_id]: file_id for file_id in self.previous.files(dir_id)}
+
+    def _unchanged(self, file_id: int, stat) -> bool:
+        previous = self.previous
+        return (
+            stat is not None
+            and previous.file_lengths[file_id]  # 上次测量失败的重新测量
+            and stat == (previous.file_sizes[file_id], previous.file_mtimes[file_id])
+        )
+
+    def _submit(self, node: DirNode, index: int, entry, stat):
+        if self.cache is not None and stat is not None:
+            try:
+                duration = self.cache.get(entry.path, stat)
+            except self._cache_errors as e:
+                self._cache_warning("读取", e)
+                duration = None  # 按未命中处理，照常测量
+            if duration is not None:
+                self._set(node, index, duration)
+                return
+        else:
+            stat = None  # 无缓存时测量结果不写回
+        self.files_probed += 1
+        future = self._pool.submit(get_video_length, entry.path)
+        self._outstanding += 1
+        future.add_done_callback(
+            lambda f: self._results.put((node, index, entry.path, stat, f))
+        )
+
+    # ---------- 汇总 ----------
+    def _drain(self):
+        """处理已完成的测量结果（不阻塞）"""
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(item)
+
+    def _handle(self, item):
+        node, index, path, stat, future = item
+        self._outstanding -= 1
+        try:
+            duration = future.result()
+        except Exception as e:  # 进程池中的子进程异常退出等
+            print(f"无法处理文件 {path}: {e}", file=sys.stderr)
+            duration = 0
+        if duration and stat is not None:
+            try:
+                self.cache.put(path, stat, duration)
+            except self._cache_errors as e:
+                self._cache_warning("写入", e)
+        self._set(node, index, duration)
+
+    def _cache_warning(self, action: str, error: Exception):
+        """缓存出错只警告一次，之后的错误静默（通常是同一原因）"""
+        if not self._cache_warned:
+            self._cache_warned = True
+            print(f"时长缓存{action}失败，继续扫描（之后的缓存错误不再提示）: {error}", file=sys.stderr)
+
+    def _set(self, node: DirNode, index: int, duration):
+        node.lengths[index] = duration
+        self.files_done += 1
+        if self.on_file:
+            self.on_file(node, index)
+        self._complete(node)
+
+    def _complete(self, node: DirNode):
+        node.pending -= 1
+        if node.pending:
+            return
+        # 与顺序扫描相同的累加顺序
+        total = sum(node.lengths)
+        for subdir in node.subdirs:
+            total += subdir.total
+        node.total = total
+        if self.on_dir_done:
+            self.on_dir_done(node)
+        if node.parent is not None:
+            self._complete(node.parent)
+
+
+def scan_tree(directory: str, workers: int = DEFAULT_WORKERS, cache=None, **options) -> DirNode:
+    """扫描目录树并返回根节点；options 为 ScanEngine 的其余参数（回调、previous 等）"""
+    return ScanEngine(workers, cache, **options).scan(directory)
+
+
+def iter_nodes(node: DirNode):
+    """前序遍历（与原顺序扫描插入树节点的顺序相同）"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(current.subdirs))
+
+
+def iter_files(node: DirNode):
+    """按前序遍历输出 (文件路径, 时长)"""
+    for current in iter_nodes(node):
+        for name, length in zip(current.files, current.lengths):
+            yield os.path.join(current.path, name), length
+
+
+def total_duration(directory: str, **options) -> float:
+    """目录（含子目录）下所有视频的总时长（秒）"""
+    return scan_tree(directory, **options).total
+
+
+# ===============================
+# 命令行
+# ===============================
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="统计目录下视频的总时长（无界面），逐个文件输出 JSON Lines"
+    )
+    parser.add_argument("directory", help="要统计的目录")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并行测量的线程/进程数")
+    parser.add_argument("--processes", action="store_true", help="使用进程池（默认线程池）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用 SQLite 时长缓存")
+    parser.add_argument("--cache-path", help="缓存文件路径（默认 ~/.video_duration_cache.sqlite3）")
+    parser.add_argument("--report", help="同时写出流式扫描报告（.jsonl）")
+    parser.add_argument("--previous", help="以上次的扫描报告为基础做增量更新")
+    parser.add_argument("--quiet", action="store_true", help="不输出逐个文件的记录，只输出汇总")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import json
+    import time
+
+    args = parse_args(argv)
+    directory = args.directory
+    if not os.path.isdir(directory):
+        print(f"输入的路径不是有效的目录！{directory}", file=sys.stderr)
+        return 2
+
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    out = sys.stdout
+    start = time.perf_counter()
+
+    cache = None
+    if not args.no_cache:
+        import sqlite3
+
+        from duration_cache import CACHE_PATH, DurationCache
+
+        try:
+            cache = DurationCache(args.cache_path or CACHE_PATH)
+        except sqlite3.Error as e:
+            print(f"无法打开时长缓存，本次不使用缓存: {e}", file=sys.stderr)
+    previous = None
+    if args.previous:
+        from scan_report import read_report
+
+        previous = read_report(args.previous)[1]
+    report = None
+    if args.report:
+        import datetime
+
+        from scan_report import ReportWriter
+
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        report = ReportWriter(args.report, directory, timestamp)
+
+    def on_file(node, index):
+        out.write(dumps({
+            "path": os.path.join(node.path, node.files[index]), "duration": node.lengths[index]
+        }) + "\n")
+
+    def on_dir_done(node):
+        if report is not None:
+            report.dir_done(node)
+        out.flush()
+
+    engine = ScanEngine(
+        workers=args.workers,
+        cache=cache,
+        use_processes=args.processes,
+        on_file=None if args.quiet else on_file,
+        on_dir_done=on_dir_done,
+        previous=previous,
+    )
+    try:
+        root = engine.scan(directory)
+    finally:
+        if cache is not None:
+            try:
+                cache.close()
+            except sqlite3.Error as e:
+                print(f"时长缓存提交失败，本次测量结果未缓存: {e}", file=sys.stderr)
+        if report is not None:
+            report.close()
+
+    summary = {
+        "directory": directory,
+        "total_length": root.total,
+        "files": engine.files_found,
+        "dirs": engine.dirs_found,
+        "probed": engine.files_probed,
+        "reused": engine.files_reused,
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+    if cache is not None:
+        summary["cache_hits"] = cache.hits
+    out.write(dumps(summary) + "\n")
+    out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())